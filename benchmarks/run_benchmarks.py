@@ -0,0 +1,355 @@
+"""
+End-to-end pipeline benchmark.
+
+Measures ``import main`` startup time against a budget, then runs every
+pipeline stage (preprocess, edge detection, segmentation, depth,
+reconstruction, export, rendering) on a fixed corpus of synthetic images and
+existing ``segments/`` outputs, using the local stand-in models so nothing is
+downloaded. Per stage it records wall time, CPU time, peak RSS and the size of
+the files written, then compares the run against a stored baseline.
+
+Usage:
+    python -m benchmarks.run_benchmarks                     # run and compare
+    python -m benchmarks.run_benchmarks --update-baseline   # record a new baseline
+    python -m benchmarks.run_benchmarks --stages preprocess segment --large
+"""
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.tracing import PeakRssSampler
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Relative slowdown (and absolute floor in seconds) tolerated before a stage counts as a regression
+DEFAULT_TOLERANCE = 0.20
+MIN_ABSOLUTE_REGRESSION_S = 0.05
+
+SYNTHETIC_SIZES = {
+    "synthetic_vga": (640, 480),
+    "synthetic_1080p": (1920, 1080),
+}
+LARGE_SYNTHETIC_SIZES = {
+    "synthetic_24mp": (6000, 4000),
+}
+
+
+def synthetic_image(width, height, seed=0):
+    """Deterministic test image: gradient background, flat shapes and Gaussian noise."""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    image = np.stack([x / width * 200, y / height * 200, np.full_like(x, 80)], axis=2)
+    for _ in range(12):
+        colour = rng.integers(0, 255, 3).tolist()
+        cx, cy = int(rng.integers(0, width)), int(rng.integers(0, height))
+        radius = int(rng.integers(min(width, height) // 20, min(width, height) // 5))
+        if rng.random() < 0.5:
+            cv2.circle(image, (cx, cy), radius, colour, -1)
+        else:
+            cv2.rectangle(image, (cx - radius, cy - radius), (cx + radius, cy + radius), colour, -1)
+    image += rng.normal(0, 8, image.shape).astype(np.float32)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def build_corpus(work_dir, large=False, segments=3):
+    """
+    Writes the benchmark corpus and returns {name: image_path}.
+
+    Parameters:
+        work_dir (str): Scratch directory.
+        large (bool): Include the 24 MP synthetic image.
+        segments (int): Number of existing ``segments/segment_N.png`` files to include.
+    """
+    from PIL import Image
+
+    corpus_dir = os.path.join(work_dir, "corpus")
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = {}
+    sizes = dict(SYNTHETIC_SIZES, **(LARGE_SYNTHETIC_SIZES if large else {}))
+    for seed, (name, (width, height)) in enumerate(sorted(sizes.items())):
+        path = os.path.join(corpus_dir, f"{name}.jpg")
+        Image.fromarray(synthetic_image(width, height, seed)).save(path, quality=95)
+        corpus[name] = path
+
+    segment_paths = sorted(glob.glob(os.path.join(ROOT, "segments", "segment_*.png")),
+                           key=lambda p: int(os.path.basename(p)[8:-4]))
+    for path in segment_paths[:segments]:
+        name = os.path.splitext(os.path.basename(path))[0]
+        corpus[name] = path
+    return corpus
+
+
+# Stage functions take the per-image context dict, may add to it, and return
+# the list of files they wrote. They import their dependencies lazily so a
+# missing optional library skips the stage instead of aborting the run.
+
+def stage_preprocess(ctx):
+    from src.image_processing_module.preprocess import preprocess_image
+    from src.image_processing_module.resolution import DEFAULT_CONSUMERS
+
+    image = preprocess_image(ctx["image_path"], {"Denoise": True, "Sharpen": True}, consumers=DEFAULT_CONSUMERS)
+    ctx["processed_path"] = os.path.join(ctx["out_dir"], "processed_image.jpg")
+    image.save(ctx["processed_path"])
+    return [ctx["processed_path"]]
+
+
+def stage_edges(ctx):
+    from src.image_processing_module.edge_detection import (
+        canny_edge_detector, sobel_edge_detector, laplacian_edge_detector,
+    )
+
+    outputs = []
+    for name, detector in (("canny", canny_edge_detector), ("sobel", sobel_edge_detector),
+                           ("laplacian", laplacian_edge_detector)):
+        path = os.path.join(ctx["out_dir"], f"{name}_edge.jpg")
+        detector(ctx["image_path"]).save(path)
+        outputs.append(path)
+    return outputs
+
+
+def stage_segment(ctx):
+    from src.sam2_api import segment_image
+    from benchmarks.stand_in_models import StandInSAM
+
+    segments_dir = os.path.join(ctx["out_dir"], "segments")
+    masks, _ = segment_image(StandInSAM(), ctx.get("processed_path", ctx["image_path"]), segments_dir,
+                             export_image_path=ctx["image_path"])
+    ctx["segment_path"] = os.path.join(segments_dir, "segment_1.png") if len(masks) else ctx["image_path"]
+    return glob.glob(os.path.join(segments_dir, "*.png"))
+
+
+def stage_depth(ctx):
+    from PIL import Image
+    from src.build_3D_mesh import resize_for_depth, predict_depth
+    from benchmarks.stand_in_models import load_stand_in_depth_model
+
+    feature_extractor, model = load_stand_in_depth_model()
+    image = resize_for_depth(Image.open(ctx.get("segment_path", ctx["image_path"])).convert("RGB"))
+    ctx["depth"], ctx["depth_image"] = predict_depth(image, feature_extractor, model)
+    return []
+
+
+def stage_reconstruction(ctx):
+    from src.build_3D_mesh import build_point_cloud, reconstruct_mesh
+
+    ctx["pcd"] = build_point_cloud(ctx["depth_image"], ctx["depth"])
+    ctx["mesh"] = reconstruct_mesh(ctx["pcd"])
+    return []
+
+
+def stage_export(ctx):
+    from src.build_3D_mesh import export_meshes
+
+    ctx["mesh_paths"] = export_meshes(ctx["pcd"], ctx["mesh"], os.path.join(ctx["out_dir"], "models"))
+    return list(ctx["mesh_paths"].values())
+
+
+def stage_rendering(ctx):
+    import pywavefront
+    from src.texture_mapper import compute_frame_vertices
+
+    scene = pywavefront.Wavefront(ctx["mesh_paths"]["obj"], collect_faces=True, create_materials=True, strict=False)
+    compute_frame_vertices(scene)  # Vertex setup done once per loaded mesh
+    return []
+
+
+STAGES = {
+    "preprocess": stage_preprocess,
+    "edges": stage_edges,
+    "segment": stage_segment,
+    "depth": stage_depth,
+    "reconstruction": stage_reconstruction,
+    "export": stage_export,
+    "rendering": stage_rendering,
+}
+
+
+def run_stage(func, ctx):
+    """Runs one stage and returns its metrics dict."""
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    with PeakRssSampler() as sampler:
+        try:
+            outputs = func(ctx)
+        except ImportError as e:
+            return {"status": "skipped", "reason": str(e)}
+        except Exception as e:
+            logging.exception(f"Benchmark stage {func.__name__} failed")
+            return {"status": "failed", "reason": f"{type(e).__name__}: {e}"}
+    return {
+        "status": "ok",
+        "wall_s": time.perf_counter() - wall_start,
+        "cpu_s": time.process_time() - cpu_start,
+        "peak_rss_mb": sampler.peak / 2**20 if sampler.peak is not None else None,
+        "output_bytes": sum(os.path.getsize(p) for p in outputs if os.path.exists(p)),
+    }
+
+
+def run_benchmarks(corpus, stages, work_dir):
+    """
+    Runs ``stages`` in order on every corpus image.
+
+    Returns:
+        dict: {image_name: {stage: metrics}}
+    """
+    from src.image_processing_module.image_cache import get_image_cache
+
+    results = {}
+    for name, image_path in corpus.items():
+        get_image_cache().clear()  # Every image starts cold
+        ctx = {"image_path": image_path, "out_dir": os.path.join(work_dir, name)}
+        os.makedirs(ctx["out_dir"], exist_ok=True)
+        results[name] = {}
+        for stage in stages:
+            metrics = run_stage(STAGES[stage], ctx)
+            results[name][stage] = metrics
+            print(format_metrics(name, stage, metrics))
+            if metrics["status"] != "ok":
+                break  # Later stages depend on this one
+    return results
+
+
+def format_metrics(image_name, stage, metrics):
+    if metrics["status"] != "ok":
+        return f"{image_name:<20} {stage:<15} {metrics['status']}: {metrics['reason']}"
+    rss = f"{metrics['peak_rss_mb']:.0f} MB" if metrics["peak_rss_mb"] is not None else "n/a"
+    return (f"{image_name:<20} {stage:<15} wall {metrics['wall_s']:8.3f}s  cpu {metrics['cpu_s']:8.3f}s  "
+            f"rss {rss:>8}  out {metrics['output_bytes'] / 1024:10.1f} KB")
+
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Lists stages that got slower or used more memory than the baseline allows.
+
+    Returns:
+        List[str]: Human readable regression descriptions (empty if none).
+    """
+    regressions = []
+    for image_name, stages in results.items():
+        for stage, metrics in stages.items():
+            base = baseline.get(image_name, {}).get(stage)
+            if not base or base.get("status") != "ok" or metrics.get("status") != "ok":
+                continue
+            slower = metrics["wall_s"] - base["wall_s"]
+            if slower > MIN_ABSOLUTE_REGRESSION_S and metrics["wall_s"] > base["wall_s"] * (1 + tolerance):
+                regressions.append(f"{image_name}/{stage}: wall {base['wall_s']:.3f}s -> {metrics['wall_s']:.3f}s")
+            if base.get("peak_rss_mb") and metrics.get("peak_rss_mb") \
+                    and metrics["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+                regressions.append(f"{image_name}/{stage}: peak RSS {base['peak_rss_mb']:.0f} MB -> "
+                                   f"{metrics['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def measure_startup():
+    """
+    Times ``import main`` in a fresh interpreter and lists the slowest imports.
+
+    Returns:
+        dict: Startup metrics (see ``startup.import_time_report``) plus status.
+    """
+    from src.startup import import_time_report
+
+    try:
+        report = import_time_report("main", cwd=ROOT)
+    except RuntimeError as e:
+        return {"status": "failed", "reason": str(e)}
+    report["status"] = "ok"
+    print(f"{'startup':<20} {'import main':<15} wall {report['wall_s']:8.3f}s")
+    for entry in report["slowest"][:5]:
+        print(f"{'':<20} {entry['module']:<40} {entry['cumulative_us'] / 1000:8.1f} ms")
+    return report
+
+
+def check_startup(startup, baseline_startup, tolerance=DEFAULT_TOLERANCE):
+    """Startup regressions: over ``STARTUP_BUDGET_S`` or slower than the baseline."""
+    from src.startup import STARTUP_BUDGET_S
+
+    if startup.get("status") != "ok":
+        return []
+    regressions = []
+    if startup["wall_s"] > STARTUP_BUDGET_S:
+        regressions.append(f"startup: import main took {startup['wall_s']:.3f}s, budget {STARTUP_BUDGET_S:.1f}s")
+    if baseline_startup and baseline_startup.get("status") == "ok":
+        base = baseline_startup["wall_s"]
+        if startup["wall_s"] - base > MIN_ABSOLUTE_REGRESSION_S and startup["wall_s"] > base * (1 + tolerance):
+            regressions.append(f"startup: import main {base:.3f}s -> {startup['wall_s']:.3f}s")
+    return regressions
+
+
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the jar pipeline stage by stage")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="Stages to run, in pipeline order (default: all)")
+    parser.add_argument("--large", action="store_true", help="Include a 24 MP synthetic image")
+    parser.add_argument("--segments", type=int, default=3, help="Number of segments/ images in the corpus")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative slowdown")
+    parser.add_argument("--output", "-o", help="Also write the full results JSON here")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    parser.add_argument("--skip-startup", action="store_true", help="Do not measure `import main` time")
+    args = parser.parse_args()
+
+    stages = [stage for stage in STAGES if stage in args.stages]
+    startup = None if args.skip_startup else measure_startup()
+    work_dir = tempfile.mkdtemp(prefix="jar_bench_")
+    try:
+        corpus = build_corpus(work_dir, large=args.large, segments=args.segments)
+        results = run_benchmarks(corpus, stages, work_dir)
+    finally:
+        if args.keep:
+            print(f"Scratch directory kept at {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"environment": environment_info(), "startup": startup, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+    regressions = check_startup(startup, baseline.get("startup"), args.tolerance) if startup else []
+    regressions += compare_to_baseline(results, baseline.get("results", {}), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Tiny local stand-ins for SAM and GLPN.
+
+They reproduce the call signatures and output types the pipeline relies on
+(``results[0].masks.data.cpu().numpy()`` and ``outputs.predicted_depth``) and
+do a comparable amount of array work, without downloading any weights.
+"""
+import numpy as np
+import cv2
+
+
+class _Array:
+    """Minimal tensor look-alike exposing the methods the pipeline calls."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+    def squeeze(self):
+        return _Array(np.squeeze(self.array))
+
+
+class _Masks:
+    def __init__(self, masks):
+        self.data = _Array(masks)
+
+
+class _Result:
+    def __init__(self, masks):
+        self.masks = _Masks(masks)
+
+
+class StandInSAM:
+    """
+    Point-prompted "segmentation" by colour similarity to each prompt pixel.
+
+    Called like ``ultralytics.SAM``: ``model(image, points=..., labels=...)``.
+    """
+
+    def __init__(self, tolerance=40, imgsz=1024):
+        self.tolerance = tolerance
+        self.imgsz = imgsz
+
+    def __call__(self, image, points=None, labels=None, **kwargs):
+        height, width = image.shape[:2]
+        scale = min(self.imgsz / max(height, width), 1.0)
+        small = cv2.resize(image, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                           interpolation=cv2.INTER_AREA).astype(np.int16)
+        blurred = cv2.GaussianBlur(small, (5, 5), 0)
+
+        masks = []
+        for x, y in points or []:
+            colour = blurred[min(int(y * scale), blurred.shape[0] - 1), min(int(x * scale), blurred.shape[1] - 1)]
+            mask = (np.abs(blurred - colour).max(axis=2) < self.tolerance).astype(np.uint8)
+            masks.append(cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST))
+        if not masks:
+            return []
+        return [_Result(np.stack(masks).astype(np.float32))]
+
+
+class _DepthOutput:
+    def __init__(self, depth):
+        self.predicted_depth = _Array(depth[None])
+
+
+class StandInFeatureExtractor:
+    """Mimics ``GLPNImageProcessor``: normalises to a (1, 3, H, W) float array."""
+
+    def __call__(self, images=None, return_tensors=None):
+        array = np.asarray(images, dtype=np.float32) / 255.0
+        return {"pixel_values": array.transpose(2, 0, 1)[None]}
+
+
+class StandInDepthModel:
+    """
+    Mimics ``GLPNForDepthEstimation``: depth from blurred luminance plus a
+    vertical ramp, at the input resolution.
+    """
+
+    def __call__(self, pixel_values=None, **kwargs):
+        image = pixel_values[0].transpose(1, 2, 0)
+        luminance = image @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        height = luminance.shape[0]
+        ramp = np.linspace(1.0, 3.0, height, dtype=np.float32)[:, None]
+        depth = ramp + 0.5 * cv2.GaussianBlur(luminance, (0, 0), 8)
+        return _DepthOutput(depth / 1000.0)
+
+    def eval(self):
+        return self
+
+
+def load_stand_in_depth_model():
+    """Returns a (feature_extractor, model) pair usable as ``generate_3d_models(depth_model=...)``."""
+    return StandInFeatureExtractor(), StandInDepthModel()
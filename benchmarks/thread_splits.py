@@ -0,0 +1,159 @@
+"""
+Throughput of the pipeline's CPU work under different job x thread splits.
+
+For every split of the cores into parallel jobs (1 x C, 2 x C/2, ..., C x 1)
+a fresh subprocess applies ``src.concurrency.configure_threads`` before
+importing any library, then runs a fixed number of jobs through a pool of
+that many workers. A job is a representative slice of the pipeline: tiled
+NLM denoising (``denoise_tiled``, OpenCV), a convolutional forward pass
+(torch, standing in for GLPN/SAM) and Poisson reconstruction (Open3D) with
+the per-worker thread count production passes; whichever of those
+libraries is missing is skipped. The report lists jobs per second for every split and
+the best one, which is the ``parallel_jobs`` to give the job server.
+
+Usage:
+    python -m benchmarks.thread_splits
+    python -m benchmarks.thread_splits --jobs 16 --splits 1 2 4 --output splits.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.concurrency import available_cores, configure_threads, ensure_inference_threads, threads_per_worker
+
+
+def default_splits(cores):
+    """Powers of two up to ``cores``, plus ``cores`` itself."""
+    splits = []
+    jobs = 1
+    while jobs < cores:
+        splits.append(jobs)
+        jobs *= 2
+    return splits + [cores]
+
+
+def _make_workload(size):
+    """Builds the per-job work function from the libraries that are installed."""
+    from benchmarks.run_benchmarks import synthetic_image
+
+    width, height = size
+    image = synthetic_image(width, height)
+    steps = {}
+
+    try:
+        from src.image_processing_module.denoise import denoise_tiled
+    except ImportError:
+        pass
+    else:
+        steps["denoise"] = lambda: denoise_tiled(image, 10)
+
+    try:
+        import torch
+    except ImportError:
+        pass
+    else:
+        ensure_inference_threads()
+        net = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 32, 3, stride=2, padding=1), torch.nn.ReLU(),
+            torch.nn.Conv2d(32, 64, 3, stride=2, padding=1), torch.nn.ReLU(),
+            torch.nn.Conv2d(64, 64, 3, padding=1), torch.nn.ReLU(),
+            torch.nn.Conv2d(64, 1, 3, padding=1),
+        ).eval()
+        pixels = torch.from_numpy(image).permute(2, 0, 1)[None].float() / 255.0
+
+        def forward():
+            with torch.inference_mode():
+                net(pixels)
+
+        steps["forward"] = forward
+
+    try:
+        import numpy as np
+        import open3d as o3d
+    except ImportError:
+        pass
+    else:
+        rng = np.random.default_rng(0)
+        points = rng.normal(size=(20000, 3))
+        points /= np.linalg.norm(points, axis=1, keepdims=True)
+        pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points + rng.normal(0, 0.01, points.shape)))
+        pcd.normals = o3d.utility.Vector3dVector(points)
+        steps["poisson"] = lambda: o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(
+            pcd, depth=7, n_threads=threads_per_worker())
+
+    def job():
+        for step in steps.values():
+            step()
+
+    return job, list(steps)
+
+
+def run_split(parallel_jobs, jobs, size):
+    """Runs ``jobs`` jobs on ``parallel_jobs`` workers in this process (call in a fresh process)."""
+    config = configure_threads(parallel_jobs)
+    from concurrent.futures import ThreadPoolExecutor
+
+    job, steps = _make_workload(size)
+    job()  # Warm-up: lazy initialisation and thread pool start-up
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel_jobs) as pool:
+        list(pool.map(lambda _: job(), range(jobs)))
+    elapsed = time.perf_counter() - start
+    return {
+        "parallel_jobs": parallel_jobs,
+        "threads_per_worker": config.threads_per_worker,
+        "steps": steps,
+        "jobs": jobs,
+        "seconds": round(elapsed, 4),
+        "jobs_per_second": round(jobs / elapsed, 4),
+    }
+
+
+def measure(splits, jobs, size):
+    """Runs every split in its own subprocess; thread settings are per process."""
+    results = []
+    for parallel_jobs in splits:
+        command = [sys.executable, "-m", "benchmarks.thread_splits", "--worker", str(parallel_jobs),
+                   "--jobs", str(jobs), "--size", str(size[0]), str(size[1])]
+        env = {name: value for name, value in os.environ.items() if name != "JAR_THREADS_PER_WORKER"}
+        output = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['parallel_jobs']:>3} jobs x {result['threads_per_worker']:>3} threads: "
+              f"{result['jobs_per_second']:.3f} jobs/s ({', '.join(result['steps']) or 'no workload'})")
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best jobs x threads split for this machine")
+    parser.add_argument("--splits", type=int, nargs="+", help="Parallel job counts to try (default: powers of two)")
+    parser.add_argument("--jobs", type=int, default=None, help="Jobs per split (default: 2 x cores)")
+    parser.add_argument("--size", type=int, nargs=2, default=(640, 480), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--output", "-o", help="Also write the results JSON here")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    cores = available_cores()
+    jobs = args.jobs or 2 * cores
+    if args.worker:
+        print(json.dumps(run_split(args.worker, jobs, tuple(args.size))))
+        return 0
+
+    results = measure(args.splits or default_splits(cores), jobs, tuple(args.size))
+    best = max(results, key=lambda result: result["jobs_per_second"])
+    print(f"Best on {cores} cores: {best['parallel_jobs']} parallel jobs x {best['threads_per_worker']} threads")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cores": cores, "results": results, "best": best}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,22 @@
 import sys
 import logging
+import argparse
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QGridLayout, QWidget,
-    QFileDialog, QLabel, QTabWidget, QVBoxLayout, QHBoxLayout, QCheckBox, QScrollArea
+    QFileDialog, QLabel, QTabWidget, QVBoxLayout, QHBoxLayout, QCheckBox, QScrollArea,
+    QPlainTextEdit, QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox
 )
 from PyQt5.QtGui import QPalette, QColor, QPixmap, QMovie, QMouseEvent, QPainter, QPen, QImage
-from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtCore import Qt, QPoint, QTimer
 
 import os
 import shutil
-import cv2
-import numpy as np
-from src.image_processing_module import preprocess
-from src.sam2_api import load_sam_model, segment_image  # Import SAM API functions
-from src.build_3D_mesh import generate_3d_models  # Import the 3D model generation function
-from src.view_models import show_ply_with_open3d, show_obj_with_open3d, show_glb  # Import visualization functions
+from src.thumbnail_grid import ThumbnailGrid
+from src import tracing, profiling, startup
+
+# OpenCV, ultralytics, torch, transformers, Open3D and trimesh are
+# imported where they are first needed (and prewarmed in the background once
+# the window is shown), so the window appears without waiting for them.
 
 # Configure logging
 logging.basicConfig(
@@ -206,6 +208,12 @@ class MainWindow(QMainWindow):
         # List to store marker positions
         self.markers = []
 
+        # Interactive mask preview: the upload is encoded once, markers only run the prompt decoder
+        self.segmenter = None
+        self.marker_base_pixmap = None
+        self.mask_preview = None
+        self.pipeline = None  # Built on first use; memoizes stage outputs across runs
+
         # Logs Tab
         logs_tab = QWidget()
         self.tab_widget.addTab(logs_tab, "Logs")
@@ -214,12 +222,29 @@ class MainWindow(QMainWindow):
         logs_layout = QVBoxLayout()
         logs_tab.setLayout(logs_layout)
 
-        # Logs display area
-        self.logs_display = QLabel()
+        # Live stage timings, fed incrementally from the structured trace file
+        stage_label = QLabel("Stage Timings")
+        stage_label.setStyleSheet("color: white; font-weight: bold; font-size: 14px;")
+        logs_layout.addWidget(stage_label)
+
+        self.stage_table = QTableWidget(0, 5)
+        self.stage_table.setHorizontalHeaderLabels(["Stage", "Runs", "Last (s)", "Mean (s)", "Peak RSS (MB)"])
+        self.stage_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.stage_table.verticalHeader().setVisible(False)
+        self.stage_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.stage_table.setStyleSheet("color: white; background-color: #1a1a1a; gridline-color: #333333;")
+        self.stage_table.setMaximumHeight(220)
+        logs_layout.addWidget(self.stage_table)
+        self.stage_stats = {}
+        self.trace_tail = tracing.TraceTail()
+
+        # Logs display area (appended to incrementally, capped in size)
+        self.logs_display = QPlainTextEdit()
+        self.logs_display.setReadOnly(True)
+        self.logs_display.setMaximumBlockCount(5000)
         self.logs_display.setStyleSheet("color: white; background-color: #1a1a1a; padding: 10px;")
-        self.logs_display.setAlignment(Qt.AlignTop)
-        self.logs_display.setWordWrap(True)
         logs_layout.addWidget(self.logs_display)
+        self.log_offset = 0
 
         # Refresh logs button
         refresh_button = QPushButton("Refresh Logs")
@@ -227,8 +252,17 @@ class MainWindow(QMainWindow):
         refresh_button.clicked.connect(self.refresh_logs)
         logs_layout.addWidget(refresh_button)
 
-        # Load logs initially
+        # Export metrics button
+        export_metrics_button = QPushButton("Export Metrics")
+        export_metrics_button.setObjectName("actionButton")
+        export_metrics_button.clicked.connect(self.export_metrics)
+        logs_layout.addWidget(export_metrics_button)
+
+        # Load logs initially, then tail them
         self.refresh_logs()
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.refresh_logs)
+        self.log_timer.start(1000)
 
         # Global Stylesheet for the application
         self.setStyleSheet("""
@@ -270,7 +304,8 @@ class MainWindow(QMainWindow):
         try:
             with open("application.log", "w") as log_file:
                 log_file.write("")  # Clear the log file
-            self.logs_display.setText("")  # Clear the logs display in the UI
+            self.logs_display.clear()  # Clear the logs display in the UI
+            self.log_offset = 0
             logging.info("Application closed. Logs cleared.")
         except Exception as e:
             logging.error(f"Failed to clear logs: {e}")
@@ -295,6 +330,7 @@ class MainWindow(QMainWindow):
         self.process_image()
 
     def upload_image(self):
+        from src.image_processing_module.image_cache import load_image, as_qimage
         file_dialog = QFileDialog()
         file_path, _ = file_dialog.getOpenFileName(self, "Upload Image", "", "Images (*.png *.jpg *.jpeg *.bmp)")
         if file_path:
@@ -305,11 +341,13 @@ class MainWindow(QMainWindow):
             destination_path = os.path.join(upload_dir, file_name)
             shutil.copy(file_path, destination_path)
             self.image_label.setText(f"Uploaded: {destination_path}")
-            pixmap = QPixmap(destination_path)
+            # Decode once (EXIF-oriented) and share the buffer with the later stages
+            pixmap = QPixmap.fromImage(as_qimage(load_image(destination_path)))
             self.image_display.setPixmap(pixmap.scaled(400, 400, Qt.KeepAspectRatio))
             self.original_image_label.setPixmap(pixmap.scaled(400, 400, Qt.KeepAspectRatio))  # Update settings tab viewer
             self.uploaded_image_path = destination_path  # Store the uploaded image path
             logging.info(f"Uploaded image path stored: {self.uploaded_image_path}")
+            self.start_interactive_segmentation()
         else:
             logging.warning("No image selected for upload.")
 
@@ -327,7 +365,53 @@ class MainWindow(QMainWindow):
         sharpen = self.sharpen_checkbox.isChecked()
         logging.info(f"Options selected - Denoise: {denoise}, Sharpen: {sharpen}")
 
+    def start_interactive_segmentation(self):
+        """Reset the markers and encode the uploaded image in the background."""
+        self.markers = []
+        self.mask_preview = None
+        self.marker_base_pixmap = self.original_image_label.pixmap().copy()
+        try:
+            if self.segmenter is None:
+                from src.interactive_segmentation import InteractiveSegmenter
+                self.segmenter = InteractiveSegmenter("sam2_s.pt", self)
+                self.segmenter.embedding_ready.connect(self.update_mask_preview)
+                self.segmenter.mask_ready.connect(self.show_mask_preview)
+            self.segmenter.set_image(self.uploaded_image_path)
+        except Exception as e:
+            logging.error(f"Interactive segmentation unavailable: {e}")
+
+    def update_mask_preview(self):
+        """Request a mask for the current markers; ``show_mask_preview`` overlays it when decoded."""
+        if self.segmenter is None or not self.segmenter.is_ready() or self.marker_base_pixmap is None:
+            return
+        self.mask_preview = None
+        # Markers are stored in pixmap coordinates
+        prompt_width, prompt_height = self.segmenter.size
+        scale_x = prompt_width / self.marker_base_pixmap.width()
+        scale_y = prompt_height / self.marker_base_pixmap.height()
+        points = [(int(x * scale_x), int(y * scale_y)) for x, y in self.markers]
+        # Decoded on a worker thread so the GUI stays responsive while the SAM session is busy
+        self.segmenter.request_mask(points)
+        self.update_image_with_markers()
+
+    def show_mask_preview(self, mask, latency_ms):
+        """Overlay a decoded mask on the settings tab viewer and show how long it took."""
+        from src.interactive_segmentation import mask_overlay
+        from src.image_processing_module.image_cache import as_qimage
+
+        self.mask_preview = as_qimage(mask_overlay(mask)) if mask is not None else None
+        self.original_image_label.setToolTip(f"Mask preview: {latency_ms:.0f} ms")
+        self.update_image_with_markers()
+
     def add_marker(self, event: QMouseEvent):
+        if event.button() == Qt.RightButton:
+            # Right click clears the markers and the mask preview
+            self.markers = []
+            self.mask_preview = None
+            if self.segmenter is not None:
+                self.segmenter.request_mask([])  # Drop previews still being decoded
+            self.update_image_with_markers()
+            return
         if event.button() == Qt.LeftButton:
             # Limit the number of markers to 3
             if len(self.markers) >= 3:
@@ -363,15 +447,20 @@ class MainWindow(QMainWindow):
             logging.info(f"Marker added at: ({x}, {y})")
             print(f"Marker added at: ({x}, {y})")
 
-            # Reload the image with the new marker
-            self.update_image_with_markers()
+            # Reload the image with the new marker and its mask preview
+            if self.segmenter is not None and self.segmenter.is_ready():
+                self.update_mask_preview()
+            else:
+                self.update_image_with_markers()
 
     def update_image_with_markers(self):
-        # Reload the original image
-        pixmap = self.original_image_label.pixmap()
+        # Redraw from the unmarked image so markers and previews do not accumulate
+        pixmap = self.marker_base_pixmap if self.marker_base_pixmap is not None else self.original_image_label.pixmap()
         if pixmap:
             pixmap_copy = pixmap.copy()
             painter = QPainter(pixmap_copy)
+            if self.mask_preview is not None:
+                painter.drawImage(pixmap_copy.rect(), self.mask_preview)
             pen = QPen(Qt.red)
             pen.setWidth(3)  # Increase pen width for better visibility
             painter.setPen(pen)
@@ -398,45 +487,95 @@ class MainWindow(QMainWindow):
         }
         logging.info(f"Processing image with responses: {responses}")
 
-        # Process the image
-        processed_image = preprocess.preprocess_image(self.uploaded_image_path, responses)
-
-        # Save the processed image in RGB format
         processed_dir = "PROCESSED_IMAGE"
-        os.makedirs(processed_dir, exist_ok=True)
-        processed_image_path = os.path.join(processed_dir, "processed_image.jpg")
-        processed_image.save(processed_image_path)  # Save as RGB
-        logging.info(f"Processed image saved at: {processed_image_path}")
-
-        # Generate edge-detected images
-        from src.image_processing_module.edge_detection import (
-            canny_edge_detector,
-            sobel_edge_detector,
-            laplacian_edge_detector,
-        )
-
-        try:
-            canny_image = canny_edge_detector(self.uploaded_image_path)
-            canny_image.save(os.path.join(processed_dir, "canny_edge.jpg"))
-
-            sobel_image = sobel_edge_detector(self.uploaded_image_path)
-            sobel_image.save(os.path.join(processed_dir, "sobel_edge.jpg"))
-
-            laplacian_image = laplacian_edge_detector(self.uploaded_image_path)
-            laplacian_image.save(os.path.join(processed_dir, "laplacian_edge.jpg"))
-        except Exception as e:
-            logging.error(f"Error generating edge-detected images: {e}")
-
-        # Generate segments using SAM API
         segments_dir = "segments"
-        os.makedirs(segments_dir, exist_ok=True)
-        model = load_sam_model("sam2_s.pt")
-        if model is not None:
-            segment_image(model, processed_image_path, segments_dir)
+        if self.pipeline is None:
+            self.pipeline = self.build_pipeline(processed_dir, segments_dir)
+
+        with tracing.job() as job_id:
+            logging.info(f"Processing job {job_id}")
+            # Only stages whose inputs or checkboxes changed since the last run are executed
+            outputs = self.pipeline.run({"upload": self.uploaded_image_path}, responses)
+            logging.info(f"Pipeline stages: {self.pipeline.last_run}")
+            self.processed_image_path = outputs["preprocess"]  # Depth source for multi-segment 3D
 
         # Display processed images and segments in the same tab
         self.display_images_and_segments_tab(processed_dir, segments_dir)
 
+    def build_pipeline(self, processed_dir, segments_dir):
+        """
+        Builds the processing DAG: preprocess and edge detection read the upload,
+        segmentation reads the preprocessed image (and the upload for cut-outs).
+        """
+        from src.pipeline import Pipeline
+
+        def preprocess_stage(upload, **responses):
+            from src.image_processing_module import preprocess
+            from src.image_processing_module.resolution import DEFAULT_CONSUMERS
+
+            os.makedirs(processed_dir, exist_ok=True)
+            # Process the image at the resolution SAM and the depth model consume
+            with tracing.span("preprocess", input_path=upload, **responses) as attrs, \
+                    profiling.profile_stage("preprocess", processed_dir):
+                processed_image = preprocess.preprocess_image(upload, responses, consumers=DEFAULT_CONSUMERS)
+                attrs["output_size"] = processed_image.size
+
+            # Save the processed image in RGB format
+            processed_image_path = os.path.join(processed_dir, "processed_image.jpg")
+            processed_image.save(processed_image_path)  # Save as RGB
+            logging.info(f"Processed image saved at: {processed_image_path}")
+            return processed_image_path
+
+        def edges_stage(upload):
+            # Generate edge-detected images
+            from src.image_processing_module.edge_detection import (
+                canny_edge_detector,
+                sobel_edge_detector,
+                laplacian_edge_detector,
+            )
+
+            os.makedirs(processed_dir, exist_ok=True)
+            paths = []
+            try:
+                with tracing.span("edge_detection", input_path=upload), \
+                        profiling.profile_stage("edge_detection", processed_dir):
+                    for name, detector in (("canny_edge.jpg", canny_edge_detector),
+                                           ("sobel_edge.jpg", sobel_edge_detector),
+                                           ("laplacian_edge.jpg", laplacian_edge_detector)):
+                        path = os.path.join(processed_dir, name)
+                        detector(upload).save(path)
+                        paths.append(path)
+            except Exception as e:
+                logging.error(f"Error generating edge-detected images: {e}")
+                return None
+            return paths
+
+        def segment_stage(processed_image_path, upload):
+            from src.sam2_api import load_sam_session, segment_image  # Import SAM API functions
+
+            # Generate segments using SAM API
+            os.makedirs(segments_dir, exist_ok=True)
+            with tracing.span("load_sam_model", model="sam2_s.pt"):
+                # Embeddings are cached per image, so repeated runs skip the encoder
+                model = load_sam_session("sam2_s.pt")
+            if model is None:
+                return None
+            with tracing.span("segment", model="sam2_s.pt", input_path=processed_image_path) as attrs, \
+                    profiling.profile_stage("segment", segments_dir):
+                # Cut the RGBA segments out of the full-resolution upload
+                masks, _ = segment_image(model, processed_image_path, segments_dir, export_image_path=upload)
+                attrs["segments"] = len(masks)
+            return segments_dir
+
+        pipeline = Pipeline()
+        pipeline.add_stage("preprocess", preprocess_stage, inputs=("upload",), params=("Denoise", "Sharpen"),
+                           check=os.path.exists)
+        pipeline.add_stage("edges", edges_stage, inputs=("upload",),
+                           check=lambda paths: paths is not None and all(map(os.path.exists, paths)))
+        pipeline.add_stage("segment", segment_stage, inputs=("preprocess", "upload"),
+                           check=lambda path: path is not None and os.path.isdir(path))
+        return pipeline
+
     def display_images_and_segments_tab(self, processed_dir, segments_dir):
         """Display processed images and segmented images in the same tab with a scroll bar."""
         if not hasattr(self, "uploaded_image_path") or not self.uploaded_image_path:
@@ -444,6 +583,7 @@ class MainWindow(QMainWindow):
             return
 
         logging.info("Displaying processed images and segmented images in a combined tab.")
+        from src.image_processing_module.image_cache import load_image, as_qimage
 
         # Create a new tab for processed images and segments
         combined_tab = QWidget()
@@ -482,7 +622,7 @@ class MainWindow(QMainWindow):
         for caption, image_path in processed_images:
             if os.path.exists(image_path):
                 # Load image
-                pixmap = QPixmap(image_path)
+                pixmap = QPixmap.fromImage(as_qimage(load_image(image_path)))
 
                 # Image display
                 image_label = QLabel()
@@ -509,53 +649,36 @@ class MainWindow(QMainWindow):
         segmented_label.setStyleSheet("color: white; font-size: 16px; font-weight: bold; margin-top: 20px;")
         scroll_layout.addWidget(segmented_label)
 
-        segmented_grid = QGridLayout()
-        scroll_layout.addLayout(segmented_grid)
+        # Thumbnails are built in the background, only for segments scrolled into view
+        segmented_grid = ThumbnailGrid()
+        segmented_grid.setMinimumHeight(480)
+        scroll_layout.addWidget(segmented_grid)
 
-        row, col = 0, 0
         self.selected_segment_path = None  # Store the selected segmented image path
+        self.selected_segment_paths = []  # Ctrl/Shift-click selects several segments
 
-        def select_segment(image_path, image_label):
+        def select_segment(image_path):
             """Handle selection of a segmented image."""
             self.selected_segment_path = image_path
             logging.info(f"Selected segmented image: {image_path}")
 
-            # Highlight the selected image
-            for i in range(segmented_grid.count()):
-                widget = segmented_grid.itemAt(i).widget()
-                if isinstance(widget, QLabel):
-                    widget.setStyleSheet("border: 2px solid gray;")  # Reset border
-            image_label.setStyleSheet("border: 2px solid red;")  # Highlight selected image
+        segmented_grid.image_selected.connect(select_segment)
+
+        def select_segments(image_paths):
+            """Track every selected segment for multi-segment 3D generation."""
+            self.selected_segment_paths = image_paths
+            if len(image_paths) > 1:
+                logging.info(f"Selected {len(image_paths)} segmented images")
+
+        segmented_grid.selection_changed.connect(select_segments)
 
         segment_images = [
             (f"Segment {i+1}", os.path.join(segments_dir, f"segment_{i+1}.png"))
             for i in range(len(os.listdir(segments_dir)) - 1)  # Exclude composite.png
         ]
-
-        for caption, image_path in segment_images:
-            if os.path.exists(image_path):
-                # Load image
-                pixmap = QPixmap(image_path)
-
-                # Image display
-                image_label = QLabel()
-                image_label.setPixmap(pixmap.scaled(200, 200, Qt.KeepAspectRatio))
-                image_label.setAlignment(Qt.AlignCenter)
-                image_label.setStyleSheet("border: 2px solid gray;")
-                image_label.mousePressEvent = lambda event, path=image_path, label=image_label: select_segment(path, label)
-                segmented_grid.addWidget(image_label, row, col)
-
-                # Caption
-                caption_label = QLabel(caption)
-                caption_label.setAlignment(Qt.AlignCenter)
-                caption_label.setStyleSheet("color: white; font-size: 12px;")
-                segmented_grid.addWidget(caption_label, row + 1, col)
-
-                # Update row and column for grid placement
-                col += 1
-                if col > 2:  # 3 images per row
-                    col = 0
-                    row += 2
+        segmented_grid.set_images(
+            [(caption, image_path) for caption, image_path in segment_images if os.path.exists(image_path)]
+        )
 
         # Add "Create 3D Model" button
         create_3d_button = QPushButton("Create 3D Model")
@@ -568,23 +691,55 @@ class MainWindow(QMainWindow):
         self.tab_widget.setCurrentWidget(combined_tab)
 
     def create_3d_model(self):
-        """Send the selected segmented image to the 3D model generation function."""
+        """Send the selected segmented image(s) to the 3D model generation function."""
+        segment_paths = getattr(self, "selected_segment_paths", [])
+        source_path = getattr(self, "processed_image_path", None)
+        if len(segment_paths) > 1 and source_path and os.path.exists(source_path):
+            self.create_segment_models(source_path, segment_paths)
+            return
+
         if not self.selected_segment_path:
             logging.warning("No segmented image selected for 3D model generation.")
             self.image_label.setText("Please select a segmented image first.")
             return
 
         logging.info(f"Generating 3D model for: {self.selected_segment_path}")
-        generate_3d_models(self.selected_segment_path)
+        from src.build_3D_mesh import generate_3d_models  # Import the 3D model generation function
+        # generate_3d_models profiles its own depth/reconstruction/export stages
+        with tracing.job(), tracing.span("generate_3d_models", input_path=self.selected_segment_path):
+            # Segments carry no EXIF; the intrinsics come from the uploaded photo
+            generate_3d_models(self.selected_segment_path,
+                               camera_image_path=getattr(self, "uploaded_image_path", None))
         logging.info("3D model generation complete.")
 
         # Display the generated 3D models in a new tab
         self.display_3d_models_tab()
 
-    def display_3d_models_tab(self):
-        """Display buttons to view the generated 3D models."""
+    def create_segment_models(self, source_path, segment_paths):
+        """Predict depth once for the source image and build a mesh per selected segment."""
+        logging.info(f"Generating 3D models for {len(segment_paths)} segments of {source_path}")
+        from src.build_3D_mesh import generate_segment_models
+        with tracing.job(), tracing.span("generate_segment_models", input_path=source_path,
+                                         segments=len(segment_paths)) as attrs:
+            results = generate_segment_models(source_path, segment_paths,
+                                              camera_image_path=getattr(self, "uploaded_image_path", None))
+            attrs["models"] = len(results)
+        logging.info("Multi-segment 3D model generation complete.")
+
+        if not results:
+            # Never fall back to the output directory: it holds the previous run's models
+            logging.error(f"3D model generation failed for every segment of {source_path}")
+            QMessageBox.warning(self, "3D Models",
+                                "No 3D model could be generated for the selected segments. See the Logs tab.")
+            return
+        model_dirs = [os.path.dirname(paths["obj"]) for paths in results.values()]
+        self.display_3d_models_tab(model_dirs)
+
+    def display_3d_models_tab(self, model_dirs=None):
+        """Display buttons to view the generated 3D models (one row group per model directory)."""
         generated_dir = "GENERATED_3D_MODELS"
-        if not os.path.exists(generated_dir):
+        model_dirs = model_dirs or [generated_dir]
+        if not any(os.path.exists(model_dir) for model_dir in model_dirs):
             logging.warning("No 3D models directory found.")
             return
 
@@ -606,14 +761,30 @@ class MainWindow(QMainWindow):
         grid_layout = QGridLayout()
         layout.addLayout(grid_layout)
 
+        row = 0
+        for model_dir in model_dirs:
+            if len(model_dirs) > 1:
+                # Caption each segment's group of buttons
+                dir_label = QLabel(os.path.basename(model_dir).replace("_", " ").title())
+                dir_label.setStyleSheet("color: white; font-size: 16px; font-weight: bold; margin-top: 10px;")
+                grid_layout.addWidget(dir_label, row, 0, 1, 3)
+                row += 1
+            row = self.add_model_buttons(grid_layout, model_dir, row)
+
+        # Switch to the 3D models tab
+        self.tab_widget.setCurrentWidget(model_tab)
+
+    def add_model_buttons(self, grid_layout, generated_dir, row):
+        """Add view buttons for the models in ``generated_dir`` starting at ``row``; returns the next free row."""
         # Add buttons for each model type
         model_files = {
             "PLY File": os.path.join(generated_dir, "point_cloud.ply"),
             "OBJ File": os.path.join(generated_dir, "mesh.obj"),
             "GLB File": os.path.join(generated_dir, "mesh.glb"),
+            "Textured OBJ": os.path.join(generated_dir, "mesh_textured.obj"),
         }
 
-        row, col = 0, 0
+        col = 0
         for label, file_path in model_files.items():
             if os.path.exists(file_path):
                 # Add a label for the file type
@@ -645,14 +816,13 @@ class MainWindow(QMainWindow):
                     row += 2
             else:
                 logging.warning(f"{label} not found: {file_path}")
-
-        # Switch to the 3D models tab
-        self.tab_widget.setCurrentWidget(model_tab)
+        return row + 2 if col else row
 
     def view_3d_model(self, file_path, label):
         """Open and display the 3D model using the appropriate viewer."""
         logging.info(f"Viewing {label}: {file_path}")
         try:
+            from src.view_models import show_ply_with_open3d, show_obj_with_open3d, show_glb
             if file_path.endswith(".ply"):
                 show_ply_with_open3d(file_path)
             elif file_path.endswith(".obj"):
@@ -665,15 +835,49 @@ class MainWindow(QMainWindow):
             logging.error(f"Error viewing {label}: {e}")
 
     def refresh_logs(self):
-        """Load and display the contents of the log file."""
+        """Append new lines of the log file and fold new trace spans into the stage table."""
         try:
+            if os.path.getsize("application.log") < self.log_offset:
+                # The log was truncated, start over
+                self.log_offset = 0
+                self.logs_display.clear()
             with open("application.log", "r") as log_file:
-                logs = log_file.read()
-                self.logs_display.setText(logs)
-                logging.info("Logs refreshed.")
+                log_file.seek(self.log_offset)
+                new_logs = log_file.read()
+                self.log_offset = log_file.tell()
+            if new_logs:
+                self.logs_display.appendPlainText(new_logs.rstrip("\n"))
         except FileNotFoundError:
-            self.logs_display.setText("No logs available.")
-            logging.warning("Log file not found.")
+            if self.log_offset == 0 and not self.logs_display.toPlainText():
+                self.logs_display.setPlainText("No logs available.")
+
+        records = self.trace_tail.read_new()
+        for record in records:
+            stats = self.stage_stats.setdefault(record["stage"], {"runs": 0, "total": 0.0, "last": 0.0, "peak": None})
+            stats["runs"] += 1
+            stats["total"] += record["duration_s"]
+            stats["last"] = record["duration_s"]
+            if record.get("peak_rss_bytes") is not None:
+                stats["peak"] = max(stats["peak"] or 0, record["peak_rss_bytes"])
+        if records:
+            self.update_stage_table()
+
+    def update_stage_table(self):
+        """Redraw the stage timing table from the accumulated span statistics."""
+        self.stage_table.setRowCount(len(self.stage_stats))
+        for row, (stage, stats) in enumerate(sorted(self.stage_stats.items())):
+            peak = f"{stats['peak'] / 2**20:.0f}" if stats["peak"] is not None else "-"
+            values = [stage, str(stats["runs"]), f"{stats['last']:.3f}",
+                      f"{stats['total'] / stats['runs']:.3f}", peak]
+            for col, value in enumerate(values):
+                self.stage_table.setItem(row, col, QTableWidgetItem(value))
+
+    def export_metrics(self):
+        """Write the in-process metrics in Prometheus text format."""
+        metrics_path = "metrics.prom"
+        with open(metrics_path, "w") as f:
+            f.write(tracing.prometheus_text())
+        logging.info(f"Metrics exported to {metrics_path}")
 
     def open_3d_model_tab(self):
         """Open a new tab and display the text 'See 3D model here'."""
@@ -696,9 +900,19 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="jar desktop application")
+    parser.add_argument("--profile", choices=profiling.PROFILERS, default=None,
+                        help=f"Profile every pipeline stage (overrides ${profiling.PROFILE_ENV_VAR})")
+    args, qt_args = parser.parse_known_args()
+    if args.profile:
+        profiling.set_profiler(args.profile)
+
+    app = QApplication(sys.argv[:1] + qt_args)
     window = MainWindow()
     window.show()
+
+    # Import the heavy pipeline modules in the background once the window is up
+    QTimer.singleShot(0, startup.start_prewarm)
     sys.exit(app.exec_())
 
 
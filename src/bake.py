@@ -0,0 +1,282 @@
+"""
+Offline texture baking for reconstructed meshes.
+
+Meshes built from one depth map are height fields seen from a single
+camera, so the camera projection is already a valid single-chart UV atlas:
+each vertex's UV is its pixel in the source image, and that image is the
+texture. When ``xatlas`` is installed, ``method="xatlas"`` unwraps the mesh
+into a packed atlas instead and bakes the source pixels into it. The
+textured mesh is exported once as OBJ+MTL and GLB, so viewers only sample a
+static texture and never generate UVs per frame.
+
+``project_vertex_colors`` colours the mesh vertices directly from the same
+photo, for viewers and formats that ignore textures.
+"""
+import os
+import logging
+
+import numpy as np
+from PIL import Image
+
+from src.camera import intrinsics_from_fov
+
+BAKE_TEXTURE_SIZE = 2048
+
+# Maximum barycentric subdivisions per triangle when splatting into an atlas
+MAX_SPLAT_SUBDIVISIONS = 32
+
+# Texels of padding grown around atlas charts to avoid seams under filtering
+GUTTER = 4
+
+# Relative depth slack when testing a vertex against the z-buffer
+DEPTH_TOLERANCE = 0.02
+
+# reconstruct_mesh rotates by pi about x; the rotation is its own inverse
+_CAMERA_FROM_MESH = np.array([1.0, -1.0, -1.0])
+
+
+def project_to_image(vertices, intrinsics):
+    """
+    Projects mesh vertices (in ``reconstruct_mesh``'s upright frame) into the source image.
+
+    Returns:
+        np.ndarray: (N, 2) pixel coordinates (x, y).
+    """
+    camera = vertices * _CAMERA_FROM_MESH
+    z = np.maximum(camera[:, 2], 1e-6)
+    return np.stack([intrinsics.fx * camera[:, 0] / z + intrinsics.cx,
+                     intrinsics.fy * camera[:, 1] / z + intrinsics.cy], axis=1)
+
+
+def camera_uvs(vertices, intrinsics):
+    """UVs from the camera projection, in [0, 1] with v pointing up."""
+    pixels = project_to_image(vertices, intrinsics)
+    uvs = np.stack([pixels[:, 0] / intrinsics.width, 1.0 - pixels[:, 1] / intrinsics.height], axis=1)
+    return np.clip(uvs, 0.0, 1.0)
+
+
+def _bilinear(image, x, y):
+    """Samples (N,) float pixel positions of an (H, W, C) image bilinearly."""
+    height, width = image.shape[:2]
+    x = np.clip(x, 0, width - 1)
+    y = np.clip(y, 0, height - 1)
+    x0 = np.minimum(np.floor(x).astype(np.int64), width - 2) if width > 1 else np.zeros(len(x), np.int64)
+    y0 = np.minimum(np.floor(y).astype(np.int64), height - 2) if height > 1 else np.zeros(len(y), np.int64)
+    x1 = np.minimum(x0 + 1, width - 1)
+    y1 = np.minimum(y0 + 1, height - 1)
+    fx = (x - x0)[:, None]
+    fy = (y - y0)[:, None]
+    top = image[y0, x0] * (1 - fx) + image[y0, x1] * fx
+    bottom = image[y1, x0] * (1 - fx) + image[y1, x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def project_vertex_colors(vertices, source_image, intrinsics, mask=None, fallback=None,
+                          depth_tolerance=DEPTH_TOLERANCE, zbuffer_radius=1):
+    """
+    Colours mesh vertices from the source image, skipping occluded ones.
+
+    Vertices are projected with the back-projection intrinsics and z-buffered
+    at image resolution: per pixel, the nearest vertex depth, min-filtered
+    over ``zbuffer_radius`` to close gaps between vertices. A vertex is
+    visible if it is within ``depth_tolerance`` of that depth. Everything is
+    vectorized (one sort for the z-buffer), so millions of vertices take
+    seconds.
+
+    Parameters:
+        vertices (np.ndarray): (N, 3) vertices in ``reconstruct_mesh``'s frame.
+        source_image (np.ndarray): (H, W, 3) uint8 image the depth was predicted from.
+        intrinsics (camera.Intrinsics): Intrinsics of ``source_image``.
+        mask (np.ndarray, optional): (H, W) bool; pixels outside it colour nothing.
+        fallback (np.ndarray, optional): (N, 3) colours in [0, 1] kept for
+            hidden vertices (e.g. Poisson's interpolated colours); grey otherwise.
+
+    Returns:
+        tuple: (colours (N, 3) float64 in [0, 1], visible (N,) bool)
+    """
+    import cv2
+
+    image = np.asarray(source_image, dtype=np.float32)
+    height, width = image.shape[:2]
+    z = (vertices * _CAMERA_FROM_MESH)[:, 2]
+    pixels = project_to_image(vertices, intrinsics)
+    px = np.rint(pixels[:, 0]).astype(np.int64)
+    py = np.rint(pixels[:, 1]).astype(np.int64)
+
+    candidates = np.nonzero((z > 0) & (px >= 0) & (px < width) & (py >= 0) & (py < height))[0]
+    if mask is not None:
+        candidates = candidates[mask[py[candidates], px[candidates]]]
+    flat = py[candidates] * width + px[candidates]
+
+    # Nearest depth per pixel: sort by (pixel, depth) and keep each pixel's first entry
+    order = np.lexsort((z[candidates], flat))
+    first_pixels, first = np.unique(flat[order], return_index=True)
+    zbuffer = np.full(height * width, np.inf, dtype=np.float32)
+    zbuffer[first_pixels] = z[candidates][order][first]
+    zbuffer = zbuffer.reshape(height, width)
+    if zbuffer_radius:
+        kernel = np.ones((2 * zbuffer_radius + 1,) * 2, np.uint8)
+        zbuffer = cv2.erode(zbuffer, kernel)  # Min filter
+
+    visible = np.zeros(len(vertices), dtype=bool)
+    visible[candidates] = z[candidates] <= zbuffer.ravel()[flat] * (1 + depth_tolerance)
+
+    if fallback is not None and len(fallback) == len(vertices):
+        colors = np.array(fallback, dtype=np.float64)
+    else:
+        colors = np.full((len(vertices), 3), 0.5)
+    colors[visible] = _bilinear(image, pixels[visible, 0], pixels[visible, 1]) / 255.0
+    return colors, visible
+
+
+def unwrap(vertices, faces, intrinsics, method="auto"):
+    """
+    Computes a UV atlas.
+
+    Parameters:
+        vertices (np.ndarray): (N, 3) vertices.
+        faces (np.ndarray): (F, 3) triangle indices.
+        intrinsics (camera.Intrinsics): Camera of the source image.
+        method (str): "camera", "xatlas", or "auto" (xatlas if installed).
+
+    Returns:
+        tuple: (vertices, faces, uvs, method). xatlas may split vertices along seams.
+    """
+    if method in ("auto", "xatlas"):
+        try:
+            import xatlas
+        except ImportError:
+            if method == "xatlas":
+                raise
+            method = "camera"
+        else:
+            vmapping, faces, uvs = xatlas.parametrize(vertices.astype(np.float32), faces.astype(np.uint32))
+            return vertices[vmapping], faces.astype(np.int64), uvs.astype(np.float64), "xatlas"
+    return vertices, faces, camera_uvs(vertices, intrinsics), "camera"
+
+
+def _barycentric_grid(subdivisions):
+    i, j = np.meshgrid(np.arange(subdivisions + 1), np.arange(subdivisions + 1), indexing="ij")
+    keep = i + j <= subdivisions
+    a = i[keep] / subdivisions
+    b = j[keep] / subdivisions
+    return np.stack([a, b, 1.0 - a - b], axis=1)
+
+
+def _fill_gutters(texture, filled, iterations=GUTTER):
+    """Grows charts outward so bilinear/mipmapped sampling does not bleed background into them."""
+    import cv2
+
+    kernel = np.ones((3, 3), np.uint8)
+    for _ in range(iterations):
+        grown = cv2.dilate(texture, kernel)
+        grown_mask = cv2.dilate(filled.astype(np.uint8), kernel).astype(bool)
+        new = grown_mask & ~filled
+        texture[new] = grown[new]
+        filled = grown_mask
+    return texture
+
+
+def bake_texture(vertices, faces, uvs, source_image, intrinsics, size=BAKE_TEXTURE_SIZE, chunk=4096):
+    """
+    Bakes the source image into a UV atlas by splatting barycentric samples.
+
+    Every triangle is sampled on a barycentric grid fine enough for about one
+    sample per texel. Each sample's 3D position is projected into the source
+    image and its colour written at the sample's texel.
+
+    Parameters:
+        vertices, faces, uvs (np.ndarray): Unwrapped mesh.
+        source_image (np.ndarray): (H, W, 3) uint8 image the depth was predicted from.
+        intrinsics (camera.Intrinsics): Intrinsics of ``source_image``.
+        size (int): Texture edge in texels.
+
+    Returns:
+        np.ndarray: (size, size, 3) uint8 texture (row 0 is the top, v = 1).
+    """
+    texture = np.zeros((size, size, 3), dtype=np.uint8)
+    filled = np.zeros((size, size), dtype=bool)
+    tri_uv = uvs[faces] * (size - 1)          # (F, 3, 2) in texels
+    tri_xyz = vertices[faces]                  # (F, 3, 3)
+
+    edge = np.max(np.linalg.norm(tri_uv - np.roll(tri_uv, 1, axis=1), axis=2), axis=1)
+    subdivisions = int(np.clip(np.ceil(np.percentile(edge, 99)) if len(edge) else 1, 1, MAX_SPLAT_SUBDIVISIONS))
+    weights = _barycentric_grid(subdivisions)  # (S, 3)
+
+    height, width = source_image.shape[:2]
+    for start in range(0, len(faces), chunk):
+        texels = np.einsum("sk,fkd->fsd", weights, tri_uv[start:start + chunk]).reshape(-1, 2)
+        points = np.einsum("sk,fkd->fsd", weights, tri_xyz[start:start + chunk]).reshape(-1, 3)
+        pixels = project_to_image(points, intrinsics)
+        px = np.clip(np.rint(pixels[:, 0]).astype(np.int64), 0, width - 1)
+        py = np.clip(np.rint(pixels[:, 1]).astype(np.int64), 0, height - 1)
+        tx = np.clip(np.rint(texels[:, 0]).astype(np.int64), 0, size - 1)
+        ty = (size - 1) - np.clip(np.rint(texels[:, 1]).astype(np.int64), 0, size - 1)
+        texture[ty, tx] = source_image[py, px]
+        filled[ty, tx] = True
+    return _fill_gutters(texture, filled)
+
+
+def export_textured(vertices, faces, uvs, texture, output_dir, name="mesh_textured"):
+    """
+    Writes OBJ+MTL (with the texture as PNG) and a textured GLB.
+
+    Returns:
+        dict: Paths of "textured_obj", "textured_glb" and "texture".
+    """
+    import trimesh
+    from trimesh.exchange.obj import export_obj
+
+    os.makedirs(output_dir, exist_ok=True)
+    image = Image.fromarray(texture)
+    mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False,
+                           visual=trimesh.visual.TextureVisuals(uv=uvs, image=image))
+    paths = {
+        "textured_obj": os.path.join(output_dir, f"{name}.obj"),
+        "textured_glb": os.path.join(output_dir, f"{name}.glb"),
+        "texture": os.path.join(output_dir, f"{name}.png"),
+    }
+
+    obj_text, files = export_obj(mesh, include_texture=True, return_texture=True, mtl_name=f"{name}.mtl")
+    with open(paths["textured_obj"], "w") as f:
+        f.write(obj_text)
+    for file_name, data in files.items():
+        with open(os.path.join(output_dir, file_name), "wb") as f:
+            f.write(data)
+    image.save(paths["texture"])
+    mesh.export(paths["textured_glb"])
+    return paths
+
+
+def bake_mesh(mesh, source_image, output_dir, intrinsics=None, texture=None, method="auto",
+              size=BAKE_TEXTURE_SIZE):
+    """
+    Unwraps a reconstructed mesh once and exports it with a baked texture.
+
+    Parameters:
+        mesh (o3d.geometry.TriangleMesh): Mesh from ``reconstruct_mesh``.
+        source_image (PIL.Image.Image): The image the depth map was predicted
+            from (cropped like the depth map).
+        output_dir (str): Output directory.
+        intrinsics (camera.Intrinsics, optional): Intrinsics of ``source_image``.
+        texture (np.ndarray, optional): A texture to apply instead of the
+            projected photo, e.g. from ``texture_synthesis``; it is laid over
+            the UV atlas as is.
+        method (str): UV method, see ``unwrap``.
+        size (int): Baked texture edge for atlas baking.
+
+    Returns:
+        dict: Output paths, see ``export_textured``.
+    """
+    image = np.asarray(source_image.convert("RGB"))
+    intrinsics = intrinsics or intrinsics_from_fov(image.shape[1], image.shape[0])
+    vertices = np.asarray(mesh.vertices)
+    faces = np.asarray(mesh.triangles, dtype=np.int64)
+
+    vertices, faces, uvs, method = unwrap(vertices, faces, intrinsics, method)
+    if texture is None:
+        # Camera UVs address the photo directly; an atlas needs it baked in
+        texture = image if method == "camera" else bake_texture(vertices, faces, uvs, image, intrinsics, size)
+    paths = export_textured(vertices, faces, uvs, np.asarray(texture, dtype=np.uint8), output_dir)
+    logging.info(f"Baked {len(faces)} triangles ({method} UVs) into {paths['texture']}")
+    return paths
@@ -0,0 +1,211 @@
+"""
+Dynamic micro-batching of model requests.
+
+Concurrent jobs that each run a model on one image leave most of a batched
+forward pass's throughput unused. A ``MicroBatcher`` sits in front of a
+model: callers block on ``batcher(item)`` while a single worker thread
+collects requests for up to ``max_wait_ms`` after the first one (or until
+``max_batch_size`` are waiting), runs one forward pass over all of them and
+hands each caller its own result.
+
+Every batch records its size (``jar_batch_size``) and every request its
+time in the queue (``jar_batch_queue_delay_seconds``) as histograms in
+``tracing.metrics``, labelled by model.
+
+Batched models:
+    BatchedDepthModel  - drop-in for the GLPN model in a (feature_extractor, model)
+                         pair; inputs are padded to a shared multiple-of-32 shape
+    SamSession.encode_batch behind ``sam_encoder_batcher`` - fills the SAM
+                         embedding cache, so the per-image prompt pass is a cache hit
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+from src import tracing
+
+BATCH_SIZE_ENV_VAR = "JAR_BATCH_SIZE"
+BATCH_WAIT_ENV_VAR = "JAR_BATCH_WAIT_MS"
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT_MS = 10
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_DELAY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+_CLOSE = object()
+
+
+class MicroBatcher:
+    """
+    Collects single requests into batches for one forward function.
+
+    Parameters:
+        forward (callable): Maps a list of items to a list of results of the same length.
+        max_batch_size (int): Largest batch; defaults to ``JAR_BATCH_SIZE`` or 8.
+        max_wait_ms (float): Longest a request waits for others; defaults to
+            ``JAR_BATCH_WAIT_MS`` or 10.
+        name (str): Model label for metrics, spans and the worker thread.
+    """
+
+    def __init__(self, forward, max_batch_size=None, max_wait_ms=None, name="model"):
+        self.forward = forward
+        self.max_batch_size = max_batch_size or int(os.environ.get(BATCH_SIZE_ENV_VAR, DEFAULT_BATCH_SIZE))
+        wait_ms = max_wait_ms if max_wait_ms is not None else float(os.environ.get(BATCH_WAIT_ENV_VAR,
+                                                                                   DEFAULT_MAX_WAIT_MS))
+        self.max_wait = wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"jar-batcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queues one request and returns a ``Future`` of its result."""
+        if self._closed:
+            raise RuntimeError(f"Batcher {self.name} is closed")
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _CLOSE:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Requests that queued up during the previous forward pass are taken without waiting
+            timeout = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _CLOSE:
+                self._queue.put(_CLOSE)  # Stop after this batch
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            for _, _, queued in batch:
+                tracing.metrics.observe("jar_batch_queue_delay_seconds", start - queued,
+                                        buckets=QUEUE_DELAY_BUCKETS, model=self.name)
+            tracing.metrics.observe("jar_batch_size", len(batch), buckets=BATCH_SIZE_BUCKETS, model=self.name)
+            try:
+                with tracing.span(f"batch_{self.name}", sample_memory=False, batch_size=len(batch)):
+                    results = self.forward([item for item, _, _ in batch])
+            except Exception as e:
+                logging.error(f"Batched {self.name} forward failed for {len(batch)} requests: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+
+    def close(self):
+        """Finishes the queued requests and stops the worker."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_CLOSE)
+            self._thread.join()
+
+
+def pad_batch(tensors, multiple=32):
+    """
+    Stacks (1, C, H, W) tensors of different sizes into one batch.
+
+    Each is padded on the bottom and right, by edge replication, to the
+    largest height and width rounded up to ``multiple``.
+
+    Returns:
+        tuple: ((B, C, H, W) tensor, list of the original (height, width))
+    """
+    import torch
+    import torch.nn.functional as F
+
+    sizes = [tuple(tensor.shape[-2:]) for tensor in tensors]
+    height = -(-max(h for h, _ in sizes) // multiple) * multiple
+    width = -(-max(w for _, w in sizes) // multiple) * multiple
+    padded = [
+        F.pad(tensor, (0, width - w, 0, height - h), mode="replicate") if (h, w) != (height, width) else tensor
+        for tensor, (h, w) in zip(tensors, sizes)
+    ]
+    return torch.cat(padded), sizes
+
+
+class BatchedDepthModel:
+    """
+    Micro-batched depth model, called like GLPN (``model(pixel_values=...)``).
+
+    Pass ``(feature_extractor, BatchedDepthModel(model))`` wherever a depth
+    model pair is expected (``generate_3d_models``, ``estimate_depth``).
+    Each caller's depth map is cropped back from the padded batch. The model
+    may be a ``depth_backends`` backend.
+    """
+
+    def __init__(self, model, max_batch_size=None, max_wait_ms=None):
+        self.model = model
+        self.batcher = MicroBatcher(self._forward, max_batch_size, max_wait_ms, name="depth")
+
+    def _forward(self, pixel_values):
+        import torch
+
+        batch, sizes = pad_batch(pixel_values)
+        with torch.inference_mode():
+            depth = self.model(pixel_values=batch).predicted_depth
+        return [depth[i:i + 1, :h, :w] for i, (h, w) in enumerate(sizes)]
+
+    def __call__(self, pixel_values=None, **kwargs):
+        from src.depth_backends import DepthOutput
+
+        return DepthOutput(self.batcher(pixel_values))
+
+    def close(self):
+        self.batcher.close()
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def batched_depth_model(depth_model=None):
+    """
+    Returns the process-wide micro-batched depth model pair, creating it once.
+
+    Parameters:
+        depth_model (tuple, optional): (feature_extractor, model) to wrap;
+            defaults to ``depth_backends.get_depth_model()``.
+
+    Returns:
+        tuple: (feature_extractor, BatchedDepthModel)
+    """
+    with _batchers_lock:
+        if "depth" not in _batchers:
+            from src.depth_backends import get_depth_model
+
+            feature_extractor, model = depth_model or get_depth_model()
+            _batchers["depth"] = (feature_extractor, BatchedDepthModel(model))
+        return _batchers["depth"]
+
+
+def sam_encoder_batcher(session):
+    """Returns the process-wide batcher that encodes images for ``session`` (a ``SamSession``)."""
+    key = ("sam", session.model_path, session.quantized)
+    with _batchers_lock:
+        if key not in _batchers:
+            _batchers[key] = MicroBatcher(session.encode_batch, name="sam_encoder")
+        return _batchers[key]
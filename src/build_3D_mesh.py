@@ -1,92 +1,331 @@
 import os
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import open3d as o3d
 from PIL import Image
 import torch
 from transformers import GLPNImageProcessor, GLPNForDepthEstimation
+from src.profiling import profile_stage
+from src.concurrency import threads_per_worker
+from src.depth_backends import get_depth_model
+from src.point_cloud import condition_point_cloud
+from src.bake import bake_mesh, project_vertex_colors
+from src.camera import (
+    estimate_intrinsics, intrinsics_from_fov, scale_intrinsics, crop_intrinsics, backproject, depth_to_uint16
+)
 
-def generate_3d_models(image_path):
+DEPTH_MODEL_NAME = 'vinvino02/glpn-nyu'
+OUTPUT_DIR = "GENERATED_3D_MODELS"
+
+# Octree depth for Poisson reconstruction; float depth needs less than the old 8-bit path (10)
+POISSON_DEPTH = 9
+
+def load_depth_model(model_name=DEPTH_MODEL_NAME):
     """
-    Generate 3D models (PLY, OBJ, GLB) from an input image.
+    Load the GLPN feature extractor and depth model.
 
     Parameters:
-        image_path (str): Path to the input image.
+        model_name (str): Hugging Face model id or local path.
 
     Returns:
-        None
+        tuple: (feature_extractor, model)
     """
-    # Ensure output directory exists
-    output_dir = "GENERATED_3D_MODELS"
-    os.makedirs(output_dir, exist_ok=True)
+    feature_extractor = GLPNImageProcessor.from_pretrained(model_name)
+    model = GLPNForDepthEstimation.from_pretrained(model_name)
+    return feature_extractor, model
 
-    # Load model and feature extractor
-    feature_extractor = GLPNImageProcessor.from_pretrained('vinvino02/glpn-nyu')
-    model = GLPNForDepthEstimation.from_pretrained('vinvino02/glpn-nyu')
+def resize_for_depth(image):
+    """
+    Resize an image to at most 480 px height with both sides a multiple of 32.
+
+    Parameters:
+        image (PIL.Image.Image): RGB input image.
 
-    # Load and preprocess image
-    image = Image.open(image_path).convert('RGB')
+    Returns:
+        PIL.Image.Image: Resized image.
+    """
     new_height = 480 if image.height > 480 else image.height
     new_height -= new_height % 32
     new_width = int(new_height * image.width / image.height)
     diff = new_width % 32
     new_width = new_width - diff if diff < 16 else new_width + 32 - diff
-    image = image.resize((new_width, new_height))
+    return image.resize((new_width, new_height))
+
+def predict_depth(image, feature_extractor, model, pad=16):
+    """
+    Predict a depth map for an image already sized by ``resize_for_depth``.
+
+    Parameters:
+        image (PIL.Image.Image): RGB input image.
+        feature_extractor: GLPN image processor.
+        model: GLPN depth model or a ``depth_backends`` backend.
+        pad (int): Border cropped from both the depth map and the image.
+
+    Returns:
+        tuple: (depth in mm (np.ndarray, float32), cropped image (PIL.Image.Image))
+    """
     inputs = feature_extractor(images=image, return_tensors="pt")
 
     # Predict depth
-    with torch.no_grad():
+    with profile_stage("glpn_forward", torch_ops=True), torch.inference_mode():
         outputs = model(**inputs)
         predicted_depth = outputs.predicted_depth
 
     # Final post-processing
-    pad = 16
-    output = predicted_depth.squeeze().cpu().numpy() * 1000.0
+    output = predicted_depth.squeeze().cpu().numpy().astype(np.float32) * 1000.0
     output = output[pad:-pad, pad:-pad]
     image = image.crop((pad, pad, image.width - pad, image.height - pad))
+    return output, image
+
+def estimate_depth(image_path, depth_model=None, output_dir=None, camera_image_path=None, pad=16):
+    """
+    Load an image, predict its depth map and derive the matching intrinsics.
+
+    Parameters:
+        image_path (str): Path to the input image.
+        depth_model (tuple, optional): (feature_extractor, model), see ``generate_3d_models``.
+        output_dir (str, optional): Directory for profiling artifacts.
+        camera_image_path (str, optional): Original photo to read EXIF intrinsics
+            from, when ``image_path`` is a derived image without EXIF.
+        pad (int): Border cropped by ``predict_depth``.
+
+    Returns:
+        tuple: (depth in mm (np.ndarray), cropped image (PIL.Image.Image),
+        intrinsics (camera.Intrinsics) of the cropped depth map)
+    """
+    with profile_stage("load_depth_model", output_dir):
+        feature_extractor, model = depth_model or get_depth_model()
+
+    with profile_stage("depth", output_dir):
+        image = resize_for_depth(Image.open(image_path).convert('RGB'))
+        depth, cropped = predict_depth(image, feature_extractor, model, pad)
+
+    intrinsics = scale_intrinsics(estimate_intrinsics(camera_image_path or image_path), *image.size)
+    intrinsics = crop_intrinsics(intrinsics, pad, pad, *cropped.size)
+    return depth, cropped, intrinsics
+
+def segment_mask(segment_path, depth_shape, pad=16):
+    """
+    Load a segment's alpha channel as a mask aligned with a depth map.
+
+    The segment is resized to the depth model's input size and cropped by the
+    same border as ``predict_depth``.
+
+    Parameters:
+        segment_path (str): RGBA segment from ``segment_image``.
+        depth_shape (tuple): (height, width) of the cropped depth map.
+        pad (int): Border cropped by ``predict_depth``.
+
+    Returns:
+        np.ndarray: Boolean mask of shape ``depth_shape``.
+    """
+    height, width = depth_shape
+    alpha = Image.open(segment_path).convert('RGBA').getchannel('A')
+    alpha = alpha.resize((width + 2 * pad, height + 2 * pad), Image.NEAREST)
+    return np.array(alpha)[pad:-pad, pad:-pad] > 0
 
-    # Convert to Open3D RGBD image
+def build_point_cloud(image, depth, mask=None, intrinsics=None):
+    """
+    Back-project a depth map and its image into a coloured point cloud.
+
+    Depth keeps its full float precision and points are in metres.
+
+    Parameters:
+        image (PIL.Image.Image): RGB image matching ``depth``.
+        depth (np.ndarray): Depth map in mm, as returned by ``predict_depth``.
+        mask (np.ndarray, optional): Boolean mask; pixels outside it are dropped.
+        intrinsics (camera.Intrinsics, optional): Intrinsics of the depth map;
+            defaults to the depth model's training field of view.
+
+    Returns:
+        o3d.geometry.PointCloud: The point cloud.
+    """
     width, height = image.size
-    depth_image = (output * 255 / np.max(output)).astype('uint8')
-    image = np.array(image)
-    depth_o3d = o3d.geometry.Image(depth_image)
-    image_o3d = o3d.geometry.Image(image)
-    rgbd_image = o3d.geometry.RGBDImage.create_from_color_and_depth(image_o3d, depth_o3d, convert_rgb_to_intensity=False)
-
-    # Camera projection model
-    camera_intrinsic = o3d.camera.PinholeCameraIntrinsic()
-    camera_intrinsic.set_intrinsics(width, height, 500, 500, width / 2, height / 2)
-
-    # Create point cloud
-    pcd = o3d.geometry.PointCloud.create_from_rgbd_image(rgbd_image, camera_intrinsic)
-    pcd_path = os.path.join(output_dir, "point_cloud.ply")
-    o3d.io.write_point_cloud(pcd_path, pcd)
-
-    # Post-process point cloud
-    cl, ind = pcd.remove_statistical_outlier(nb_neighbors=20, std_ratio=2.0)
-    pcd = pcd.select_by_index(ind)
-    pcd.estimate_normals()
-    pcd.orient_normals_to_align_with_direction()
+    intrinsics = intrinsics or intrinsics_from_fov(width, height)
+    points, valid = backproject(depth / 1000.0, intrinsics, mask)
+    colors = np.asarray(image.convert('RGB'))[valid]
+
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points.astype(np.float64))
+    pcd.colors = o3d.utility.Vector3dVector(colors.astype(np.float64) / 255.0)
+    return pcd
+
+def reconstruct_mesh(pcd, poisson_depth=POISSON_DEPTH, voxel_size=None):
+    """
+    Clean a point cloud and reconstruct a surface with Poisson reconstruction.
+
+    Parameters:
+        pcd (o3d.geometry.PointCloud): Input point cloud in camera space.
+        poisson_depth (int): Octree depth of the reconstruction.
+        voxel_size (float, optional): Downsampling voxel edge; by default sized
+            to the octree resolution, 0 disables downsampling.
+
+    Returns:
+        o3d.geometry.TriangleMesh: Reconstructed, upright mesh.
+    """
+    # Downsample, remove outliers and orient normals towards the camera (the origin)
+    pcd = condition_point_cloud(pcd, poisson_depth, voxel_size)
 
     # Surface reconstruction
-    mesh = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pcd, depth=10, n_threads=1)[0]
+    mesh = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(
+        pcd, depth=poisson_depth, n_threads=threads_per_worker())[0]
     rotation = mesh.get_rotation_matrix_from_xyz((np.pi, 0, 0))
     mesh.rotate(rotation, center=(0, 0, 0))
+    return mesh
+
+def color_mesh(mesh, image, intrinsics, mask=None):
+    """
+    Replace Poisson's interpolated vertex colours with colours projected from the image.
+
+    Hidden vertices keep their interpolated colour.
+
+    Parameters:
+        mesh (o3d.geometry.TriangleMesh): Mesh from ``reconstruct_mesh``.
+        image (PIL.Image.Image): RGB image matching the depth map.
+        intrinsics (camera.Intrinsics): Intrinsics used for back-projection.
+        mask (np.ndarray, optional): Segment mask of the depth map.
+
+    Returns:
+        o3d.geometry.TriangleMesh: The same mesh, recoloured.
+    """
+    fallback = np.asarray(mesh.vertex_colors) if mesh.has_vertex_colors() else None
+    colors, visible = project_vertex_colors(np.asarray(mesh.vertices), np.asarray(image.convert('RGB')),
+                                            intrinsics, mask, fallback)
+    mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
+    logging.info(f"Projected image colours onto {int(visible.sum())} of {len(colors)} vertices")
+    return mesh
+
+def export_meshes(pcd, mesh, output_dir=OUTPUT_DIR, depth=None):
+    """
+    Write the point cloud and mesh files.
+
+    Parameters:
+        pcd (o3d.geometry.PointCloud): Point cloud to save.
+        mesh (o3d.geometry.TriangleMesh): Mesh to save.
+        output_dir (str): Output directory.
+        depth (np.ndarray, optional): Depth map in mm, also saved as a 16-bit PNG.
+
+    Returns:
+        dict: Output paths by name.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {
+        "point_cloud": os.path.join(output_dir, "point_cloud.ply"),
+        "glb": os.path.join(output_dir, "mesh.glb"),
+        "obj": os.path.join(output_dir, "mesh.obj"),
+        "ply": os.path.join(output_dir, "mesh_rotated.ply"),
+        "uniform_obj": os.path.join(output_dir, "mesh_uniform.obj"),
+    }
+    o3d.io.write_point_cloud(paths["point_cloud"], pcd)
+    if depth is not None:
+        paths["depth"] = os.path.join(output_dir, "depth.png")
+        Image.fromarray(depth_to_uint16(depth)).save(paths["depth"])
 
     # Save mesh files
-    mesh_glb_path = os.path.join(output_dir, "mesh.glb")
-    mesh_obj_path = os.path.join(output_dir, "mesh.obj")
-    mesh_ply_path = os.path.join(output_dir, "mesh_rotated.ply")
-    o3d.io.write_triangle_mesh(mesh_glb_path, mesh)
-    o3d.io.write_triangle_mesh(mesh_obj_path, mesh)
-    o3d.io.write_triangle_mesh(mesh_ply_path, mesh)
+    o3d.io.write_triangle_mesh(paths["glb"], mesh)
+    o3d.io.write_triangle_mesh(paths["obj"], mesh)
+    o3d.io.write_triangle_mesh(paths["ply"], mesh)
 
     # Uniformly paint and save
     mesh_uniform = mesh.paint_uniform_color([0.9, 0.8, 0.9])
     mesh_uniform.compute_vertex_normals()
-    mesh_uniform_path = os.path.join(output_dir, "mesh_uniform.obj")
-    o3d.io.write_triangle_mesh(mesh_uniform_path, mesh_uniform)
+    o3d.io.write_triangle_mesh(paths["uniform_obj"], mesh_uniform)
+    return paths
+
+def generate_3d_models(image_path, output_dir=OUTPUT_DIR, depth_model=None, camera_image_path=None):
+    """
+    Generate 3D models (PLY, OBJ, GLB) from an input image.
+
+    Parameters:
+        image_path (str): Path to the input image.
+        output_dir (str): Directory the models are written to.
+        depth_model (tuple, optional): (feature_extractor, model) to use instead
+            of the configured backend from ``depth_backends.get_depth_model``,
+            e.g. a stand-in model.
+        camera_image_path (str, optional): Original photo with EXIF, for the intrinsics.
+
+    Returns:
+        dict: Output paths by name.
+    """
+    # Ensure output directory exists
+    os.makedirs(output_dir, exist_ok=True)
+
+    depth, image, intrinsics = estimate_depth(image_path, depth_model, output_dir, camera_image_path)
+
+    with profile_stage("reconstruction", output_dir):
+        pcd = build_point_cloud(image, depth, intrinsics=intrinsics)
+        mesh = reconstruct_mesh(pcd)
+        mesh = color_mesh(mesh, image, intrinsics)
+
+    with profile_stage("export", output_dir):
+        paths = export_meshes(pcd, mesh, output_dir, depth)
+
+    with profile_stage("bake", output_dir):
+        paths.update(bake_mesh(mesh, image, output_dir, intrinsics))
 
     print(f"3D models saved in {output_dir}")
+    return paths
+
+def _reconstruct_segment(image, depth, mask, intrinsics, output_dir):
+    with profile_stage("reconstruction", output_dir):
+        pcd = build_point_cloud(image, depth, mask, intrinsics)
+        mesh = reconstruct_mesh(pcd)
+        mesh = color_mesh(mesh, image, intrinsics, mask)
+
+    with profile_stage("export", output_dir):
+        paths = export_meshes(pcd, mesh, output_dir, np.where(mask, depth, 0))
+
+    with profile_stage("bake", output_dir):
+        paths.update(bake_mesh(mesh, image, output_dir, intrinsics))
+    return paths
+
+def generate_segment_models(source_image_path, segment_paths, output_dir=OUTPUT_DIR, depth_model=None,
+                            workers=None, camera_image_path=None):
+    """
+    Generate one set of 3D models per segment of the same source image.
+
+    Depth is predicted once for the source image; each segment's alpha mask then
+    selects its part of the shared depth map, and the meshes are reconstructed
+    concurrently into ``<output_dir>/<segment name>/``.
+
+    Parameters:
+        source_image_path (str): The image the segments were cut from.
+        segment_paths (List[str]): RGBA segments from ``segment_image``.
+        output_dir (str): Parent directory of the per-segment outputs.
+        depth_model (tuple, optional): See ``generate_3d_models``.
+        workers (int, optional): Concurrent reconstructions (default: one per segment, at most 4).
+        camera_image_path (str, optional): Original photo with EXIF, for the intrinsics.
+
+    Returns:
+        dict: Output paths by name, per segment path. Failed segments are logged and omitted.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    depth, image, intrinsics = estimate_depth(source_image_path, depth_model, output_dir, camera_image_path)
+
+    jobs = {}
+    workers = workers or min(len(segment_paths), 4) or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for segment_path in segment_paths:
+            mask = segment_mask(segment_path, depth.shape)
+            if not mask.any():
+                logging.warning(f"Segment {segment_path} is empty at depth resolution, skipped")
+                continue
+            segment_dir = os.path.join(output_dir, os.path.splitext(os.path.basename(segment_path))[0])
+            os.makedirs(segment_dir, exist_ok=True)
+            # Run in a copy of the caller's context so trace spans keep the job id
+            jobs[segment_path] = pool.submit(contextvars.copy_context().run,
+                                             _reconstruct_segment, image, depth, mask, intrinsics, segment_dir)
+
+    results = {}
+    for segment_path, future in jobs.items():
+        try:
+            results[segment_path] = future.result()
+        except Exception as e:
+            logging.error(f"3D reconstruction failed for {segment_path}: {e}")
+    print(f"3D models for {len(results)} segments saved in {output_dir}")
+    return results
 
 if __name__ == "__main__":
     generate_3d_models("image_processing_module/truck.jpg")
@@ -0,0 +1,130 @@
+"""
+Pinhole camera intrinsics and depth back-projection.
+
+Intrinsics come from the photo's EXIF focal length when present and otherwise
+from an assumed horizontal field of view. The default FOV is that of the
+Kinect used for NYU Depth v2, the data GLPN (glpn-nyu) was trained on, so
+its metric depth and the assumed focal length agree.
+"""
+import math
+import logging
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+# NYU Depth v2: fx = 518.86 px at 640 px width
+DEFAULT_HFOV_DEG = math.degrees(2 * math.atan(320 / 518.86))
+
+# Width of a full-frame (35 mm) sensor in mm
+FULL_FRAME_WIDTH_MM = 36.0
+
+_EXIF_IFD = 0x8769
+_FOCAL_LENGTH = 37386
+_FOCAL_LENGTH_35MM = 41989
+_FOCAL_PLANE_X_RESOLUTION = 41486
+_FOCAL_PLANE_RESOLUTION_UNIT = 41488
+_RESOLUTION_UNIT_MM = {2: 25.4, 3: 10.0, 4: 1.0}
+_ORIENTATION = 0x0112
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+Intrinsics = namedtuple("Intrinsics", ["fx", "fy", "cx", "cy", "width", "height"])
+
+
+def intrinsics_from_fov(width, height, hfov_deg=DEFAULT_HFOV_DEG):
+    """Intrinsics for square pixels and a centred principal point."""
+    fx = (width / 2) / math.tan(math.radians(hfov_deg) / 2)
+    return Intrinsics(fx, fx, width / 2, height / 2, width, height)
+
+
+def focal_from_exif(image):
+    """
+    Focal length in pixels from EXIF, or None.
+
+    Uses the 35 mm equivalent focal length if available, otherwise the focal
+    length combined with the focal plane resolution.
+
+    Parameters:
+        image (PIL.Image.Image): Image opened from the original file.
+    """
+    try:
+        exif = image.getexif().get_ifd(_EXIF_IFD)
+    except Exception:
+        return None
+    long_side = max(image.size)
+
+    focal_35mm = exif.get(_FOCAL_LENGTH_35MM)
+    if focal_35mm:
+        return float(focal_35mm) / FULL_FRAME_WIDTH_MM * long_side
+
+    focal_mm = exif.get(_FOCAL_LENGTH)
+    plane_resolution = exif.get(_FOCAL_PLANE_X_RESOLUTION)
+    unit_mm = _RESOLUTION_UNIT_MM.get(exif.get(_FOCAL_PLANE_RESOLUTION_UNIT, 2))
+    if focal_mm and plane_resolution and unit_mm:
+        # Focal plane resolution is in pixels per unit of the sensor
+        return float(focal_mm) * float(plane_resolution) / unit_mm
+    return None
+
+
+def estimate_intrinsics(image_path, hfov_deg=DEFAULT_HFOV_DEG):
+    """
+    Intrinsics of the camera that took ``image_path``, at its full resolution.
+
+    Parameters:
+        image_path (str): The original photo (EXIF is lost in derived PNG/JPEG files).
+        hfov_deg (float): Fallback horizontal field of view.
+
+    Returns:
+        Intrinsics: Camera intrinsics.
+    """
+    with Image.open(image_path) as image:
+        width, height = image.size
+        focal = focal_from_exif(image)
+        if image.getexif().get(_ORIENTATION) in _TRANSPOSED_ORIENTATIONS:
+            # Decoded images are EXIF-transposed (see image_cache), so match their size
+            width, height = height, width
+    if focal:
+        logging.info(f"Camera focal length from EXIF: {focal:.1f} px")
+        return Intrinsics(focal, focal, width / 2, height / 2, width, height)
+    logging.info(f"No EXIF focal length in {image_path}, assuming {hfov_deg:.1f} deg horizontal FOV")
+    return intrinsics_from_fov(width, height, hfov_deg)
+
+
+def scale_intrinsics(intrinsics, width, height):
+    """Intrinsics for the same camera after resizing the image to (width, height)."""
+    sx = width / intrinsics.width
+    sy = height / intrinsics.height
+    return Intrinsics(intrinsics.fx * sx, intrinsics.fy * sy, intrinsics.cx * sx, intrinsics.cy * sy, width, height)
+
+
+def crop_intrinsics(intrinsics, left, top, width, height):
+    """Intrinsics after cropping the image to a (width, height) window at (left, top)."""
+    return Intrinsics(intrinsics.fx, intrinsics.fy, intrinsics.cx - left, intrinsics.cy - top, width, height)
+
+
+def backproject(depth, intrinsics, mask=None):
+    """
+    Back-projects a depth map into camera-space points.
+
+    Parameters:
+        depth (np.ndarray): (H, W) depth; points keep its units.
+        intrinsics (Intrinsics): Intrinsics of the depth map's pixel grid.
+        mask (np.ndarray, optional): Boolean (H, W); pixels outside it are dropped.
+
+    Returns:
+        tuple: (points (N, 3) float32, valid (H, W) bool mask of the returned pixels)
+    """
+    depth = np.asarray(depth, dtype=np.float32)
+    valid = np.isfinite(depth) & (depth > 0)
+    if mask is not None:
+        valid &= mask
+    v, u = np.nonzero(valid)
+    z = depth[v, u]
+    x = (u.astype(np.float32) - intrinsics.cx) * z / intrinsics.fx
+    y = (v.astype(np.float32) - intrinsics.cy) * z / intrinsics.fy
+    return np.stack([x, y, z], axis=1), valid
+
+
+def depth_to_uint16(depth_mm):
+    """Millimetre depth as uint16 (the usual 16-bit depth PNG encoding), clipped to 65.535 m."""
+    return np.clip(np.rint(depth_mm), 0, np.iinfo(np.uint16).max).astype(np.uint16)
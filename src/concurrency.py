@@ -0,0 +1,143 @@
+"""
+Central thread-count configuration for torch, OpenCV, Open3D and worker pools.
+
+Every library in the pipeline sizes its own thread pool to the machine:
+torch (GLPN, SAM) and Open3D (Poisson, outlier removal) through OpenMP,
+OpenCV through its own pool, and our tile pools through ``os.cpu_count()``.
+Running several jobs at once then starts jobs x cores threads and the cores
+thrash. ``configure_threads(parallel_jobs)`` splits the cores between the
+jobs instead and applies the per-job thread count everywhere:
+
+    OpenCV        cv2.setNumThreads (if already imported) and OPENCV_FOR_THREADS_NUM
+    Open3D, BLAS  OMP_NUM_THREADS / MKL_NUM_THREADS / OPENBLAS_NUM_THREADS, read when
+                  they are first loaded, and threadpoolctl limits if it is installed;
+                  Poisson reconstruction takes ``n_threads=threads_per_worker()``
+    tile pools    ``threads_per_worker()``
+
+These settings are process-wide, so torch is sized separately: its thread
+count is split between the threads that run forward passes at once
+(``inference_streams``), which is fewer than the parallel jobs when the
+micro-batchers run every forward pass on their own thread. Code about to
+run a model calls ``ensure_inference_threads()``.
+
+Libraries that are not imported yet pick the values up from the environment
+when they are, so configuring threads does not import anything heavy.
+``JAR_THREADS_PER_WORKER`` overrides the computed count; the benchmark in
+``benchmarks/thread_splits.py`` measures which split gives the best
+throughput on a machine.
+"""
+import os
+import sys
+import logging
+import threading
+from collections import namedtuple
+
+THREADS_ENV_VAR = "JAR_THREADS_PER_WORKER"
+
+# Environment variables read by OpenMP, BLAS and OpenCV when they initialise
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "OPENCV_FOR_THREADS_NUM")
+
+ThreadConfig = namedtuple("ThreadConfig", ["parallel_jobs", "threads_per_worker", "inference_threads",
+                                           "interop_threads"])
+
+_config = None
+_torch_config = None
+_config_lock = threading.Lock()
+
+
+def available_cores():
+    """Cores this process may run on (respects CPU affinity, e.g. in containers)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def plan_threads(parallel_jobs=1, cores=None, inference_streams=None):
+    """
+    Splits the cores evenly between ``parallel_jobs`` concurrent jobs.
+
+    Parameters:
+        parallel_jobs (int): Jobs expected to run compute-heavy stages at once.
+        cores (int, optional): Cores to split; defaults to ``available_cores()``.
+        inference_streams (int, optional): Threads running torch forward passes
+            at once; defaults to ``parallel_jobs``.
+
+    Returns:
+        ThreadConfig: The split; ``JAR_THREADS_PER_WORKER`` overrides both thread counts.
+    """
+    parallel_jobs = max(1, int(parallel_jobs))
+    inference_streams = max(1, int(inference_streams or parallel_jobs))
+    cores = cores or available_cores()
+    override = os.environ.get(THREADS_ENV_VAR, "").strip()
+    threads = int(override) if override else max(1, cores // parallel_jobs)
+    inference_threads = int(override) if override else max(1, cores // inference_streams)
+    # Inter-op parallelism only helps graphs with independent branches; keep it small
+    return ThreadConfig(parallel_jobs, threads, inference_threads, 1 if inference_threads < 4 else 2)
+
+
+def apply_thread_config(config):
+    """Applies ``config`` to the environment and to the libraries already imported."""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(config.threads_per_worker)
+
+    if "cv2" in sys.modules:
+        sys.modules["cv2"].setNumThreads(config.threads_per_worker)
+
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        pass
+    else:
+        # Also caps OpenMP/BLAS runtimes that are already loaded (e.g. Open3D's)
+        threadpool_limits(limits=config.threads_per_worker)
+
+    logging.info(f"Threads: {config.parallel_jobs} parallel jobs x {config.threads_per_worker} threads, "
+                 f"torch {config.inference_threads} (inter-op {config.interop_threads})")
+
+
+def configure_threads(parallel_jobs=1, cores=None, inference_streams=None):
+    """
+    Plans and applies the process-wide thread split.
+
+    Returns:
+        ThreadConfig: The applied configuration.
+    """
+    global _config
+    config = plan_threads(parallel_jobs, cores, inference_streams)
+    with _config_lock:
+        apply_thread_config(config)
+        _config = config
+    if "torch" in sys.modules:
+        ensure_inference_threads()
+    return config
+
+
+def ensure_inference_threads():
+    """
+    Applies the configured torch thread counts, once per configuration.
+
+    Call before running a model; imports torch. Does nothing if
+    ``configure_threads`` was never called.
+    """
+    global _torch_config
+    config = _config
+    if config is None or _torch_config is config:
+        return
+    with _config_lock:
+        if _torch_config is not config:
+            from src.depth_backends import configure_torch_threads
+
+            configure_torch_threads(config.inference_threads, config.interop_threads)
+            _torch_config = config
+
+
+def current_config():
+    """The applied configuration, or None if ``configure_threads`` was never called."""
+    return _config
+
+
+def threads_per_worker():
+    """Threads one job may use for its own pools (all cores if nothing was configured)."""
+    config = _config
+    return config.threads_per_worker if config is not None else available_cores()
@@ -0,0 +1,296 @@
+"""
+CPU inference backends for GLPN depth estimation.
+
+    eager        - the Hugging Face model under ``inference_mode``, channels-last
+    torchscript  - a traced module, saved once per input shape
+    onnx         - an ONNX export run by ONNX Runtime (dynamic height/width)
+
+Every backend can be dynamically quantized to int8 (``quantize=True``).
+Exported artifacts are cached in ``MODEL_CACHE_DIR`` so the export cost is paid
+once per machine. Select the default with ``JAR_DEPTH_BACKEND`` and
+``JAR_DEPTH_INT8=1``.
+
+Backends are drop-in replacements for the GLPN model: calling them with
+``pixel_values`` returns an object with a ``predicted_depth`` tensor, so
+``(feature_extractor, backend)`` can be passed wherever ``load_depth_model``'s
+result is used.
+"""
+import os
+import time
+import logging
+import argparse
+import threading
+from collections import namedtuple
+
+import numpy as np
+import torch
+
+DEPTH_BACKENDS = ("eager", "torchscript", "onnx")
+BACKEND_ENV_VAR = "JAR_DEPTH_BACKEND"
+INT8_ENV_VAR = "JAR_DEPTH_INT8"
+MODEL_CACHE_DIR = os.path.join(".cache", "models")
+
+DepthOutput = namedtuple("DepthOutput", ["predicted_depth"])
+
+
+def configure_torch_threads(intra_op=None, inter_op=None):
+    """
+    Sets PyTorch's intra-op and inter-op thread counts explicitly.
+
+    The inter-op count can only be set before the first parallel region runs;
+    later attempts are logged and ignored.
+    """
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            logging.warning(f"Could not set inter-op threads to {inter_op}: {e}")
+    logging.info(f"Torch threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}")
+
+
+def _artifact_name(model_name, suffix):
+    return os.path.join(MODEL_CACHE_DIR, model_name.replace("/", "__") + suffix)
+
+
+def _quantize(model):
+    """Dynamic int8 quantization of the Linear layers (most of GLPN's transformer encoder)."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _ForwardDepth(torch.nn.Module):
+    """Unwraps the Hugging Face output so the model can be traced/exported as tensor -> tensor."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).predicted_depth
+
+
+class EagerDepthBackend:
+    """The PyTorch model in channels-last layout, run under ``inference_mode``."""
+
+    name = "eager"
+
+    def __init__(self, model, quantize=False):
+        model = model.eval()
+        if quantize:
+            model = _quantize(model)
+        self.module = _ForwardDepth(model).to(memory_format=torch.channels_last)
+        self.quantized = quantize
+
+    def __call__(self, pixel_values=None, **kwargs):
+        with torch.inference_mode():
+            pixel_values = torch.as_tensor(pixel_values).contiguous(memory_format=torch.channels_last)
+            return DepthOutput(self.module(pixel_values))
+
+
+class TorchScriptDepthBackend:
+    """
+    Traced GLPN. Tracing bakes interpolation sizes (and reshapes over the
+    batch) into the graph, so one artifact is traced and cached per input shape.
+    """
+
+    name = "torchscript"
+
+    def __init__(self, model, model_name, quantize=False):
+        self.model = model.eval()
+        self.model_name = model_name
+        self.quantized = quantize
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    def _module_for(self, pixel_values):
+        shape = tuple(pixel_values.shape[-3:] if pixel_values.shape[0] == 1 else pixel_values.shape)
+        with self._lock:
+            if shape in self._modules:
+                return self._modules[shape]
+            precision = "int8" if self.quantized else "fp32"
+            batch = f"_b{shape[0]}" if len(shape) == 4 else ""
+            path = _artifact_name(self.model_name, f"{batch}_{shape[-2]}x{shape[-1]}_{precision}.ts.pt")
+            if os.path.exists(path):
+                module = torch.jit.load(path)
+            else:
+                os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+                wrapped = _ForwardDepth(_quantize(self.model) if self.quantized else self.model).eval()
+                with torch.inference_mode():
+                    module = torch.jit.trace(wrapped, pixel_values, check_trace=False)
+                module = torch.jit.freeze(module)
+                module.save(path)
+                logging.info(f"Traced depth model saved to {path}")
+            module = torch.jit.optimize_for_inference(module)
+            self._modules[shape] = module
+            return module
+
+    def __call__(self, pixel_values=None, **kwargs):
+        pixel_values = torch.as_tensor(pixel_values)
+        with torch.inference_mode():
+            return DepthOutput(self._module_for(pixel_values)(pixel_values))
+
+
+class OnnxDepthBackend:
+    """GLPN exported once to ONNX with dynamic spatial axes, run with ONNX Runtime."""
+
+    name = "onnx"
+
+    def __init__(self, model, model_name, quantize=False, intra_op=None, inter_op=None):
+        import onnxruntime as ort
+
+        self.quantized = quantize
+        # The batch axis is dynamic too, for micro-batched requests (see src.batching)
+        fp32_path = _artifact_name(model_name, "_batched_fp32.onnx")
+        if not os.path.exists(fp32_path):
+            os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+            dummy = torch.zeros(1, 3, 480, 640)
+            torch.onnx.export(
+                _ForwardDepth(model.eval()), dummy, fp32_path,
+                input_names=["pixel_values"], output_names=["predicted_depth"],
+                dynamic_axes={"pixel_values": {0: "batch", 2: "height", 3: "width"},
+                              "predicted_depth": {0: "batch", 1: "height", 2: "width"}},
+                opset_version=17,
+            )
+            logging.info(f"ONNX depth model exported to {fp32_path}")
+
+        path = fp32_path
+        if quantize:
+            path = _artifact_name(model_name, "_batched_int8.onnx")
+            if not os.path.exists(path):
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+                logging.info(f"Quantized ONNX depth model saved to {path}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op or torch.get_num_threads()
+        options.inter_op_num_threads = inter_op or 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, pixel_values=None, **kwargs):
+        if isinstance(pixel_values, torch.Tensor):
+            pixel_values = pixel_values.numpy()
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        (depth,) = self.session.run(["predicted_depth"], {"pixel_values": pixel_values})
+        return DepthOutput(torch.from_numpy(depth))
+
+
+def load_depth_backend(backend="eager", quantize=False, model_name=None, intra_op=None, inter_op=None):
+    """
+    Loads GLPN wrapped in the requested inference backend.
+
+    Parameters:
+        backend (str): One of ``DEPTH_BACKENDS``.
+        quantize (bool): Apply dynamic int8 quantization.
+        model_name (str, optional): Defaults to ``build_3D_mesh.DEPTH_MODEL_NAME``.
+        intra_op (int, optional): Intra-op thread count.
+        inter_op (int, optional): Inter-op thread count.
+
+    Returns:
+        tuple: (feature_extractor, backend), usable as ``generate_3d_models(depth_model=...)``.
+    """
+    from src.build_3D_mesh import load_depth_model, DEPTH_MODEL_NAME
+
+    if backend not in DEPTH_BACKENDS:
+        raise ValueError(f"Unknown depth backend: {backend}. Choose from {DEPTH_BACKENDS}")
+    model_name = model_name or DEPTH_MODEL_NAME
+    configure_torch_threads(intra_op, inter_op)
+    feature_extractor, model = load_depth_model(model_name)
+
+    if backend == "onnx":
+        wrapped = OnnxDepthBackend(model, model_name, quantize, intra_op, inter_op)
+    elif backend == "torchscript":
+        wrapped = TorchScriptDepthBackend(model, model_name, quantize)
+    else:
+        wrapped = EagerDepthBackend(model, quantize)
+    logging.info(f"Depth backend {backend} loaded ({'int8' if quantize else 'fp32'})")
+    return feature_extractor, wrapped
+
+
+_loaded_backends = {}
+_loaded_lock = threading.Lock()
+
+
+def get_depth_model(backend=None, quantize=None):
+    """
+    Returns the process-wide depth model for the configured backend, loading it once.
+
+    Defaults come from ``JAR_DEPTH_BACKEND`` (default "eager") and ``JAR_DEPTH_INT8``.
+    """
+    backend = backend or os.environ.get(BACKEND_ENV_VAR, "eager")
+    if quantize is None:
+        quantize = os.environ.get(INT8_ENV_VAR, "0").strip().lower() in ("1", "true", "yes", "on")
+    key = (backend, quantize)
+    with _loaded_lock:
+        if key not in _loaded_backends:
+            _loaded_backends[key] = load_depth_backend(backend, quantize)
+        return _loaded_backends[key]
+
+
+def compare_backends(image_paths, candidates, reference=("eager", False)):
+    """
+    Reports the accuracy delta and latency of backends against a reference.
+
+    Parameters:
+        image_paths (List[str]): Validation images.
+        candidates (List[Tuple[str, bool]]): (backend, quantize) pairs to evaluate.
+        reference (Tuple[str, bool]): The reference (backend, quantize) pair.
+
+    Returns:
+        dict: Per candidate: mean absolute error, mean absolute relative error,
+        max absolute error (all in the same units as ``predict_depth``) and
+        mean latency in seconds, plus the reference latency.
+    """
+    from PIL import Image
+    from src.build_3D_mesh import resize_for_depth, predict_depth
+
+    images = [resize_for_depth(Image.open(path).convert("RGB")) for path in image_paths]
+
+    def run(pair):
+        feature_extractor, model = get_depth_model(*pair)
+        predict_depth(images[0], feature_extractor, model)  # Warm-up (and export on first use)
+        depths, seconds = [], []
+        for image in images:
+            start = time.perf_counter()
+            depth, _ = predict_depth(image, feature_extractor, model)
+            seconds.append(time.perf_counter() - start)
+            depths.append(depth)
+        return depths, float(np.mean(seconds))
+
+    reference_depths, reference_latency = run(reference)
+    report = {"reference": {"backend": reference, "latency_s": reference_latency}, "candidates": {}}
+    for pair in candidates:
+        depths, latency = run(pair)
+        abs_err = np.concatenate([np.abs(d - r).ravel() for d, r in zip(depths, reference_depths)])
+        rel_err = np.concatenate([(np.abs(d - r) / np.maximum(np.abs(r), 1e-6)).ravel()
+                                  for d, r in zip(depths, reference_depths)])
+        report["candidates"][f"{pair[0]}{'-int8' if pair[1] else ''}"] = {
+            "mae": float(abs_err.mean()),
+            "abs_rel": float(rel_err.mean()),
+            "max_abs": float(abs_err.max()),
+            "latency_s": latency,
+            "speedup": reference_latency / latency if latency else None,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare GLPN depth backends against eager fp32")
+    parser.add_argument("images", nargs="+", help="Validation images")
+    parser.add_argument("--backends", nargs="+", default=["eager-int8", "torchscript", "onnx", "onnx-int8"],
+                        help="Backends to evaluate; append -int8 for quantized variants")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op thread count")
+    args = parser.parse_args()
+
+    configure_torch_threads(args.threads)
+    candidates = [(name.replace("-int8", ""), name.endswith("-int8")) for name in args.backends]
+    report = compare_backends(args.images, candidates)
+    print(f"reference eager fp32: {report['reference']['latency_s'] * 1000:.1f} ms/image")
+    for name, result in report["candidates"].items():
+        print(f"{name:<18} {result['latency_s'] * 1000:8.1f} ms/image  x{result['speedup']:.2f}  "
+              f"MAE {result['mae']:.4f}  AbsRel {result['abs_rel']:.4%}  max {result['max_abs']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import numpy as np
 import cv2
 from PIL import Image
 import os
+from src.image_processing_module.image_cache import load_image
 
 def canny_edge_detector(image_path):
     """
@@ -13,14 +14,9 @@ def canny_edge_detector(image_path):
     Returns:
         PIL.Image.Image: Image with edges detected as a PIL Image object.
     """
-    # Check if the image file exists
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image file not found: {image_path}")
-
-    # Load the image
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    if image is None:
-        raise ValueError(f"Failed to load image: {image_path}")
+    # Load the image (decoded once and shared by all detectors;
+    # raises FileNotFoundError / ValueError)
+    image = load_image(image_path, mode="L")
 
     # Apply Gaussian blur to reduce noise and improve edge detection
     blurred_image = cv2.GaussianBlur(image, (5, 5), 1.5)
@@ -41,14 +37,9 @@ def sobel_edge_detector(image_path):
     Returns:
         PIL.Image.Image: Image with edges detected as a PIL Image object.
     """
-    # Check if the image file exists
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image file not found: {image_path}")
-
-    # Load the image
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    if image is None:
-        raise ValueError(f"Failed to load image: {image_path}")
+    # Load the image (decoded once and shared by all detectors;
+    # raises FileNotFoundError / ValueError)
+    image = load_image(image_path, mode="L")
 
     # Apply Gaussian blur to reduce noise and improve edge detection
     blurred_image = cv2.GaussianBlur(image, (5, 5), 1.5)
@@ -75,14 +66,9 @@ def laplacian_edge_detector(image_path):
     Returns:
         PIL.Image.Image: Image with edges detected as a PIL Image object.
     """
-    # Check if the image file exists
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image file not found: {image_path}")
-
-    # Load the image
-    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-    if image is None:
-        raise ValueError(f"Failed to load image: {image_path}")
+    # Load the image (decoded once and shared by all detectors;
+    # raises FileNotFoundError / ValueError)
+    image = load_image(image_path, mode="L")
 
     # Apply Gaussian blur to reduce noise and improve edge detection
     blurred_image = cv2.GaussianBlur(image, (5, 5), 1.5)
@@ -0,0 +1,169 @@
+import time
+import logging
+import threading
+import tracemalloc
+
+import numpy as np
+import cv2
+
+from src.image_processing_module.denoise import denoise_array
+from src.image_processing_module.sharpen import sharpen_array
+from src.image_processing_module.resolution import plan_working_resolution, resize_to_plan
+
+# Name -> filter function. A filter takes an RGB uint8 array plus keyword
+# parameters and returns the result; in-place filters write into the input
+# buffer and return it.
+FILTERS = {}
+
+# tracemalloc is process-wide: chains tracking memory on several threads share one session
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+_tracemalloc_lock = threading.Lock()
+
+
+def _start_memory_tracking():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _stop_memory_tracking():
+    """Stops tracemalloc when the last chain using it finishes (unless someone else started it)."""
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def register_filter(name, inplace=False):
+    """
+    Decorator registering a filter function under ``name``.
+
+    ``inplace`` marks filters that write into their input, so the chain knows
+    to copy a read-only (e.g. shared, cached) buffer before running them.
+    """
+    def decorator(func):
+        func.inplace = inplace
+        FILTERS[name] = func
+        return func
+    return decorator
+
+
+@register_filter("denoise")
+def denoise_filter(image_array, mode="auto"):
+    return denoise_array(image_array, mode=mode)
+
+
+@register_filter("sharpen", inplace=True)
+def sharpen_filter(image_array):
+    return sharpen_array(image_array, out=image_array)
+
+
+@register_filter("clahe", inplace=True)
+def clahe_filter(image_array, clip_limit=2.0, tile_grid=8):
+    """Contrast-limited adaptive histogram equalisation on the L channel of LAB."""
+    lab = cv2.cvtColor(image_array, cv2.COLOR_RGB2LAB)
+    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid))
+    lab[:, :, 0] = clahe.apply(np.ascontiguousarray(lab[:, :, 0]))
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2RGB, dst=image_array)
+
+
+@register_filter("white_balance", inplace=True)
+def white_balance_filter(image_array):
+    """Gray-world white balance, applied in place as a diagonal colour transform."""
+    means = image_array.reshape(-1, 3).mean(axis=0)
+    gains = means.mean() / np.maximum(means, 1e-6)
+    return cv2.transform(image_array, np.diag(gains).astype(np.float32), dst=image_array)
+
+
+@register_filter("resize")
+def resize_filter(image_array, width=None, height=None, scale=None, consumers=None):
+    """
+    Resizes to an explicit size, a scale factor, or the working resolution of
+    ``consumers`` (see ``resolution.CONSUMER_RESOLUTIONS``).
+    """
+    src_height, src_width = image_array.shape[:2]
+    if consumers is not None:
+        return resize_to_plan(image_array, plan_working_resolution(src_width, src_height, consumers))
+    if scale is not None:
+        width, height = int(round(src_width * scale)), int(round(src_height * scale))
+    if width is None or height is None:
+        raise ValueError("resize needs width and height, scale, or consumers")
+    if (width, height) == (src_width, src_height):
+        return image_array
+    interpolation = cv2.INTER_AREA if width < src_width else cv2.INTER_LINEAR
+    return cv2.resize(image_array, (width, height), interpolation=interpolation)
+
+
+class FilterChain:
+    """
+    An ordered list of named filters run on a single NumPy buffer.
+
+    Example:
+        chain = FilterChain().add("resize", consumers=("sam",)).add("denoise").add("sharpen")
+        result, report = chain.run(image_array)
+    """
+
+    def __init__(self, steps=None):
+        self.steps = []
+        for step in steps or []:
+            if isinstance(step, str):
+                self.add(step)
+            else:
+                name, params = step
+                self.add(name, **params)
+
+    def add(self, name, **params):
+        """Appends the filter registered as ``name``; returns the chain for chaining calls."""
+        if name not in FILTERS:
+            raise ValueError(f"Unknown filter: {name}. Available: {sorted(FILTERS)}")
+        self.steps.append((name, params))
+        return self
+
+    def __len__(self):
+        return len(self.steps)
+
+    def run(self, image_array, copy=False, track_memory=False):
+        """
+        Runs every filter in order.
+
+        Parameters:
+            image_array (np.ndarray): RGB uint8 array. Filters may modify it in place;
+                a read-only array is copied only right before the first in-place filter.
+            copy (bool): Work on a copy so the input is left untouched.
+            track_memory (bool): Record the peak allocation of every filter with tracemalloc.
+                Off by default: tracemalloc slows down allocations on every thread.
+                Its peak is process-wide, so with several chains running at once the
+                reported peaks include the other chains' allocations.
+
+        Returns:
+            tuple: (result array, report) where report is a list of dicts with
+            ``filter``, ``seconds``, ``peak_bytes`` and ``shape`` per step.
+        """
+        buffer = np.array(image_array, copy=True) if copy else image_array
+
+        if track_memory:
+            _start_memory_tracking()
+        report = []
+        try:
+            for name, params in self.steps:
+                if track_memory:
+                    tracemalloc.reset_peak()
+                    baseline, _ = tracemalloc.get_traced_memory()
+                start = time.perf_counter()
+                if FILTERS[name].inplace and not buffer.flags.writeable:
+                    buffer = buffer.copy()
+                buffer = FILTERS[name](buffer, **params)
+                seconds = time.perf_counter() - start
+                peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - baseline) if track_memory else None
+                report.append({"filter": name, "seconds": seconds, "peak_bytes": peak_bytes, "shape": buffer.shape})
+                logging.info(f"Filter {name} took {seconds:.3f}s, shape {buffer.shape}")
+        finally:
+            if track_memory:
+                _stop_memory_tracking()
+        return buffer, report
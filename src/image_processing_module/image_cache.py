@@ -0,0 +1,198 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+from PIL import Image, ImageOps
+
+# Upper bound on decoded pixels kept in memory by the shared cache
+DEFAULT_MAX_BYTES = 512 * 2**20
+
+
+class DecodedImageCache:
+    """
+    Bounded LRU of decoded images, keyed by path, modification time and size.
+
+    Every file is decoded once with EXIF orientation applied. The cached arrays
+    are read-only so the same buffer can be handed to PIL, OpenCV and Qt
+    without defensive copies; callers that need to modify pixels copy first.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._default_modes = {}
+        self._lock = threading.Lock()
+
+    def _file_key(self, image_path):
+        stat = os.stat(image_path)
+        return os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size
+
+    def _default_mode(self, image_path, file_key):
+        """RGBA for images with alpha, RGB otherwise (read from the header, once per file version)."""
+        with self._lock:
+            mode = self._default_modes.get(file_key)
+        if mode is None:
+            try:
+                with Image.open(image_path) as image:
+                    mode = _default_mode(image)
+            except OSError as e:
+                raise ValueError(f"Failed to load image: {image_path} ({e})")
+            with self._lock:
+                self._default_modes[file_key] = mode
+        return mode
+
+    def get(self, image_path, mode=None):
+        """
+        Returns the decoded image, decoding it on a miss.
+
+        Parameters:
+            image_path (str): Path to the image file.
+            mode (str, optional): "RGB", "RGBA" or "L". By default RGBA is kept
+                for images with an alpha channel and everything else becomes RGB.
+
+        Returns:
+            np.ndarray: Read-only uint8 array (H, W, C) or (H, W) for "L".
+        """
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+        file_key = self._file_key(image_path)
+        # The default resolves to a concrete mode, so it shares the entry with explicit RGB/RGBA requests
+        mode = mode or self._default_mode(image_path, file_key)
+        key = file_key + (mode,)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        colour = None
+        if mode == "L":
+            # Derive grayscale from an already decoded colour image instead of decoding again
+            with self._lock:
+                for colour_mode in ("RGB", "RGBA"):
+                    colour = self._entries.get(file_key + (colour_mode,))
+                    if colour is not None:
+                        break
+        if colour is not None:
+            array = cv2.cvtColor(colour, cv2.COLOR_RGBA2GRAY if colour.shape[2] == 4 else cv2.COLOR_RGB2GRAY)
+        else:
+            array = _decode(image_path, mode)
+        array.setflags(write=False)
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = array
+                self.current_bytes += array.nbytes
+            self._evict()
+        return array
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._default_modes.clear()
+            self.current_bytes = 0
+
+
+def _default_mode(image):
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    return "RGBA" if has_alpha else "RGB"
+
+
+def _decode(image_path, mode):
+    try:
+        with Image.open(image_path) as image:
+            image = ImageOps.exif_transpose(image)
+            image = image.convert(mode or _default_mode(image))
+            return np.array(image)
+    except OSError as e:
+        raise ValueError(f"Failed to load image: {image_path} ({e})")
+
+
+_shared_cache = DecodedImageCache()
+
+
+def get_image_cache():
+    """Returns the process-wide decoded image cache."""
+    return _shared_cache
+
+
+def load_image(image_path, mode=None):
+    """
+    Decodes an image once per process (EXIF-oriented) and returns the shared buffer.
+
+    Parameters:
+        image_path (str): Path to the image file.
+        mode (str, optional): "RGB", "RGBA" or "L", see ``DecodedImageCache.get``.
+
+    Returns:
+        np.ndarray: Read-only uint8 array.
+    """
+    return _shared_cache.get(image_path, mode)
+
+
+def as_pil(image_array):
+    """
+    Wraps a decoded array as a PIL image.
+
+    PIL shares the buffer for "L" and "RGBA" arrays; RGB is stored with a pad
+    byte inside PIL, so that mode costs one conversion.
+    """
+    return Image.fromarray(image_array)
+
+
+def as_bgr(image_array):
+    """
+    Returns the array in OpenCV's BGR(A) channel order.
+
+    For RGB this is a strided view with no copy; RGBA needs one gather.
+    """
+    if image_array.ndim == 2:
+        return image_array
+    if image_array.shape[2] == 4:
+        return image_array[:, :, [2, 1, 0, 3]]
+    return image_array[:, :, ::-1]
+
+
+def as_qimage(image_array):
+    """
+    Wraps a decoded array as a QImage over the same memory.
+
+    The returned QImage keeps a reference to the array (``image.ndarray``),
+    because Qt does not own the pixels.
+    """
+    from PyQt5.QtGui import QImage  # Qt is only needed by the GUI
+
+    image_array = np.ascontiguousarray(image_array)
+    height, width = image_array.shape[:2]
+    if image_array.ndim == 2:
+        image_format = QImage.Format_Grayscale8
+    elif image_array.shape[2] == 4:
+        image_format = QImage.Format_RGBA8888
+    else:
+        image_format = QImage.Format_RGB888
+    image = QImage(image_array.data, width, height, image_array.strides[0], image_format)
+    image.ndarray = image_array
+    return image
+
+
+def log_cache_stats():
+    """Logs hit/miss counts and the memory held by the shared cache."""
+    cache = get_image_cache()
+    logging.info(f"Image cache: {cache.hits} hits, {cache.misses} misses, "
+                 f"{cache.current_bytes / 2**20:.1f} MB in {len(cache)} entries")
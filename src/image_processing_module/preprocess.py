@@ -1,38 +1,72 @@
 import numpy as np
 import cv2
 from PIL import Image
-from src.image_processing_module.denoise import denoise_image  # Corrected import path
-from src.image_processing_module.sharpen import sharpen_image  # Corrected import path
+from src import profiling
+from src.image_processing_module.filters import FilterChain
+from src.image_processing_module.image_cache import load_image
 
 
-def preprocess_image(image_path, responses):
+def build_filter_chain(responses, consumers=None, filters=None):
+    """
+    Builds the filter chain for a set of user responses.
+
+    Args:
+        responses (dict): Checkbox responses, e.g. {"Denoise": True, "Sharpen": False}.
+        consumers (Iterable[str], optional): Downstream consumers; adds a leading resize
+            to their working resolution.
+        filters (list, optional): Extra steps, as filter names or (name, params) pairs.
+
+    Returns:
+        FilterChain: The chain to run.
+    """
+    chain = FilterChain()
+    if consumers is not None:
+        chain.add("resize", consumers=consumers)
+    if responses.get('Denoise'):
+        chain.add("denoise")
+    if responses.get('Sharpen'):
+        chain.add("sharpen")
+    for step in filters or []:
+        if isinstance(step, str):
+            chain.add(step)
+        else:
+            chain.add(step[0], **step[1])
+    return chain
+
+
+def preprocess_image(image_path, responses, consumers=None, filters=None):
     """
     Preprocesses an image based on user responses for denoising and sharpening.
 
+    All filters run on one NumPy buffer; the image is converted to PIL only once
+    at the end.
+
     Args:
         image_path (str): Path to the input image.
         responses (dict): Dictionary containing user responses for denoising and sharpening.
+        consumers (Iterable[str], optional): Downstream consumers (see
+            ``resolution.CONSUMER_RESOLUTIONS``). When given, the image is
+            downsampled once to the largest size they need before any filter runs.
+        filters (list, optional): Additional filter steps by name (e.g. "clahe",
+            "white_balance") or (name, params) pairs, run after denoise/sharpen.
     """
-    # Load the image
-    image = Image.open(image_path).convert('RGB')
-
-    if responses['Denoise']:
-        # Denoise the image
-        image = denoise_image(image)  # Pass PIL Image object
-        print("Image denoised.")
+    # Shared decoded buffer; the chain copies it only if a filter writes in place
+    image_array = load_image(image_path, mode="RGB")
 
-    if responses['Sharpen']:
-        # Sharpen the image
-        image = sharpen_image(image)  # Pass PIL Image object
-        print("Image sharpened.")
+    chain = build_filter_chain(responses, consumers, filters)
+    # Per-filter memory tracking costs on every allocation; only pay for it when profiling
+    image_array, report = chain.run(image_array, track_memory=profiling.is_enabled())
 
-    if not responses['Denoise'] and not responses['Sharpen']:
+    for step in report:
+        peak_mb = step['peak_bytes'] / 2**20 if step['peak_bytes'] is not None else float('nan')
+        print(f"Applied {step['filter']} in {step['seconds']:.3f}s (peak {peak_mb:.1f} MB), shape {step['shape']}.")
+    if not report:
         print("No preprocessing applied.")
-    return image.convert('RGB')  # Ensure the returned image is in RGB format
+    return Image.fromarray(image_array)  # RGB in, RGB out
 
 
 if __name__ == "__main__":
-    responses = {'Denoising': True, 'Sharpening': True}
+    responses = {'Denoise': True, 'Sharpen': True}
     image_path = "image_processing_module/test_images/output.png"  # Replace with your image path
     preprocessed_image = preprocess_image(image_path, responses)
     cv2.imshow("Preprocessed Image", np.array(preprocessed_image))
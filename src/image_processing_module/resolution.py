@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+import cv2
+
+# Largest input each downstream consumer actually looks at. Anything above this
+# is resized away by the consumer itself, so filtering it is wasted work.
+#   sam       - ultralytics SAM letterboxes to imgsz=1024 on the long side
+#   depth     - generate_3d_models resizes to at most 480 px height
+#   preview   - settings tab shows the upload scaled to 400x400
+#   thumbnail - results tab shows 200x200 thumbnails
+CONSUMER_RESOLUTIONS = {
+    "sam": {"long_side": 1024},
+    "depth": {"height": 480},
+    "preview": {"long_side": 400},
+    "thumbnail": {"long_side": 200},
+}
+
+DEFAULT_CONSUMERS = ("sam", "depth")
+
+ResolutionPlan = namedtuple("ResolutionPlan", ["width", "height", "scale", "native_width", "native_height"])
+
+
+def _required_scale(width, height, requirement):
+    if "long_side" in requirement:
+        return requirement["long_side"] / max(width, height)
+    if "height" in requirement:
+        return requirement["height"] / height
+    return 1.0
+
+
+def plan_working_resolution(width, height, consumers=DEFAULT_CONSUMERS):
+    """
+    Works out the smallest resolution that still satisfies every consumer.
+
+    Parameters:
+        width (int): Native image width.
+        height (int): Native image height.
+        consumers (Iterable[str]): Keys of ``CONSUMER_RESOLUTIONS``.
+
+    Returns:
+        ResolutionPlan: Working size and the downscale factor (never above 1).
+    """
+    scale = 0.0
+    for name in consumers:
+        if name not in CONSUMER_RESOLUTIONS:
+            raise ValueError(f"Unknown downstream consumer: {name}")
+        scale = max(scale, _required_scale(width, height, CONSUMER_RESOLUTIONS[name]))
+    scale = min(scale, 1.0) if consumers else 1.0
+
+    working_width = max(int(round(width * scale)), 1)
+    working_height = max(int(round(height * scale)), 1)
+    return ResolutionPlan(working_width, working_height, scale, width, height)
+
+
+def resize_to_plan(image_array, plan):
+    """
+    Downsamples an array once to the plan's working size.
+
+    Parameters:
+        image_array (np.ndarray): Image at native resolution.
+        plan (ResolutionPlan): Plan from ``plan_working_resolution``.
+
+    Returns:
+        np.ndarray: The resized array, or the input itself if no resize is needed.
+    """
+    if plan.scale >= 1.0:
+        return image_array
+    return cv2.resize(image_array, (plan.width, plan.height), interpolation=cv2.INTER_AREA)
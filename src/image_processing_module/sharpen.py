@@ -2,6 +2,21 @@ import numpy as np
 import cv2
 from PIL import Image
 
+SHARPEN_KERNEL = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]], dtype=np.float32)
+
+def sharpen_array(image_array, out=None):
+    """
+    Sharpens an image array with the sharpening kernel.
+
+    Parameters:
+        image_array (np.ndarray): Input uint8 array.
+        out (np.ndarray, optional): Destination buffer; may be ``image_array`` itself.
+
+    Returns:
+        np.ndarray: Sharpened array (``out`` if it was given).
+    """
+    return cv2.filter2D(image_array, -1, SHARPEN_KERNEL, dst=out)
+
 def sharpen_image(image):
     """
     Sharpens the input image using a kernel.
@@ -16,8 +31,7 @@ def sharpen_image(image):
     image_array = np.array(image)
 
     # Apply sharpening kernel
-    kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
-    sharpened_array = cv2.filter2D(image_array, -1, kernel)
+    sharpened_array = sharpen_array(image_array)
 
     # Convert back to PIL Image
     return Image.fromarray(sharpened_array)
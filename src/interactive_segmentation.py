@@ -0,0 +1,205 @@
+import time
+import logging
+
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from src import tracing
+from src.image_processing_module.image_cache import load_image
+from src.image_processing_module.resolution import plan_working_resolution, resize_to_plan
+
+PREVIEW_COLOR = (30, 144, 255, 110)
+
+
+class _EncodeSignals(QObject):
+    finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+
+class _EncodeTask(QRunnable):
+    """Runs the SAM image encoder for one image on a pool thread."""
+
+    def __init__(self, model_path, image, signals):
+        super().__init__()
+        self.model_path = model_path
+        self.image = image
+        self.signals = signals
+
+    def run(self):
+        from src.sam_backend import get_sam_session
+
+        try:
+            self.signals.finished.emit(get_sam_session(self.model_path).set_image(self.image))
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+
+
+class _PredictSignals(QObject):
+    finished = pyqtSignal(int, object, float)
+    failed = pyqtSignal(int, str)
+
+
+class _PredictTask(QRunnable):
+    """Decodes one mask preview on a pool thread, off the GUI thread."""
+
+    def __init__(self, segmenter, generation, points, requested, signals):
+        super().__init__()
+        self.segmenter = segmenter
+        self.generation = generation
+        self.points = points
+        self.requested = requested
+        self.signals = signals
+
+    def run(self):
+        try:
+            mask = self.segmenter.predict(self.points)
+            latency_ms = (time.perf_counter() - self.requested) * 1000
+            self.signals.finished.emit(self.generation, mask, latency_ms)
+        except Exception as e:
+            self.signals.failed.emit(self.generation, str(e))
+
+
+class InteractiveSegmenter(QObject):
+    """
+    Point-prompted SAM masks for the uploaded image.
+
+    ``set_image`` encodes the image once in the background at SAM's working
+    resolution. Once ``embedding_ready`` fires, every ``predict`` call reuses
+    the cached embedding and runs only the prompt decoder.
+
+    The GUI calls ``request_mask`` instead of ``predict``: the decode runs on a
+    pool thread (it may wait on the session lock while an encoder pass holds
+    it), at most one runs at a time, requests made meanwhile collapse into the
+    latest one, and only the newest request's mask is delivered through
+    ``mask_ready`` together with its latency from request to mask.
+    """
+
+    embedding_ready = pyqtSignal()
+    embedding_failed = pyqtSignal(str)
+    mask_ready = pyqtSignal(object, float)
+
+    def __init__(self, model_path="sam2_s.pt", parent=None):
+        super().__init__(parent)
+        self.model_path = model_path
+        self.image = None
+        self.image_key = None
+        self._ready_key = None
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._signals = _EncodeSignals()
+        self._signals.finished.connect(self._on_encoded)
+        self._signals.failed.connect(self._on_failed)
+        self._predict_pool = QThreadPool(self)
+        self._predict_pool.setMaxThreadCount(1)
+        self._predict_signals = _PredictSignals()
+        self._predict_signals.finished.connect(self._on_predicted)
+        self._predict_signals.failed.connect(self._on_predict_failed)
+        self._generation = 0
+        self._predicting = False
+        self._queued = None
+
+    def set_image(self, image_path):
+        """Loads ``image_path`` at SAM's working resolution and starts encoding it."""
+        from src.sam_backend import image_key, sam_input
+
+        self._generation += 1  # Previews of the previous image are stale
+        self._queued = None
+        rgb = load_image(image_path, mode="RGB")
+        plan = plan_working_resolution(rgb.shape[1], rgb.shape[0], consumers=("sam",))
+        self.image = sam_input(resize_to_plan(rgb, plan))
+        self.image_key = image_key(self.image)
+        self._pool.start(_EncodeTask(self.model_path, self.image, self._signals))
+        logging.info(f"Encoding {image_path} for interactive segmentation at {plan.width}x{plan.height}")
+
+    @property
+    def size(self):
+        """(width, height) of the prompt image, or None before ``set_image``."""
+        if self.image is None:
+            return None
+        return self.image.shape[1], self.image.shape[0]
+
+    def is_ready(self):
+        return self.image_key is not None and self._ready_key == self.image_key
+
+    def _on_encoded(self, key):
+        self._ready_key = key
+        if key == self.image_key:
+            self.embedding_ready.emit()
+
+    def _on_failed(self, message):
+        logging.error(f"Interactive segmentation encoder failed: {message}")
+        self.embedding_failed.emit(message)
+
+    def request_mask(self, points):
+        """
+        Decodes a mask for ``points`` in the background; ``mask_ready`` delivers it.
+
+        Supersedes every earlier request, whose masks are dropped; an empty
+        ``points`` only cancels them.
+        """
+        self._generation += 1
+        if not points:
+            self._queued = None
+            return
+        request = (self._generation, list(points), time.perf_counter())
+        if self._predicting:
+            self._queued = request
+        else:
+            self._start_predict(request)
+
+    def _start_predict(self, request):
+        self._predicting = True
+        self._predict_pool.start(_PredictTask(self, *request, self._predict_signals))
+
+    def _predict_done(self):
+        self._predicting = False
+        if self._queued is not None:
+            request, self._queued = self._queued, None
+            self._start_predict(request)
+
+    def _on_predicted(self, generation, mask, latency_ms):
+        self._predict_done()
+        if generation != self._generation:
+            logging.info(f"Dropped stale mask preview ({latency_ms:.1f} ms)")
+            return
+        logging.info(f"Mask preview ready {latency_ms:.1f} ms after the request")
+        self.mask_ready.emit(mask, latency_ms)
+
+    def _on_predict_failed(self, generation, message):
+        self._predict_done()
+        logging.error(f"Mask preview failed: {message}")
+
+    def predict(self, points):
+        """
+        Decodes one mask for a set of foreground points (blocking; see ``request_mask``).
+
+        Parameters:
+            points (List[Tuple[int, int]]): Points in prompt-image pixels.
+
+        Returns:
+            np.ndarray or None: Boolean mask at prompt-image resolution, or None
+            if the embedding is not ready yet or nothing was found.
+        """
+        from src.sam_backend import get_sam_session
+
+        if not points or not self.is_ready():
+            return None
+        image = self.image  # set_image may replace it from the GUI thread meanwhile
+        start = time.perf_counter()
+        with tracing.span("sam_prompt", sample_memory=False, points=len(points)) as attrs:
+            # One object prompted by all points
+            results = get_sam_session(self.model_path)(
+                image, points=[[list(point) for point in points]], labels=[[1] * len(points)]
+            )
+            attrs["found"] = bool(results and results[0].masks is not None)
+        logging.info(f"Mask preview decoded in {(time.perf_counter() - start) * 1000:.1f} ms")
+        if not attrs["found"]:
+            return None
+        return results[0].masks.data[0].cpu().numpy().astype(bool)
+
+
+def mask_overlay(mask, color=PREVIEW_COLOR):
+    """Returns a transparent RGBA image with ``mask`` painted in ``color``."""
+    overlay = np.zeros(mask.shape + (4,), dtype=np.uint8)
+    overlay[mask] = color
+    return overlay
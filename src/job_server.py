@@ -0,0 +1,485 @@
+"""
+Local HTTP job server for the jar pipeline.
+
+Wraps ``preprocess_image``, ``segment_image`` and ``generate_3d_models`` as
+job stages behind a small JSON API on localhost, using only the standard
+library. Jobs are persisted in a SQLite queue (``JOB_DB``), so queued jobs
+survive a restart; jobs that were running when the server stopped are
+queued again. Each stage has its own pool of worker threads, and the
+inference stages (SAM, depth) additionally share one concurrency limit so
+parallel jobs do not oversubscribe the cores; the cores are split between
+the jobs that can run at once (see ``src.concurrency``). Within that limit, the depth
+and SAM encoder forward passes of concurrent jobs are micro-batched (see
+``src.batching``).
+
+Endpoints:
+    POST   /uploads?name=<file>               raw image body -> {"path": ...}
+    POST   /jobs                              {"stage", "params", "priority"} -> job
+    GET    /jobs[?status=<status>]            recent jobs
+    GET    /jobs/<id>                         job status, result and artifacts
+    DELETE /jobs/<id>                         cancel a queued job
+    GET    /jobs/<id>/artifacts/<path>        stream an output file
+    GET    /metrics                           Prometheus metrics
+
+Usage:
+    python -m src.job_server --port 8765
+"""
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import logging
+import mimetypes
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src import tracing, concurrency
+
+JOB_ROOT = "jobs"
+JOB_DB = os.path.join(JOB_ROOT, "jobs.sqlite3")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Worker threads per stage
+STAGE_WORKERS = {"preprocess": 2, "segment": 4, "mesh": 4}
+
+# Stages running model inference share this limit; their model calls are batched across jobs
+INFERENCE_STAGES = ("segment", "mesh")
+INFERENCE_CONCURRENCY = 4
+# With batching every forward pass runs on one of two batcher threads (depth, SAM encoder)
+BATCHER_THREADS = 2
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+# Format of tracing.new_job_id(); anything else never names a job directory
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{12}")
+STREAM_CHUNK = 1 << 16
+MAX_UPLOAD_BYTES = 256 * 2**20
+
+
+class JobStore:
+    """
+    SQLite-backed job queue; safe to share between threads.
+
+    Higher ``priority`` runs first, then older jobs.
+    """
+
+    def __init__(self, path=JOB_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (stage, status, priority, created)")
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, stage, params, priority=0):
+        job_id = tracing.new_job_id()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, stage, priority, status, params, created) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, stage, int(priority), json.dumps(params), time.time()))
+        return job_id
+
+    def claim(self, stage):
+        """Atomically marks the next queued job of ``stage`` as running and returns it (or None)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE stage = ? AND status = 'queued' "
+                    "ORDER BY priority DESC, created ASC LIMIT 1", (stage,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?",
+                                       (time.time(), row["id"]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = self._row(row)
+        if job is not None:
+            job["status"] = "running"
+        return job
+
+    def finish(self, job_id, result=None, error=None):
+        status = "failed" if error else "done"
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                               (status, json.dumps(result) if result is not None else None, error, time.time(),
+                                job_id))
+
+    def cancel(self, job_id):
+        """Cancels a queued job; returns False if it is not queued."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id))
+        return cursor.rowcount > 0
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def list(self, status=None, limit=100):
+        query = "SELECT * FROM jobs"
+        args = ()
+        if status:
+            query += " WHERE status = ?"
+            args = (status,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY created DESC LIMIT ?", args + (limit,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def counts(self):
+        """Number of jobs per (stage, status)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT stage, status, COUNT(*) FROM jobs GROUP BY stage, status").fetchall()
+        return {(stage, status): count for stage, status, count in rows}
+
+    def requeue_running(self):
+        """Puts jobs left running by a previous process back in the queue."""
+        with self._lock:
+            cursor = self._conn.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'")
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def run_preprocess(params, job_dir, batching=True):
+    """params: ``image_path``, optional ``responses`` ({"Denoise": bool, "Sharpen": bool})."""
+    from src.image_processing_module.preprocess import preprocess_image
+    from src.image_processing_module.resolution import DEFAULT_CONSUMERS
+
+    image = preprocess_image(params["image_path"], params.get("responses") or {}, consumers=DEFAULT_CONSUMERS)
+    output_path = os.path.join(job_dir, "processed_image.jpg")
+    image.save(output_path)
+    return {"processed_image_path": output_path, "size": list(image.size)}
+
+
+def run_segment(params, job_dir, batching=True):
+    """params: ``image_path``, optional ``export_image_path`` and ``model``."""
+    from src.sam2_api import load_sam_session, segment_image
+
+    session = load_sam_session(params.get("model", "sam2_s.pt"))
+    if session is None:
+        raise RuntimeError("SAM model could not be loaded")
+    if batching:
+        from src.batching import sam_encoder_batcher
+        from src.sam_backend import sam_input
+        from src.image_processing_module.image_cache import load_image
+
+        # Encode together with concurrent jobs; segment_image then hits the embedding cache
+        sam_encoder_batcher(session)(sam_input(load_image(params["image_path"], mode="RGB")))
+    segments_dir = os.path.join(job_dir, "segments")
+    masks, scores = segment_image(session, params["image_path"], segments_dir,
+                                  export_image_path=params.get("export_image_path"))
+    return {"segments_dir": segments_dir, "segments": len(masks), "scores": [float(s) for s in scores]}
+
+
+def run_mesh(params, job_dir, batching=True):
+    """params: ``image_path``, optional ``camera_image_path``."""
+    from src.build_3D_mesh import generate_3d_models
+    from src.depth_backends import get_depth_model
+    from src.batching import batched_depth_model
+
+    depth_model = batched_depth_model() if batching else get_depth_model()
+    paths = generate_3d_models(params["image_path"], job_dir, depth_model,
+                               camera_image_path=params.get("camera_image_path"))
+    return {"paths": paths}
+
+
+STAGE_RUNNERS = {
+    "preprocess": run_preprocess,
+    "segment": run_segment,
+    "mesh": run_mesh,
+}
+
+
+class JobServer:
+    """
+    The queue, the per-stage worker pools and the HTTP front end.
+
+    Parameters:
+        root (str): Directory for the job database, uploads and job outputs.
+        host, port: Address to bind; keep the host on loopback.
+        stage_workers (dict, optional): Worker threads per stage.
+        inference_concurrency (int): Inference stages running at once, over all stages.
+        batching (bool): Micro-batch the depth and SAM encoder passes of concurrent jobs.
+    """
+
+    def __init__(self, root=JOB_ROOT, host=DEFAULT_HOST, port=DEFAULT_PORT, stage_workers=None,
+                 inference_concurrency=INFERENCE_CONCURRENCY, batching=True):
+        self.root = root
+        self.batching = batching
+        self.store = JobStore(os.path.join(root, "jobs.sqlite3"))
+        self.stage_workers = dict(STAGE_WORKERS, **(stage_workers or {}))
+        self.inference_concurrency = inference_concurrency
+        self.inference_limit = threading.BoundedSemaphore(inference_concurrency)
+        self._wakeups = {stage: threading.Condition() for stage in STAGE_RUNNERS}
+        self._stop = threading.Event()
+        self._threads = []
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def submit(self, stage, params, priority=0):
+        if stage not in STAGE_RUNNERS:
+            raise ValueError(f"Unknown stage: {stage}. Choose from {tuple(STAGE_RUNNERS)}")
+        job_id = self.store.submit(stage, params, priority)
+        with self._wakeups[stage]:
+            self._wakeups[stage].notify()
+        logging.info(f"Queued {stage} job {job_id} with priority {priority}")
+        return job_id
+
+    def _worker(self, stage):
+        runner = STAGE_RUNNERS[stage]
+        wakeup = self._wakeups[stage]
+        while not self._stop.is_set():
+            job = self.store.claim(stage)
+            if job is None:
+                with wakeup:
+                    wakeup.wait(timeout=1.0)
+                continue
+            self._run(job, runner)
+
+    def _run(self, job, runner):
+        job_dir = self.job_dir(job["id"])
+        os.makedirs(job_dir, exist_ok=True)
+        limit = self.inference_limit if job["stage"] in INFERENCE_STAGES else None
+        try:
+            with tracing.job(job["id"]):
+                if limit:
+                    concurrency.ensure_inference_threads()
+                    limit.acquire()
+                try:
+                    with tracing.span(f"job_{job['stage']}", priority=job["priority"]):
+                        result = runner(job["params"], job_dir, batching=self.batching)
+                finally:
+                    if limit:
+                        limit.release()
+        except Exception as e:
+            logging.exception(f"{job['stage']} job {job['id']} failed")
+            self.store.finish(job["id"], error=f"{type(e).__name__}: {e}")
+        else:
+            self.store.finish(job["id"], result=result)
+            logging.info(f"{job['stage']} job {job['id']} done")
+
+    def artifacts(self, job_id):
+        """Relative paths of every file a job wrote."""
+        job_dir = self.job_dir(job_id)
+        found = []
+        for directory, _, files in os.walk(job_dir):
+            for name in files:
+                found.append(os.path.relpath(os.path.join(directory, name), job_dir).replace(os.sep, "/"))
+        return sorted(found)
+
+    def artifact_path(self, job_id, relative):
+        """Resolves an artifact path of an existing job, refusing anything outside its directory."""
+        # Checked before touching the filesystem: ids like ".." would resolve above the job directories
+        if not JOB_ID_PATTERN.fullmatch(job_id) or self.store.get(job_id) is None:
+            return None
+        job_dir = os.path.realpath(self.job_dir(job_id))
+        path = os.path.realpath(os.path.join(job_dir, relative))
+        if not path.startswith(job_dir + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def save_upload(self, name, stream, length):
+        upload_dir = os.path.join(self.root, "uploads")
+        os.makedirs(upload_dir, exist_ok=True)
+        path = os.path.join(upload_dir, f"{uuid.uuid4().hex[:12]}{os.path.splitext(os.path.basename(name))[1]}")
+        remaining = length
+        with open(path, "wb") as f:
+            while remaining > 0:
+                chunk = stream.read(min(STREAM_CHUNK, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        return os.path.abspath(path)
+
+    def start(self):
+        """Starts the workers and serves HTTP on a background thread."""
+        # Inference jobs are capped by the limit, preprocessing by its pool size; torch threads
+        # are split between the threads that run forward passes, not between the jobs
+        concurrency.configure_threads(
+            self.inference_concurrency + self.stage_workers.get("preprocess", 0),
+            inference_streams=BATCHER_THREADS if self.batching else self.inference_concurrency,
+        )
+        requeued = self.store.requeue_running()
+        if requeued:
+            logging.info(f"Requeued {requeued} interrupted jobs")
+        for stage, count in self.stage_workers.items():
+            for i in range(count):
+                thread = threading.Thread(target=self._worker, args=(stage,), name=f"jar-{stage}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        thread = threading.Thread(target=self.httpd.serve_forever, name="jar-http", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        logging.info(f"Job server listening on http://{self.address[0]}:{self.address[1]}")
+
+    def serve_forever(self):
+        self.start()
+        try:
+            self._stop.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stop.set()
+        for wakeup in self._wakeups.values():
+            with wakeup:
+                wakeup.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.store.close()
+
+
+def _make_handler(server):
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logging.info(f"HTTP {self.address_string()} {format % args}")
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status, message):
+            self._send_json({"error": message}, status)
+
+        def _route(self):
+            url = urlparse(self.path)
+            return [part for part in url.path.split("/") if part], parse_qs(url.query)
+
+        def _job(self, job_id):
+            job = server.store.get(job_id)
+            if job is not None:
+                job["artifacts"] = server.artifacts(job_id)
+            return job
+
+        def do_GET(self):
+            parts, query = self._route()
+            if parts == ["metrics"]:
+                for (stage, status), count in server.store.counts().items():
+                    tracing.metrics.set_gauge("jar_jobs", count, stage=stage, status=status)
+                body = tracing.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif parts == ["jobs"]:
+                status = query.get("status", [None])[0]
+                self._send_json({"jobs": server.store.list(status)})
+            elif len(parts) == 2 and parts[0] == "jobs":
+                job = self._job(parts[1])
+                if job is None:
+                    return self._error(404, "No such job")
+                self._send_json(job)
+            elif len(parts) >= 4 and parts[0] == "jobs" and parts[2] == "artifacts":
+                path = server.artifact_path(parts[1], "/".join(parts[3:]))
+                if path is None:
+                    return self._error(404, "No such artifact")
+                self._stream_file(path)
+            else:
+                self._error(404, "Not found")
+
+        def _stream_file(self, path):
+            self.send_response(200)
+            self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, self.wfile, STREAM_CHUNK)
+
+        def do_POST(self):
+            parts, query = self._route()
+            length = int(self.headers.get("Content-Length") or 0)
+            if parts == ["uploads"]:
+                if not 0 < length <= MAX_UPLOAD_BYTES:
+                    return self._error(413 if length else 411, "Upload must be between 1 byte and the size limit")
+                path = server.save_upload(query.get("name", ["upload.jpg"])[0], self.rfile, length)
+                return self._send_json({"path": path}, 201)
+            if parts != ["jobs"]:
+                return self._error(404, "Not found")
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+                job_id = server.submit(request["stage"], request.get("params") or {}, request.get("priority", 0))
+            except (ValueError, KeyError, TypeError) as e:
+                return self._error(400, f"Bad job request: {e}")
+            self._send_json(self._job(job_id), 202)
+
+        def do_DELETE(self):
+            parts, _ = self._route()
+            if len(parts) != 2 or parts[0] != "jobs":
+                return self._error(404, "Not found")
+            if server.store.get(parts[1]) is None:
+                return self._error(404, "No such job")
+            if not server.store.cancel(parts[1]):
+                return self._error(409, "Only queued jobs can be cancelled")
+            self._send_json(self._job(parts[1]))
+
+    return JobRequestHandler
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the jar pipeline as local jobs")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--root", default=JOB_ROOT, help="Job database and output directory")
+    parser.add_argument("--inference-concurrency", type=int, default=INFERENCE_CONCURRENCY)
+    parser.add_argument("--no-batching", action="store_true", help="Run one model forward pass per job")
+    for stage, count in STAGE_WORKERS.items():
+        parser.add_argument(f"--{stage}-workers", type=int, default=count)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    stage_workers = {stage: getattr(args, f"{stage}_workers") for stage in STAGE_WORKERS}
+    JobServer(args.root, args.host, args.port, stage_workers, args.inference_concurrency,
+              not args.no_batching).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Local, memory-mapped library of PBR materials (MatSynth).
+
+``sync_matsynth`` streams ``gvecchio/MatSynth`` once and writes shards to
+``MATERIAL_CACHE_DIR``. Each shard stores every map at several resolutions
+as uint8 ``.npy`` arrays of tiles:
+
+    <shard>/index.json                    material names and metadata
+    <shard>/<map>_<resolution>.npy        (materials, rows, cols, tile, tile, channels)
+
+Images are decoded and resized in a thread pool while the shard is built,
+never at request time. ``MaterialLibrary`` then serves any material, map,
+resolution or single tile from read-only memory maps, offline. The GAN
+training loader and the texture mapper both read from it.
+"""
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+MATERIAL_CACHE_DIR = os.path.join(".cache", "materials")
+RESOLUTIONS = (1024, 512, 256)
+TILE_SIZE = 256
+SHARD_SIZE = 64
+
+# Channels and fill colour (for materials missing the map) per stored map
+MAPS = {
+    "basecolor": ("RGB", 3, (128, 128, 128)),
+    "normal": ("RGB", 3, (128, 128, 255)),
+    "roughness": ("L", 1, (128,)),
+}
+
+
+def _to_tiles(array, tile):
+    """(H, W, C) -> (rows, cols, tile, tile, C) so that each tile is contiguous."""
+    height, width, channels = array.shape
+    return array.reshape(height // tile, tile, width // tile, tile, channels).transpose(0, 2, 1, 3, 4)
+
+
+def _from_tiles(tiles):
+    rows, cols, tile, _, channels = tiles.shape
+    return tiles.transpose(0, 2, 1, 3, 4).reshape(rows * tile, cols * tile, channels)
+
+
+def _prepare(sample, resolutions):
+    """Decodes one sample's maps and resizes them to every resolution (runs on a pool thread)."""
+    prepared = {}
+    for name, (mode, channels, fill) in MAPS.items():
+        image = sample.get(name)
+        if image is None:
+            prepared[name] = {res: np.full((res, res, channels), fill, dtype=np.uint8) for res in resolutions}
+            continue
+        if not isinstance(image, Image.Image):
+            image = Image.open(image)
+        image = image.convert(mode)
+        levels = {}
+        for res in sorted(resolutions, reverse=True):
+            # Each level is resized from the previous (larger) one
+            image = image.resize((res, res), Image.LANCZOS)
+            levels[res] = np.asarray(image, dtype=np.uint8).reshape(res, res, channels)
+        prepared[name] = levels
+    return prepared
+
+
+def write_shard(samples, shard_dir, resolutions=RESOLUTIONS, tile=TILE_SIZE, workers=None):
+    """
+    Writes one shard from material samples.
+
+    Parameters:
+        samples (List[dict]): Dicts with ``name``, optional ``metadata`` and PIL
+            images (or paths) for the keys of ``MAPS``.
+        shard_dir (str): Output directory.
+        resolutions (tuple): Square resolutions to store.
+        tile (int): Tile edge; smaller resolutions are stored as one tile.
+        workers (int, optional): Decode threads.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    arrays = {}
+    for name, (_, channels, _) in MAPS.items():
+        for res in resolutions:
+            t = min(tile, res)
+            arrays[name, res] = np.lib.format.open_memmap(
+                os.path.join(shard_dir, f"{name}_{res}.npy"), mode="w+", dtype=np.uint8,
+                shape=(len(samples), res // t, res // t, t, t, channels))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, prepared in enumerate(pool.map(lambda sample: _prepare(sample, resolutions), samples)):
+            for name, levels in prepared.items():
+                for res, array in levels.items():
+                    arrays[name, res][i] = _to_tiles(array, min(tile, res))
+    for array in arrays.values():
+        array.flush()
+
+    index = {
+        "materials": [{"name": sample.get("name") or f"material_{i}", "metadata": sample.get("metadata") or {}}
+                      for i, sample in enumerate(samples)],
+        "resolutions": list(resolutions),
+        "maps": list(MAPS),
+        "tile": tile,
+    }
+    # The index is written last; a shard without one is incomplete and ignored
+    with open(os.path.join(shard_dir, "index.json"), "w") as f:
+        json.dump(index, f)
+    logging.info(f"Wrote material shard {shard_dir} with {len(samples)} materials")
+
+
+def sync_matsynth(cache_dir=MATERIAL_CACHE_DIR, max_materials=512, shard_size=SHARD_SIZE, license_filter="CC0",
+                  resolutions=RESOLUTIONS, workers=None):
+    """
+    Streams MatSynth into local shards (once; existing shards are kept).
+
+    Parameters:
+        cache_dir (str): Library directory.
+        max_materials (int): Materials to fetch in total.
+        shard_size (int): Materials per shard.
+        license_filter (str, optional): Only keep materials with this license.
+        resolutions (tuple): Resolutions to store.
+        workers (int, optional): Decode threads.
+
+    Returns:
+        MaterialLibrary: The library.
+    """
+    from datasets import load_dataset  # Only needed to fetch
+
+    library = MaterialLibrary(cache_dir)
+    if len(library) >= max_materials:
+        return library
+
+    ds = load_dataset("gvecchio/MatSynth", split="train", streaming=True)
+    ds = ds.select_columns(["name", "metadata"] + list(MAPS))
+    if license_filter:
+        ds = ds.filter(lambda x: (x.get("metadata") or {}).get("license") == license_filter)
+    # Same exclusion as the original notebook
+    ds = ds.filter(lambda x: (x.get("metadata") or {}).get("source") != "deschaintre_2020")
+
+    known = set(library.names())
+    shard_index = len(library.shards)
+    batch = []
+    fetched = len(library)
+    for sample in ds:
+        if fetched >= max_materials:
+            break
+        if sample.get("name") in known:
+            continue
+        batch.append(sample)
+        fetched += 1
+        if len(batch) == shard_size:
+            write_shard(batch, os.path.join(cache_dir, f"shard_{shard_index:05d}"), resolutions, workers=workers)
+            shard_index += 1
+            batch = []
+    if batch:
+        write_shard(batch, os.path.join(cache_dir, f"shard_{shard_index:05d}"), resolutions, workers=workers)
+    return MaterialLibrary(cache_dir)
+
+
+class _Shard:
+    def __init__(self, shard_dir):
+        self.dir = shard_dir
+        with open(os.path.join(shard_dir, "index.json")) as f:
+            self.index = json.load(f)
+        self._arrays = {}
+
+    def array(self, name, resolution):
+        key = (name, resolution)
+        if key not in self._arrays:
+            self._arrays[key] = np.load(os.path.join(self.dir, f"{name}_{resolution}.npy"), mmap_mode="r")
+        return self._arrays[key]
+
+
+class MaterialLibrary:
+    """
+    Read-only view of the local material shards.
+
+    Parameters:
+        cache_dir (str): Library directory written by ``sync_matsynth`` / ``write_shard``.
+    """
+
+    def __init__(self, cache_dir=MATERIAL_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.shards = []
+        self._locations = {}
+        if os.path.isdir(cache_dir):
+            for entry in sorted(os.listdir(cache_dir)):
+                shard_dir = os.path.join(cache_dir, entry)
+                if os.path.exists(os.path.join(shard_dir, "index.json")):
+                    self.shards.append(_Shard(shard_dir))
+        for shard in self.shards:
+            for i, material in enumerate(shard.index["materials"]):
+                self._locations[material["name"]] = (shard, i)
+
+    def __len__(self):
+        return len(self._locations)
+
+    def names(self):
+        return list(self._locations)
+
+    def metadata(self, name):
+        shard, i = self._locations[name]
+        return shard.index["materials"][i]["metadata"]
+
+    def resolutions(self, name):
+        return self._locations[name][0].index["resolutions"]
+
+    def _nearest_resolution(self, name, resolution):
+        available = self.resolutions(name)
+        larger = [res for res in available if res >= resolution]
+        return min(larger) if larger else max(available)
+
+    def get(self, name, map_name="basecolor", resolution=1024):
+        """
+        Returns a map as an (R, R, C) uint8 array.
+
+        The smallest stored resolution of at least ``resolution`` is used; no
+        resizing happens here. Untiling costs one copy of that map.
+        """
+        shard, i = self._locations[name]
+        resolution = self._nearest_resolution(name, resolution)
+        return _from_tiles(shard.array(map_name, resolution)[i])
+
+    def tile(self, name, row, col, map_name="basecolor", resolution=1024):
+        """Returns one (tile, tile, C) tile as a read-only view into the memory map."""
+        shard, i = self._locations[name]
+        return shard.array(map_name, self._nearest_resolution(name, resolution))[i, row, col]
+
+    def load_many(self, names, map_name="basecolor", resolution=1024, workers=None):
+        """Loads several maps concurrently (page-in and untiling run on a thread pool)."""
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(lambda name: self.get(name, map_name, resolution), names))
+
+
+def material_dataset(library=None, map_names=("basecolor",), resolution=512):
+    """
+    A map-style torch dataset over the library for GAN training.
+
+    Items are float tensors in [0, 1] of shape (C, R, R), with the requested
+    maps concatenated along C. Use a ``DataLoader`` with ``num_workers`` to
+    read items in parallel; each worker shares the memory-mapped shards.
+    """
+    import torch
+    from torch.utils.data import Dataset
+
+    library = library or MaterialLibrary()
+
+    class MaterialDataset(Dataset):
+        def __init__(self):
+            self.names = library.names()
+
+        def __len__(self):
+            return len(self.names)
+
+        def __getitem__(self, index):
+            maps = [library.get(self.names[index], map_name, resolution) for map_name in map_names]
+            array = np.concatenate(maps, axis=2)
+            return torch.from_numpy(array).permute(2, 0, 1).float().div_(255.0)
+
+    return MaterialDataset()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fetch MatSynth materials into the local library")
+    parser.add_argument("--max-materials", type=int, default=512)
+    parser.add_argument("--cache-dir", default=MATERIAL_CACHE_DIR)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(f"{len(sync_matsynth(args.cache_dir, args.max_materials))} materials in {args.cache_dir}")
@@ -0,0 +1,77 @@
+"""
+Multi-resolution hash encoding (Instant-NGP), vectorized over levels.
+
+All levels share one parameter tensor of shape (levels, T, F). A batch of
+points is encoded with a single gather over the 8 cell corners of every
+level, instead of a Python loop over levels with one ``grid_sample`` each.
+"""
+import numpy as np
+import torch
+import torch.nn as nn
+
+# Spatial hash primes from the Instant-NGP paper
+PRIMES = (1, 2_654_435_761, 805_459_861)
+
+# (8, 3) corner offsets of a unit cell
+_CORNERS = torch.tensor([[(i >> 0) & 1, (i >> 1) & 1, (i >> 2) & 1] for i in range(8)], dtype=torch.int64)
+
+
+def level_resolutions(levels=16, n_min=16, n_max=2048):
+    """Geometric progression of grid resolutions between ``n_min`` and ``n_max``."""
+    b = np.exp((np.log(n_max) - np.log(n_min)) / (levels - 1))
+    return [int(np.floor(n_min * b ** level)) for level in range(levels)]
+
+
+class HashEncoding(nn.Module):
+    """
+    Encodes points in [0, 1]^3 into ``levels * F`` trilinearly interpolated features.
+
+    Parameters:
+        resolutions (List[int]): Grid resolution per level.
+        table_size (int): Entries per level (T).
+        features (int): Features per entry (F).
+    """
+
+    def __init__(self, resolutions, table_size=2 ** 19, features=2):
+        super().__init__()
+        self.table_size = table_size
+        self.features = features
+        self.register_buffer("resolutions", torch.tensor(resolutions, dtype=torch.float32), persistent=False)
+        self.register_buffer("level_offsets", torch.arange(len(resolutions), dtype=torch.int64) * table_size,
+                             persistent=False)
+        self.register_buffer("corners", _CORNERS.clone(), persistent=False)
+        self.register_buffer("primes", torch.tensor(PRIMES, dtype=torch.int64), persistent=False)
+        self.tables = nn.Parameter((torch.rand(len(resolutions), table_size, features) * 2 - 1) * 1e-4)
+
+    @property
+    def output_dim(self):
+        return self.tables.shape[0] * self.features
+
+    def hash(self, vertices):
+        """Spatial hash of integer vertices (..., 3) into [0, T)."""
+        scaled = vertices * self.primes
+        hashed = torch.bitwise_xor(torch.bitwise_xor(scaled[..., 0], scaled[..., 1]), scaled[..., 2])
+        if self.table_size & (self.table_size - 1) == 0:
+            return hashed & (self.table_size - 1)
+        return torch.remainder(hashed, self.table_size)
+
+    def forward(self, x):
+        """
+        Parameters:
+            x (torch.Tensor): (N, 3) points in [0, 1]^3.
+
+        Returns:
+            torch.Tensor: (N, levels * F) features.
+        """
+        scaled = x[:, None, :] * self.resolutions[None, :, None]      # (N, L, 3)
+        floor = torch.floor(scaled)
+        fraction = scaled - floor                                       # (N, L, 3)
+        vertices = floor.to(torch.int64)[:, :, None, :] + self.corners  # (N, L, 8, 3)
+
+        indices = self.hash(vertices) + self.level_offsets[None, :, None]   # (N, L, 8)
+        values = self.tables.view(-1, self.features)[indices]               # (N, L, 8, F)
+
+        # Trilinear weights: fraction for a corner offset of 1, (1 - fraction) for 0
+        weights = torch.where(self.corners.bool(), fraction[:, :, None, :], 1 - fraction[:, :, None, :])
+        weights = weights.prod(dim=-1)                                       # (N, L, 8)
+        return (weights[..., None] * values).sum(dim=2).reshape(x.shape[0], -1)
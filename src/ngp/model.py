@@ -0,0 +1,84 @@
+import torch
+import torch.nn as nn
+
+from src.ngp.encoding import HashEncoding, level_resolutions
+
+
+class NGP(nn.Module):
+    """
+    Instant-NGP radiance field: hash-encoded density MLP and a view-dependent colour MLP.
+
+    Parameters:
+        resolutions (List[int]): Hash grid resolution per level.
+        table_size (int): Hash table entries per level (T).
+        direction_frequencies (int): Positional-encoding frequencies for view directions (L).
+        aabb_scale (float): Edge of the scene bounding box, centred at the origin.
+        features (int): Features per hash entry (F).
+    """
+
+    def __init__(self, resolutions, table_size=2 ** 19, direction_frequencies=4, aabb_scale=3.0, features=2):
+        super().__init__()
+        self.aabb_scale = aabb_scale
+        self.direction_frequencies = direction_frequencies
+        self.encoding = HashEncoding(resolutions, table_size, features)
+        direction_dim = 3 + 6 * direction_frequencies
+        self.density_MLP = nn.Sequential(nn.Linear(self.encoding.output_dim, 64), nn.ReLU(), nn.Linear(64, 16))
+        self.color_MLP = nn.Sequential(nn.Linear(direction_dim + 16, 64), nn.ReLU(),
+                                       nn.Linear(64, 64), nn.ReLU(),
+                                       nn.Linear(64, 3), nn.Sigmoid())
+
+    def positional_encoding(self, d):
+        out = [d]
+        for j in range(self.direction_frequencies):
+            out.append(torch.sin(2 ** j * d))
+            out.append(torch.cos(2 ** j * d))
+        return torch.cat(out, dim=1)
+
+    def normalize(self, x):
+        """Maps world points into [0, 1]^3 and flags the ones inside the bounding box."""
+        x = x / self.aabb_scale + 0.5
+        inside = ((x >= 0) & (x < 1)).all(dim=1)
+        return x, inside
+
+    def density(self, x):
+        """Volume density at world points (zero outside the bounding box)."""
+        x, inside = self.normalize(x)
+        sigma = torch.zeros(x.shape[0], device=x.device)
+        if inside.any():
+            sigma[inside] = torch.exp(self.density_MLP(self.encoding(x[inside]))[:, 0])
+        return sigma
+
+    def forward(self, x, d):
+        """
+        Parameters:
+            x (torch.Tensor): (N, 3) world points.
+            d (torch.Tensor): (N, 3) view directions.
+
+        Returns:
+            tuple: (colour (N, 3), density (N,))
+        """
+        x, inside = self.normalize(x)
+        color = torch.zeros((x.shape[0], 3), device=x.device)
+        sigma = torch.zeros(x.shape[0], device=x.device)
+        if inside.any():
+            h = self.density_MLP(self.encoding(x[inside]))
+            sigma[inside] = torch.exp(h[:, 0])
+            color[inside] = self.color_MLP(torch.cat((h, self.positional_encoding(d[inside])), dim=1))
+        return color, sigma
+
+
+def build_ngp(levels=16, table_size=2 ** 19, n_min=16, n_max=2048, aabb_scale=3.0, direction_frequencies=4,
+              features=2):
+    """NGP with the notebook's defaults: 16 levels from 16 to 2048 cells, 2**19 entries per level."""
+    return NGP(level_resolutions(levels, n_min, n_max), table_size, direction_frequencies, aabb_scale, features)
+
+
+def make_optimizer(model, lr=1e-2):
+    """Adam as in Instant-NGP: no weight decay on the hash tables, a little on the MLPs."""
+    return torch.optim.Adam([
+        {"params": model.encoding.parameters(), "lr": lr, "betas": (0.9, 0.99), "eps": 1e-15, "weight_decay": 0.},
+        {"params": model.density_MLP.parameters(), "lr": lr, "betas": (0.9, 0.99), "eps": 1e-15,
+         "weight_decay": 1e-6},
+        {"params": model.color_MLP.parameters(), "lr": lr, "betas": (0.9, 0.99), "eps": 1e-15,
+         "weight_decay": 1e-6},
+    ])
@@ -0,0 +1,56 @@
+import torch
+
+
+class OccupancyGrid:
+    """
+    Coarse density grid over the scene bounding box, used to skip empty space.
+
+    During training the grid is refreshed every few steps from the model's
+    density at random points in each cell (an exponential moving maximum, as
+    in Instant-NGP). Samples that fall in unoccupied cells are never sent
+    through the network.
+
+    Parameters:
+        aabb_scale (float): Edge of the bounding box, centred at the origin (the model's ``aabb_scale``).
+        resolution (int): Cells per axis.
+        threshold (float): Density above which a cell counts as occupied.
+        decay (float): Decay of the stored density per update.
+    """
+
+    def __init__(self, aabb_scale, resolution=64, threshold=0.01, decay=0.95, device="cpu"):
+        self.aabb_scale = aabb_scale
+        self.resolution = resolution
+        self.threshold = threshold
+        self.decay = decay
+        self.density = torch.full((resolution,) * 3, float("inf"), device=device)  # Everything occupied until updated
+        self.occupied = torch.ones((resolution,) * 3, dtype=torch.bool, device=device)
+
+    def cell_indices(self, x):
+        """Cell index (N, 3) of world points and whether they are inside the grid."""
+        normalized = x / self.aabb_scale + 0.5
+        inside = ((normalized >= 0) & (normalized < 1)).all(dim=-1)
+        cells = (normalized.clamp(0, 1 - 1e-6) * self.resolution).long()
+        return cells, inside
+
+    def is_occupied(self, x):
+        """Boolean mask of world points that lie in occupied cells."""
+        cells, inside = self.cell_indices(x)
+        return inside & self.occupied[cells[..., 0], cells[..., 1], cells[..., 2]]
+
+    @torch.no_grad()
+    def update(self, model, chunk_size=2 ** 18):
+        """Re-estimates each cell's density at one random point inside it."""
+        device = self.density.device
+        grid = torch.stack(torch.meshgrid(*(torch.arange(self.resolution, device=device),) * 3, indexing="ij"), -1)
+        cells = grid.reshape(-1, 3)
+        points = ((cells + torch.rand(cells.shape, device=device)) / self.resolution - 0.5) * self.aabb_scale
+
+        sampled = torch.cat([model.density(points[i:i + chunk_size]) for i in range(0, len(points), chunk_size)])
+        sampled = sampled.reshape(self.density.shape)
+        previous = torch.where(torch.isinf(self.density), torch.zeros_like(self.density), self.density)
+        self.density = torch.maximum(previous * self.decay, sampled)
+        self.occupied = self.density > min(self.threshold, self.density.mean().item())
+
+    @property
+    def occupancy_ratio(self):
+        return self.occupied.float().mean().item()
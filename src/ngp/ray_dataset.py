@@ -0,0 +1,284 @@
+"""
+Memory-mapped ray datasets for NGP training.
+
+File layout: a 64-byte little-endian header followed by one contiguous
+(num_rays, 9) array of origin, direction and RGB colour per ray.
+
+    offset  size  field
+         0     4  magic b"JRAY"
+         4     2  format version
+         6     1  dtype code (0 = float32, 1 = float16)
+         7     1  reserved
+         8     8  number of rays
+        16     4  image height
+        20     4  image width
+        24     4  number of views
+        28    36  reserved
+
+Readers map the file and copy only the minibatches they use, so a scene of
+several gigabytes trains with a working set of a few shuffle blocks.
+"""
+import os
+import json
+import struct
+import logging
+
+import numpy as np
+import torch
+from PIL import Image
+
+MAGIC = b"JRAY"
+VERSION = 1
+HEADER_SIZE = 64
+RAY_FIELDS = 9
+_HEADER = struct.Struct("<4sHBBQIII")
+_DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+_DTYPE_CODES = {np.dtype("<f4"): 0, np.dtype("<f2"): 1}
+
+
+def _pack_header(dtype, num_rays, height, width, num_views):
+    header = _HEADER.pack(MAGIC, VERSION, _DTYPE_CODES[np.dtype(dtype).newbyteorder("<")], 0,
+                          num_rays, height, width, num_views)
+    return header.ljust(HEADER_SIZE, b"\0")
+
+
+def read_header(path):
+    """Returns the header fields of a ray file as a dict."""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"Not a ray dataset (truncated header): {path}")
+    magic, version, dtype_code, _, num_rays, height, width, num_views = _HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"Not a ray dataset: {path}")
+    if version != VERSION or dtype_code not in _DTYPES:
+        raise ValueError(f"Unsupported ray dataset version {version} / dtype {dtype_code}: {path}")
+    return {"dtype": _DTYPES[dtype_code], "num_rays": num_rays, "height": height, "width": width,
+            "num_views": num_views}
+
+
+class RayDatasetWriter:
+    """
+    Appends rays to a ray file; the header is finalised on ``close``.
+
+    Parameters:
+        path (str): Output file.
+        height, width (int): Image size of each view (0 if views differ).
+        dtype (str): "float16" halves the file size; positions then keep about 3 significant digits.
+    """
+
+    def __init__(self, path, height=0, width=0, dtype="float16"):
+        self.path = path
+        self.height = height
+        self.width = width
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.num_rays = 0
+        self.num_views = 0
+        self._file = open(path, "wb")
+        self._file.write(_pack_header(self.dtype, 0, height, width, 0))
+
+    def append(self, rays, views=1):
+        """Appends an (N, 9) array of rays making up ``views`` images."""
+        rays = np.asarray(rays).reshape(-1, RAY_FIELDS)
+        self._file.write(np.ascontiguousarray(rays, dtype=self.dtype).tobytes())
+        self.num_rays += len(rays)
+        self.num_views += views
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(_pack_header(self.dtype, self.num_rays, self.height, self.width, self.num_views))
+        self._file.close()
+        logging.info(f"Wrote {self.num_rays} rays ({self.num_views} views) to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _MinibatchStream:
+    def __init__(self, dataset, batch_size, block_size, shuffle_blocks, seed):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.block_size = block_size
+        self.shuffle_blocks = shuffle_blocks
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self):
+        return -(-len(self.dataset) // self.batch_size)
+
+    def __iter__(self):
+        rng = np.random.default_rng(None if self.seed is None else self.seed + self.epoch)
+        self.epoch += 1
+        rays = self.dataset.rays
+        starts = rng.permutation(np.arange(0, len(rays), self.block_size))
+        leftover = None
+        for i in range(0, len(starts), self.shuffle_blocks):
+            # Read a few random contiguous blocks and shuffle them together
+            buffer = np.concatenate([np.asarray(rays[start:start + self.block_size], dtype=np.float32)
+                                     for start in np.sort(starts[i:i + self.shuffle_blocks])])
+            if leftover is not None:
+                buffer = np.concatenate([leftover, buffer])
+            buffer = buffer[rng.permutation(len(buffer))]
+            usable = len(buffer) - len(buffer) % self.batch_size
+            for j in range(0, usable, self.batch_size):
+                yield torch.from_numpy(buffer[j:j + self.batch_size])
+            leftover = buffer[usable:] if usable < len(buffer) else None
+        if leftover is not None:
+            yield torch.from_numpy(leftover)
+
+
+class RayDataset(torch.utils.data.Dataset):
+    """
+    Read-only, memory-mapped view of a ray file.
+
+    Indexing returns float32 tensors. For training, ``minibatches`` streams
+    shuffled batches block by block instead of random single-ray reads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = read_header(path)
+        self.height = header["height"]
+        self.width = header["width"]
+        self.num_views = header["num_views"]
+        self.rays = np.memmap(path, dtype=header["dtype"], mode="r", offset=HEADER_SIZE,
+                              shape=(header["num_rays"], RAY_FIELDS))
+
+    def __len__(self):
+        return len(self.rays)
+
+    def __getitem__(self, index):
+        return torch.from_numpy(np.asarray(self.rays[index], dtype=np.float32))
+
+    def view(self, index):
+        """All rays of view ``index`` (requires a fixed image size)."""
+        if not self.height or not self.width:
+            raise ValueError("Ray file has no fixed image size")
+        count = self.height * self.width
+        return self[index * count:(index + 1) * count]
+
+    def minibatches(self, batch_size=2**14, block_size=2**16, shuffle_blocks=8, seed=None):
+        """
+        Shuffled minibatches for ``ngp.rendering.train`` (iterable with ``len``).
+
+        Memory use is about ``shuffle_blocks * block_size`` rays, whatever the file size.
+        """
+        return _MinibatchStream(self, batch_size, block_size, shuffle_blocks, seed)
+
+
+def rays_from_pose(c2w, height, width, focal):
+    """
+    World-space rays through every pixel of a pinhole camera (NeRF convention:
+    the camera looks down -z with y up).
+
+    Parameters:
+        c2w (np.ndarray): (4, 4) or (3, 4) camera-to-world matrix.
+        focal (float): Focal length in pixels.
+
+    Returns:
+        tuple: (origins (H*W, 3), unit directions (H*W, 3)) as float32.
+    """
+    c2w = np.asarray(c2w, dtype=np.float32)
+    u, v = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    directions = np.stack([(u + 0.5 - width / 2) / focal, -(v + 0.5 - height / 2) / focal,
+                           -np.ones_like(u)], axis=-1).reshape(-1, 3)
+    directions = directions @ c2w[:3, :3].T
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    origins = np.broadcast_to(c2w[:3, 3], directions.shape)
+    return np.ascontiguousarray(origins), directions
+
+
+def _load_rgb(image, background=1.0):
+    array = np.asarray(Image.open(image) if isinstance(image, str) else image, dtype=np.float32) / 255.0
+    if array.ndim == 2:
+        array = np.repeat(array[..., None], 3, axis=2)
+    if array.shape[2] == 4:
+        # Composite onto the white background the renderer assumes
+        array = array[..., :3] * array[..., 3:] + background * (1 - array[..., 3:])
+    return array
+
+
+def write_posed_images(path, images, poses, focal, dtype="float16"):
+    """
+    Generates a ray file from posed images, one view at a time.
+
+    Parameters:
+        path (str): Output ray file.
+        images (List[str or np.ndarray]): Image paths or uint8 arrays, all the same size.
+        poses (List[np.ndarray]): Camera-to-world matrices.
+        focal (float): Focal length in pixels.
+        dtype (str): Storage dtype.
+
+    Returns:
+        RayDataset: The written dataset.
+    """
+    writer = None
+    try:
+        for image, pose in zip(images, poses):
+            colors = _load_rgb(image)
+            height, width = colors.shape[:2]
+            if writer is None:
+                writer = RayDatasetWriter(path, height, width, dtype)
+            elif (height, width) != (writer.height, writer.width):
+                raise ValueError(f"All views must be {writer.width}x{writer.height}, got {width}x{height}")
+            origins, directions = rays_from_pose(pose, height, width, focal)
+            writer.append(np.concatenate([origins, directions, colors.reshape(-1, 3)], axis=1))
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError("No images given")
+    return RayDataset(path)
+
+
+def write_from_transforms(transforms_path, path, dtype="float16", downscale=1):
+    """
+    Generates a ray file from a NeRF-style ``transforms.json``
+    (``camera_angle_x`` and frames with ``file_path`` / ``transform_matrix``).
+
+    Parameters:
+        transforms_path (str): The transforms file; image paths are relative to it.
+        path (str): Output ray file.
+        downscale (int): Integer downscale factor for the images.
+    """
+    with open(transforms_path) as f:
+        transforms = json.load(f)
+    root = os.path.dirname(transforms_path)
+
+    def frame_path(frame):
+        file_path = os.path.join(root, frame["file_path"])
+        return file_path if os.path.splitext(file_path)[1] else file_path + ".png"
+
+    frames = transforms["frames"]
+    with Image.open(frame_path(frames[0])) as first:
+        width = first.width // downscale
+    focal = 0.5 * width / np.tan(0.5 * transforms["camera_angle_x"])
+
+    def images():
+        for frame in frames:
+            with Image.open(frame_path(frame)) as image:
+                if downscale > 1:
+                    image = image.resize((image.width // downscale, image.height // downscale), Image.LANCZOS)
+                yield np.asarray(image)
+
+    return write_posed_images(path, images(), [frame["transform_matrix"] for frame in frames], focal, dtype)
+
+
+def convert_legacy_array(array_path, path, height, width, dtype="float16", chunk_rays=2**20):
+    """
+    Converts the notebook's ``training_data_*.pkl`` arrays to a ray file.
+
+    The legacy file is a pickled array and must be loaded once; the result
+    never needs to be.
+    """
+    rays = np.load(array_path, allow_pickle=True)
+    with RayDatasetWriter(path, height, width, dtype) as writer:
+        for start in range(0, len(rays), chunk_rays):
+            writer.append(rays[start:start + chunk_rays], views=0)
+        writer.num_views = len(rays) // (height * width)
+    return RayDataset(path)
@@ -0,0 +1,184 @@
+import math
+import logging
+
+import numpy as np
+import torch
+from tqdm import tqdm
+
+# Default working-memory budget for one chunk of rays
+DEFAULT_MEMORY_BUDGET = 1 * 2**30
+# Memory per drawn sample before skipping: t, delta, position, occupancy mask, sort key and index
+DRAWN_SAMPLE_BYTES = 4 + 4 + 12 + 1 + 4 + 8
+
+
+def bytes_per_sample(model, training=False):
+    """
+    Approximate peak working memory per evaluated sample point for ``model``.
+
+    Dominated by the hash encoding's (levels, 8 corners) gathers; training
+    keeps the activations for the backward pass, roughly tripling it.
+    """
+    levels, _, features = model.encoding.tables.shape
+    corners = levels * 8
+    encoding = corners * (3 * 8 + 8 + features * 4 + 3 * 4 + 4)  # Vertices, indices, values, weights
+    mlp = (levels * features + 64 + 16 + 64 + 64 + 3 + 3 + 6 * model.direction_frequencies) * 4
+    per_sample = encoding + mlp + 4 * 12  # Positions, directions, colour, density, t, delta
+    return per_sample * (3 if training else 1)
+
+
+def ray_batch_size(model, nb_bins, memory_budget=DEFAULT_MEMORY_BUDGET, training=False, occupancy=None):
+    """
+    Rays per chunk so that one chunk's samples fit in ``memory_budget`` bytes.
+
+    Every ray draws ``nb_bins`` samples, but with an occupancy grid only the
+    occupied ones are evaluated; their expected number per ray is estimated
+    from the grid's occupancy ratio. Chunks of rays that cross more occupied
+    cells than average use proportionally more memory.
+    """
+    occupied_fraction = occupancy.occupancy_ratio if occupancy is not None else 1.0
+    evaluated = max(1, math.ceil(nb_bins * occupied_fraction))
+    per_ray = nb_bins * DRAWN_SAMPLE_BYTES + evaluated * bytes_per_sample(model, training)
+    return max(1, int(memory_budget // per_ray))
+
+
+def compute_accumulated_transmittance(alphas):
+    accumulated_transmittance = torch.cumprod(alphas, 1)
+    return torch.cat((torch.ones((accumulated_transmittance.shape[0], 1), device=alphas.device),
+                      accumulated_transmittance[:, :-1]), dim=-1)
+
+
+def _compact_occupied(t, delta, occupied):
+    """
+    Moves each ray's occupied samples to the front, in order, and drops the columns no ray needs.
+
+    Returns:
+        tuple: (B, K) t, delta and validity mask, K being the most occupied samples of any ray.
+    """
+    counts = occupied.sum(dim=1)
+    # Stable sort of the "empty" flag keeps the occupied samples in depth order
+    order = torch.sort((~occupied).to(torch.uint8), dim=1, stable=True).indices
+    k = int(counts.max().item())
+    order = order[:, :k]
+    valid = torch.arange(k, device=t.device).unsqueeze(0) < counts.unsqueeze(1)
+    return t.gather(1, order), delta.gather(1, order), valid
+
+
+def render_rays(model, ray_origins, ray_directions, hn=0, hf=0.5, nb_bins=192, occupancy=None, perturb=True):
+    """
+    Volume-renders a batch of rays against a white background.
+
+    With an occupancy grid, each ray's samples in empty cells are dropped
+    before anything else is computed for them: the remaining samples are
+    packed per ray, keep their original spacing (``delta``) and are
+    composited alone. Empty samples have zero density and leave the
+    transmittance unchanged, so the result is the same as evaluating them.
+
+    Parameters:
+        model (NGP): Radiance field.
+        ray_origins, ray_directions (torch.Tensor): (B, 3) rays.
+        hn, hf (float): Near and far bounds.
+        nb_bins (int): Samples drawn per ray.
+        occupancy (OccupancyGrid, optional): Samples in empty cells are skipped.
+        perturb (bool): Stratified jitter of the sample positions (training).
+
+    Returns:
+        torch.Tensor: (B, 3) colours.
+    """
+    device = ray_origins.device
+    batch = ray_origins.shape[0]
+    t = torch.linspace(hn, hf, nb_bins, device=device).expand(batch, nb_bins)
+    if perturb:
+        mid = (t[:, :-1] + t[:, 1:]) / 2.
+        lower = torch.cat((t[:, :1], mid), -1)
+        upper = torch.cat((mid, t[:, -1:]), -1)
+        t = lower + (upper - lower) * torch.rand(t.shape, device=device)
+    delta = torch.cat((t[:, 1:] - t[:, :-1], torch.full((batch, 1), 1e10, device=device)), -1)
+
+    if occupancy is not None:
+        occupied = occupancy.is_occupied(ray_origins.unsqueeze(1) + t.unsqueeze(2) * ray_directions.unsqueeze(1))
+        t, delta, valid = _compact_occupied(t, delta, occupied)
+    else:
+        valid = torch.ones_like(t, dtype=torch.bool)
+
+    x = ray_origins.unsqueeze(1) + t.unsqueeze(2) * ray_directions.unsqueeze(1)  # (B, samples, 3)
+    directions = ray_directions.unsqueeze(1).expand_as(x)
+
+    colors = torch.zeros_like(x)
+    sigma = torch.zeros(x.shape[:-1], device=device)
+    if valid.any():
+        colors[valid], sigma[valid] = model(x[valid], directions[valid])
+
+    alpha = 1 - torch.exp(-sigma * delta)
+    weights = compute_accumulated_transmittance(1 - alpha).unsqueeze(2) * alpha.unsqueeze(2)
+    c = (weights * colors).sum(dim=1)
+    weight_sum = weights.sum(-1).sum(-1)  # Regularization for white background
+    return c + 1 - weight_sum.unsqueeze(-1)
+
+
+@torch.no_grad()
+def render_image(model, ray_origins, ray_directions, height, width, hn=2, hf=6, nb_bins=192, occupancy=None,
+                 memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Renders one view in chunks sized by ``memory_budget``.
+
+    Parameters:
+        ray_origins, ray_directions (torch.Tensor): (height * width, 3) rays of the view.
+
+    Returns:
+        np.ndarray: (height, width, 3) uint8 image.
+    """
+    chunk = ray_batch_size(model, nb_bins, memory_budget, occupancy=occupancy)
+    device = next(model.parameters()).device
+    pixels = [
+        render_rays(model, ray_origins[i:i + chunk].to(device), ray_directions[i:i + chunk].to(device),
+                    hn=hn, hf=hf, nb_bins=nb_bins, occupancy=occupancy, perturb=False).cpu()
+        for i in range(0, ray_origins.shape[0], chunk)
+    ]
+    image = torch.cat(pixels).numpy().reshape(height, width, 3)
+    return (image.clip(0, 1) * 255.).astype(np.uint8)
+
+
+def train(model, optimizer, data_loader, hn=0, hf=1, nb_epochs=10, nb_bins=192, occupancy=None,
+          occupancy_interval=16, memory_budget=DEFAULT_MEMORY_BUDGET, device="cpu"):
+    """
+    Trains on batches of (origin, direction, colour) rays.
+
+    Each batch is split into micro-batches that fit ``memory_budget`` and the
+    gradients are accumulated, so the data loader's batch size no longer
+    dictates peak memory. The occupancy grid, if given, is refreshed every
+    ``occupancy_interval`` steps, and the micro-batches are resized to its
+    occupancy.
+
+    Returns:
+        List[float]: Mean loss per epoch.
+    """
+    micro_batch = ray_batch_size(model, nb_bins, memory_budget, training=True, occupancy=occupancy)
+    logging.info(f"NGP training with micro-batches of {micro_batch} rays")
+    history = []
+    step = 0
+    for epoch in range(nb_epochs):
+        total_loss = 0
+        for batch in tqdm(data_loader):
+            batch = batch.to(device, dtype=torch.float32)
+            optimizer.zero_grad()
+            batch_loss = 0.0
+            for i in range(0, batch.shape[0], micro_batch):
+                rays = batch[i:i + micro_batch]
+                pred_px_values = render_rays(model, rays[:, :3], rays[:, 3:6], hn=hn, hf=hf, nb_bins=nb_bins,
+                                             occupancy=occupancy)
+                # Sum of squared errors, normalised by the full batch size: matches a per-batch mean
+                loss = ((rays[:, 6:9] - pred_px_values) ** 2).sum() / (batch.shape[0] * 3)
+                loss.backward()
+                batch_loss += loss.item()
+            optimizer.step()
+            total_loss += batch_loss
+
+            step += 1
+            if occupancy is not None and step % occupancy_interval == 0:
+                occupancy.update(model)
+                # Fewer occupied samples per ray fit more rays in the budget
+                micro_batch = ray_batch_size(model, nb_bins, memory_budget, training=True, occupancy=occupancy)
+        history.append(total_loss / len(data_loader))
+        occupied = f", occupancy {occupancy.occupancy_ratio:.1%}" if occupancy is not None else ""
+        print(f"Epoch {epoch + 1}/{nb_epochs}, Loss: {history[-1]:.4f}{occupied}")
+    return history
@@ -0,0 +1,117 @@
+"""
+Point-cloud conditioning before surface reconstruction.
+
+``condition_point_cloud`` voxel-downsamples the cloud to the resolution the
+mesh can represent, runs a single k-nearest-neighbour query, and uses that one
+query for both statistical outlier removal and PCA normal estimation. Open3D's
+``remove_statistical_outlier`` and ``estimate_normals`` would each build their
+own search structure over the cloud.
+"""
+import time
+import logging
+
+import numpy as np
+import open3d as o3d
+
+# Voxel edge as a fraction of a Poisson octree cell at the target depth
+VOXEL_CELL_FRACTION = 0.5
+
+# Points per chunk for the vectorized PCA (bounds the (N, k, 3) neighbour gather)
+NORMALS_CHUNK = 65536
+
+
+def voxel_size_for(pcd, poisson_depth, fraction=VOXEL_CELL_FRACTION):
+    """Voxel edge matching the octree cell size of Poisson reconstruction at ``poisson_depth``."""
+    extent = np.max(pcd.get_max_bound() - pcd.get_min_bound())
+    return float(extent) / 2 ** poisson_depth * fraction
+
+
+def knn(points, k):
+    """
+    k nearest neighbours of every point, excluding the point itself.
+
+    Returns:
+        tuple: (indices (N, k) int64, distances (N, k) float64)
+    """
+    tensor = o3d.core.Tensor(points, dtype=o3d.core.float64)
+    search = o3d.core.nns.NearestNeighborSearch(tensor)
+    search.knn_index()
+    indices, squared = search.knn_search(tensor, k + 1)
+    return indices.numpy()[:, 1:].astype(np.int64), np.sqrt(squared.numpy()[:, 1:])
+
+
+def statistical_inliers(distances, std_ratio=2.0):
+    """Keeps points whose mean neighbour distance is within ``std_ratio`` deviations of the average."""
+    mean_distances = distances.mean(axis=1)
+    threshold = mean_distances.mean() + std_ratio * mean_distances.std()
+    return mean_distances <= threshold
+
+
+def pca_normals(points, indices):
+    """
+    Normals as the smallest-eigenvalue eigenvector of each neighbourhood's covariance.
+
+    Parameters:
+        points (np.ndarray): (N, 3) points the indices refer to.
+        indices (np.ndarray): (M, k) neighbour indices per output point.
+
+    Returns:
+        np.ndarray: (M, 3) unit normals.
+    """
+    normals = np.empty((len(indices), 3))
+    for start in range(0, len(indices), NORMALS_CHUNK):
+        neighbours = points[indices[start:start + NORMALS_CHUNK]]
+        centred = neighbours - neighbours.mean(axis=1, keepdims=True)
+        covariance = np.einsum("nki,nkj->nij", centred, centred)
+        _, eigenvectors = np.linalg.eigh(covariance)
+        normals[start:start + NORMALS_CHUNK] = eigenvectors[:, :, 0]
+    return normals
+
+
+def condition_point_cloud(pcd, poisson_depth, voxel_size=None, nb_neighbors=20, std_ratio=2.0,
+                          camera_location=(0.0, 0.0, 0.0)):
+    """
+    Downsamples, removes outliers and estimates oriented normals with one kNN query.
+
+    Parameters:
+        pcd (o3d.geometry.PointCloud): Coloured point cloud in camera space.
+        poisson_depth (int): Octree depth of the reconstruction that follows;
+            sets the default voxel size.
+        voxel_size (float, optional): Voxel edge; 0 disables downsampling.
+        nb_neighbors (int): Neighbours for outlier statistics and normals.
+        std_ratio (float): Outlier threshold in standard deviations.
+        camera_location (tuple): Normals are flipped to face this point.
+
+    Returns:
+        o3d.geometry.PointCloud: The conditioned cloud with normals.
+    """
+    start = time.perf_counter()
+    counts = [("input", len(pcd.points))]
+
+    if voxel_size is None:
+        voxel_size = voxel_size_for(pcd, poisson_depth)
+    if voxel_size:
+        pcd = pcd.voxel_down_sample(voxel_size)
+        counts.append((f"voxel {voxel_size:.4g}", len(pcd.points)))
+
+    points = np.asarray(pcd.points)
+    indices, distances = knn(points, nb_neighbors)
+    keep = statistical_inliers(distances, std_ratio)
+    counts.append(("outliers removed", int(keep.sum())))
+
+    # Neighbourhoods from the same query; outliers are rare enough not to skew the PCA
+    normals = pca_normals(points, indices[keep])
+    points = points[keep]
+    facing_away = np.einsum("ij,ij->i", normals, np.asarray(camera_location) - points) < 0
+    normals[facing_away] *= -1
+
+    conditioned = o3d.geometry.PointCloud()
+    conditioned.points = o3d.utility.Vector3dVector(points)
+    conditioned.normals = o3d.utility.Vector3dVector(normals)
+    if pcd.has_colors():
+        conditioned.colors = o3d.utility.Vector3dVector(np.asarray(pcd.colors)[keep])
+
+    logging.info("Point cloud conditioning: "
+                 + ", ".join(f"{step} {count}" for step, count in counts)
+                 + f" ({time.perf_counter() - start:.3f}s)")
+    return conditioned
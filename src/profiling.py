@@ -0,0 +1,201 @@
+"""
+Opt-in profiling of pipeline stages.
+
+Enable with the ``JAR_PROFILE`` environment variable or ``main.py --profile``:
+
+    cprofile  - deterministic cProfile, dumped as ``.pstats``
+    sampling  - low-overhead stack sampler, dumped as flamegraph-ready ``.collapsed``
+    torch     - PyTorch profiler for every stage
+
+Model forward passes (GLPN, SAM) are always profiled with the PyTorch profiler
+when profiling is on, producing a Chrome trace and collapsed stacks. Artifacts
+go to a ``profiles/`` directory next to the stage outputs, named after the job
+and stage.
+"""
+import os
+import sys
+import time
+import cProfile
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import Counter
+
+from src import tracing
+
+PROFILE_ENV_VAR = "JAR_PROFILE"
+PROFILERS = ("off", "cprofile", "sampling", "torch")
+
+_profiler = os.environ.get(PROFILE_ENV_VAR, "off").strip().lower() or "off"
+_output_dir = contextvars.ContextVar("jar_profile_dir", default="profiles")
+_active_profilers = contextvars.ContextVar("jar_active_profilers", default=frozenset())
+
+# cProfile (sys.monitoring on Python 3.12+) and the PyTorch profiler (Kineto)
+# allow one session per process, so stages running in parallel threads or
+# contexts must not start a second one; the stack sampler is per thread
+EXCLUSIVE_PROFILERS = ("cprofile", "torch")
+_running_profilers = Counter()
+_running_lock = threading.Lock()
+
+
+def set_profiler(name):
+    """Selects the profiler for the rest of the process (e.g. from a CLI flag)."""
+    global _profiler
+    name = (name or "off").lower()
+    if name not in PROFILERS:
+        raise ValueError(f"Unknown profiler: {name}. Choose from {PROFILERS}")
+    _profiler = name
+
+
+def get_profiler():
+    return _profiler
+
+
+def is_enabled():
+    return _profiler != "off"
+
+
+def _artifact_path(stage, output_dir, suffix):
+    profile_dir = os.path.join(output_dir, "profiles")
+    os.makedirs(profile_dir, exist_ok=True)
+    job_id = tracing.current_job_id() or "nojob"
+    return os.path.join(profile_dir, f"{job_id}_{stage}{suffix}")
+
+
+def _claim(kind):
+    """Registers a running profiler; False if ``kind`` allows one per process and one is running."""
+    with _running_lock:
+        if kind in EXCLUSIVE_PROFILERS and _running_profilers[kind]:
+            return False
+        _running_profilers[kind] += 1
+        return True
+
+
+def _release(kind):
+    with _running_lock:
+        _running_profilers[kind] -= 1
+
+
+class StackSampler:
+    """
+    Samples the Python stack of one thread at a fixed interval.
+
+    ``write_collapsed`` emits Brendan Gregg's collapsed format
+    (``frame;frame;frame count``), readable by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def _cprofile(stage, output_dir):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = _artifact_path(stage, output_dir, ".pstats")
+        profiler.dump_stats(path)
+        logging.info(f"cProfile for {stage} written to {path}")
+
+
+@contextmanager
+def _sampling(stage, output_dir):
+    sampler = StackSampler()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        path = _artifact_path(stage, output_dir, ".collapsed")
+        sampler.write_collapsed(path)
+        logging.info(f"Sampled stacks for {stage} written to {path}")
+
+
+@contextmanager
+def _torch_profile(stage, output_dir):
+    import torch
+    from torch.profiler import profile, ProfilerActivity
+
+    with profile(activities=[ProfilerActivity.CPU], record_shapes=True, with_stack=True) as prof:
+        yield
+    trace_path = _artifact_path(stage, output_dir, ".trace.json")
+    prof.export_chrome_trace(trace_path)
+    prof.export_stacks(_artifact_path(stage, output_dir, ".collapsed"), "self_cpu_time_total")
+    with open(_artifact_path(stage, output_dir, ".txt"), "w") as f:
+        f.write(prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=40))
+    logging.info(f"Torch profile for {stage} written to {trace_path} (torch {torch.__version__})")
+
+
+@contextmanager
+def profile_stage(stage, output_dir=None, torch_ops=False):
+    """
+    Profiles the enclosed block if profiling is enabled; otherwise does nothing.
+
+    Parameters:
+        stage (str): Stage name, used in the artifact file names.
+        output_dir (str, optional): Directory of the stage outputs; artifacts go
+            to its ``profiles/`` subdirectory. Defaults to the directory of the
+            enclosing ``profile_stage`` block.
+        torch_ops (bool): The block is a model forward pass; use the PyTorch
+            profiler regardless of the selected profiler.
+    """
+    if not is_enabled():
+        yield
+        return
+
+    kind = "torch" if torch_ops or _profiler == "torch" else _profiler
+    if kind in _active_profilers.get():
+        # An enclosing stage's profiler of the same kind already covers this block
+        yield
+        return
+    if not _claim(kind):
+        # A stage running concurrently (another thread or job) holds the process's only session
+        logging.info(f"Not profiling {stage}: a {kind} profiler is already running in this process")
+        yield
+        return
+    profiler = {"torch": _torch_profile, "sampling": _sampling, "cprofile": _cprofile}[kind]
+
+    output_dir = output_dir or _output_dir.get()
+    dir_token = _output_dir.set(output_dir)
+    active_token = _active_profilers.set(_active_profilers.get() | {kind})
+    start = time.perf_counter()
+    try:
+        with profiler(stage, output_dir):
+            yield
+    finally:
+        _active_profilers.reset(active_token)
+        _output_dir.reset(dir_token)
+        _release(kind)
+        logging.info(f"Profiled {stage} ({kind}) in {time.perf_counter() - start:.3f}s")
@@ -2,16 +2,19 @@ import os
 import cv2
 import numpy as np
 from ultralytics import SAM
-import matplotlib.pyplot as plt
 import argparse
 import logging
-
-# Use the same log file as main.py
-logging.basicConfig(
-    filename="application.log",  # Same log file as main.py
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+from src.image_processing_module.image_cache import load_image
+from src.sam_backend import sam_input
+from src.profiling import profile_stage
+
+def configure_logging():
+    """Log to the same file as main.py when run as a script."""
+    logging.basicConfig(
+        filename="application.log",  # Same log file as main.py
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
 
 def load_sam_model(model_path="sam2_s.pt"):
     """Load the SAM model."""
@@ -24,9 +27,34 @@ def load_sam_model(model_path="sam2_s.pt"):
         logging.error(f"Error loading SAM model: {e}")
         return None
 
-def segment_image(model, image_path, output_dir="segments"):
+def load_sam_session(model_path="sam2_s.pt"):
+    """
+    Load a SAM session that caches image embeddings, so re-prompting an image
+    only runs the mask decoder. Returns None on failure, like ``load_sam_model``.
+    """
+    from src.sam_backend import get_sam_session
+
+    try:
+        logging.info(f"Loading SAM session from path: {model_path}")
+        return get_sam_session(model_path)
+    except Exception as e:
+        logging.error(f"Error loading SAM session: {e}")
+        return None
+
+def _upscale_mask(mask, width, height):
+    """Resize a boolean mask to (width, height) with a smooth, thresholded edge."""
+    if mask.shape == (height, width):
+        return mask
+    resized = cv2.resize(mask.astype(np.uint8) * 255, (width, height), interpolation=cv2.INTER_LINEAR)
+    return resized > 127
+
+def segment_image(model, image_path, output_dir="segments", export_image_path=None):
     """
     Segment an image using SAM model and save individual segments.
+
+    If ``export_image_path`` is given (typically the full-resolution upload when
+    ``image_path`` was preprocessed at a reduced working resolution), the masks
+    are upscaled and the RGBA segments are cut out of that image instead.
     Returns:
         masks (List[np.ndarray]): List of mask arrays (bool)
         scores (List[float]): Confidence scores for each mask
@@ -34,14 +62,23 @@ def segment_image(model, image_path, output_dir="segments"):
     logging.info(f"Starting segmentation for image: {image_path}")
     os.makedirs(output_dir, exist_ok=True)
     
-    img_bgr = cv2.imread(image_path)
-    if img_bgr is None:
+    try:
+        img_rgb = load_image(image_path, mode="RGB")
+    except (FileNotFoundError, ValueError):
         logging.error(f"Error: Could not read image at {image_path}")
         return [], []
 
-    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
     h, w = img_rgb.shape[:2]
-    
+
+    export_rgb = img_rgb
+    if export_image_path is not None:
+        try:
+            export_rgb = load_image(export_image_path, mode="RGB")
+        except (FileNotFoundError, ValueError):
+            logging.warning(f"Could not read export image {export_image_path}, exporting at working resolution")
+    export_h, export_w = export_rgb.shape[:2]
+    export_bgra = cv2.cvtColor(export_rgb, cv2.COLOR_RGB2BGRA)
+
     # Create a grid of points across the image
     grid_size = 5
     x_points = np.linspace(0, w - 1, grid_size, dtype=int)
@@ -51,11 +88,12 @@ def segment_image(model, image_path, output_dir="segments"):
     point_labels = np.ones(len(point_coords))
 
     try:
-        results = model(
-            img_rgb,
-            points=point_coords.tolist(),
-            labels=point_labels.tolist()
-        )
+        with profile_stage("sam_forward", output_dir, torch_ops=True):
+            results = model(
+                sam_input(img_rgb),
+                points=point_coords.tolist(),
+                labels=point_labels.tolist()
+            )
 
         if not results or not results[0] or not results[0].masks:
             logging.warning("No segments found in the image")
@@ -68,8 +106,8 @@ def segment_image(model, image_path, output_dir="segments"):
         colors = [np.concatenate([np.random.random(3), [0.5]]) for _ in range(len(masks))]
 
         for i, (mask, score) in enumerate(zip(masks, scores)):
-            result_rgba = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2BGRA)
-            result_rgba[~mask] = [255, 255, 255, 0]
+            result_rgba = export_bgra.copy()
+            result_rgba[~_upscale_mask(mask, export_w, export_h)] = [255, 255, 255, 0]
             output_path = os.path.join(output_dir, f'segment_{i + 1}.png')
             cv2.imwrite(output_path, result_rgba)
 
@@ -79,13 +117,11 @@ def segment_image(model, image_path, output_dir="segments"):
 
             logging.info(f"Saved segment {i + 1} with confidence score: {score:.3f}")
 
+        # Blend with numpy/OpenCV: pyplot's global figure state is not safe in concurrent segment jobs
         composite_path = os.path.join(output_dir, 'composite.png')
-        plt.figure(figsize=(10, 10))
-        plt.imshow(img_rgb)
-        plt.imshow(composite_mask)
-        plt.axis('off')
-        plt.savefig(composite_path, bbox_inches='tight', pad_inches=0, dpi=300)
-        plt.close()
+        alpha = composite_mask[..., 3:]
+        composite = img_rgb.astype(np.float32) / 255.0 * (1 - alpha) + composite_mask[..., :3] * alpha
+        cv2.imwrite(composite_path, cv2.cvtColor((composite * 255).round().astype(np.uint8), cv2.COLOR_RGB2BGR))
         logging.info(f"Composite image saved at: {composite_path}")
 
         logging.info(f"Processing complete! Found {len(masks)} segments.")
@@ -103,6 +139,7 @@ def main():
     parser.add_argument("--model", "-m", default="sam2_s.pt", help="Path to SAM model (default: sam2_s.pt)")
     args = parser.parse_args()
 
+    configure_logging()
     logging.info("Starting SAM segmentation script")
     model = load_sam_model(args.model)
     if model is None:
@@ -119,6 +156,7 @@ if __name__ == "__main__":
     image_path = "image_processing_module/truck.jpg"  # Replace with your image path
     os.makedirs("PROCESSED_IMAGE", exist_ok=True)
     processed_dir = "PROCESSED_IMAGE"
+    configure_logging()
     logging.info("Running SAM API as standalone script")
     model = load_sam_model("sam2_s.pt")
     if model is None:
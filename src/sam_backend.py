@@ -0,0 +1,271 @@
+"""
+SAM segmentation backend that runs the image encoder once per image.
+
+``ultralytics.SAM`` re-encodes the image on every call, although only the
+point prompts change between calls on the same image. ``SamSession`` drives the
+ultralytics predictor directly: image embeddings are cached per image content
+hash, and prompting an image that is already cached runs only the prompt
+encoder and mask decoder.
+
+The image encoder can be dynamically quantized to int8 (``quantize=True`` or
+``JAR_SAM_INT8=1``); its Linear layers dominate encoder time on CPU.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src import tracing
+
+SAM_INT8_ENV_VAR = "JAR_SAM_INT8"
+DEFAULT_SAM_MODEL = "sam2_s.pt"
+
+# Upper bound on cached embeddings; one SAM2 image is roughly 16 MB of features
+DEFAULT_EMBEDDING_CACHE_BYTES = 256 * 2**20
+
+
+def image_key(image_array):
+    """Content hash of an image array (shape and pixels)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(image_array.shape).encode())
+    digest.update(np.ascontiguousarray(image_array).data)
+    return digest.hexdigest()
+
+
+def sam_input(rgb):
+    """
+    Converts an RGB array to the layout every ``SamSession`` caller passes.
+
+    ultralytics treats numpy inputs as OpenCV (BGR) images, and embeddings are
+    cached by ``image_key``, so all callers must hand the session the same
+    contiguous BGR array for the same image.
+    """
+    from src.image_processing_module.image_cache import as_bgr
+
+    return np.ascontiguousarray(as_bgr(rgb))
+
+
+def _features_nbytes(features):
+    if isinstance(features, dict):
+        return sum(_features_nbytes(value) for value in features.values())
+    if isinstance(features, (list, tuple)):
+        return sum(_features_nbytes(value) for value in features)
+    return features.element_size() * features.nelement()
+
+
+def _select(features, index):
+    """The ``index``-th image's slice of batched encoder features (copied, so the batch can be freed)."""
+    if isinstance(features, dict):
+        return {name: _select(value, index) for name, value in features.items()}
+    if isinstance(features, (list, tuple)):
+        return type(features)(_select(value, index) for value in features)
+    return features[index:index + 1].clone()
+
+
+class EmbeddingCache:
+    """Bounded LRU of image encoder outputs, keyed by ``image_key``."""
+
+    def __init__(self, max_bytes=DEFAULT_EMBEDDING_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, features):
+        nbytes = _features_nbytes(features)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (features, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+class SamSession:
+    """
+    A SAM/SAM2 predictor with per-image embedding reuse.
+
+    Calling a session has the same signature as calling ``ultralytics.SAM``
+    (``session(image, points=..., labels=...)``), so it can be passed to
+    ``sam2_api.segment_image`` in place of the model.
+    """
+
+    def __init__(self, model_path=DEFAULT_SAM_MODEL, imgsz=1024, quantize=False,
+                 max_cache_bytes=DEFAULT_EMBEDDING_CACHE_BYTES):
+        from ultralytics.models.sam import Predictor, SAM2Predictor
+
+        predictor_class = SAM2Predictor if "sam2" in os.path.basename(model_path) else Predictor
+        self.model_path = model_path
+        self.predictor = predictor_class(overrides=dict(
+            task="segment", mode="predict", model=model_path, imgsz=imgsz,
+            conf=0.25, save=False, verbose=False,
+        ))
+        self.predictor.setup_model(model=None, verbose=False)
+        self.quantized = quantize
+        if quantize:
+            self._quantize_encoder()
+        self.cache = EmbeddingCache(max_cache_bytes)
+        self.current_key = None
+        self._lock = threading.RLock()
+
+    def _quantize_encoder(self):
+        import torch
+
+        encoder = self.predictor.model.image_encoder
+        self.predictor.model.image_encoder = torch.ao.quantization.quantize_dynamic(
+            encoder, {torch.nn.Linear}, dtype=torch.qint8)
+        logging.info("SAM image encoder quantized to int8")
+
+    def set_image(self, image):
+        """
+        Makes ``image`` the current image, encoding it only on a cache miss.
+
+        Parameters:
+            image (np.ndarray): Image array as passed to the model.
+
+        Returns:
+            str: The image key.
+        """
+        key = image_key(image)
+        with self._lock:
+            if key == self.current_key:
+                return key
+            with tracing.span("sam_encoder", model=self.model_path, input_size=image.shape[:2]) as attrs:
+                features = self.cache.get(key)
+                attrs["cache_hit"] = features is not None
+                if features is None:
+                    self.predictor.reset_image()
+                    self.predictor.set_image(image)
+                    features = self.predictor.features
+                    self.cache.put(key, features)
+                else:
+                    self.predictor.features = features
+            self.current_key = key
+            return key
+
+    def encode_batch(self, images):
+        """
+        Encodes several images with one image encoder pass and caches their embeddings.
+
+        Images already in the cache are skipped; a later ``set_image`` or call
+        on any of them is then a cache hit.
+
+        Parameters:
+            images (List[np.ndarray]): Image arrays as passed to the model.
+
+        Returns:
+            List[str]: The image keys, in order.
+        """
+        import torch
+
+        keys = [image_key(image) for image in images]
+        with self._lock:
+            missing = {}
+            for key, image in zip(keys, images):
+                if key not in self.cache and key not in missing:
+                    missing[key] = image
+            if not missing:
+                return keys
+            with tracing.span("sam_encoder", model=self.model_path, batch_size=len(missing)) as attrs:
+                attrs["cache_hit"] = False
+                if getattr(self.predictor, "imgsz", None) is None:
+                    # set_image normally does this; preprocess letterboxes to imgsz
+                    self.predictor.setup_source(next(iter(missing.values())))
+                # The ultralytics pre-transform takes one image at a time; the encoder takes the batch
+                batch = torch.cat([self.predictor.preprocess([image]) for image in missing.values()])
+                for key, features in zip(missing, self._encode(batch)):
+                    self.cache.put(key, features)
+        return keys
+
+    def _encode(self, batch):
+        """
+        Runs the image encoder on a (B, 3, H, W) batch.
+
+        Returns:
+            list: Each image's features, in the layout ``predictor.features`` has after ``set_image``.
+        """
+        model = self.predictor.model
+        if not hasattr(model, "forward_image"):
+            # SAM: the encoder output is a (B, C, h, w) tensor
+            features = self.predictor.get_im_features(batch)
+            return [_select(features, index) for index in range(len(batch))]
+
+        # SAM2: get_im_features reshapes the backbone output to a batch of one,
+        # which folds a larger batch into the channels; split it per image first
+        imgsz = self.predictor.imgsz
+        if hasattr(model, "set_imgsz"):
+            model.set_imgsz(imgsz)
+        feat_sizes = [[x // (4 * i) for x in imgsz] for i in (1, 2, 4)]
+        self.predictor._bb_feat_sizes = feat_sizes
+        _, vision_feats, _, _ = model._prepare_backbone_features(model.forward_image(batch))
+        if model.directly_add_no_mem_embed:
+            vision_feats[-1] = vision_feats[-1] + model.no_mem_embed
+        per_image = []
+        for index in range(len(batch)):
+            # (HW, B, C) -> (1, C, H, W), copied so the batch can be freed
+            feats = [feat[:, index:index + 1].permute(1, 2, 0).reshape(1, -1, *size).clone()
+                     for feat, size in zip(vision_feats, feat_sizes)]
+            per_image.append({"image_embed": feats[-1], "high_res_feats": feats[:-1]})
+        return per_image
+
+    def __call__(self, image, points=None, labels=None, bboxes=None):
+        """
+        Runs the prompt decoder on ``image`` (encoding it first if needed).
+
+        Returns:
+            list: ultralytics ``Results``, as returned by ``ultralytics.SAM``.
+        """
+        with self._lock:
+            self.set_image(image)
+            start = time.perf_counter()
+            results = self.predictor(image, points=points, labels=labels, bboxes=bboxes)
+            logging.info(f"SAM prompt decoding took {(time.perf_counter() - start) * 1000:.1f} ms")
+            return results
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_sam_session(model_path=DEFAULT_SAM_MODEL, quantize=None):
+    """
+    Returns the process-wide session for ``model_path``, creating it once.
+
+    ``quantize`` defaults to the ``JAR_SAM_INT8`` environment variable.
+    """
+    if quantize is None:
+        quantize = os.environ.get(SAM_INT8_ENV_VAR, "0").strip().lower() in ("1", "true", "yes", "on")
+    key = (model_path, quantize)
+    with _sessions_lock:
+        if key not in _sessions:
+            logging.info(f"Loading SAM session from {model_path} ({'int8' if quantize else 'fp32'} encoder)")
+            _sessions[key] = SamSession(model_path, quantize=quantize)
+        return _sessions[key]
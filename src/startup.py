@@ -0,0 +1,132 @@
+"""
+Startup helpers: background prewarming of heavy modules and import-time reports.
+
+``main.py`` imports the heavy pipeline modules (OpenCV, ultralytics, torch,
+transformers, Open3D, trimesh) only when a button needs them.
+``prewarm`` imports them on a background thread once the window is up, so the
+first click usually finds them loaded without delaying the first paint.
+"""
+import os
+import re
+import sys
+import time
+import logging
+import importlib
+import threading
+import subprocess
+
+from src import tracing
+
+PREWARM_ENV_VAR = "JAR_PREWARM"
+
+# In the order the GUI needs them
+HEAVY_MODULES = (
+    "numpy",
+    "cv2",
+    "src.image_processing_module.preprocess",
+    "src.image_processing_module.edge_detection",
+    "src.sam2_api",
+    "src.build_3D_mesh",
+    "src.view_models",
+)
+
+# Wall-clock budget for `import main` in a fresh interpreter, in seconds
+STARTUP_BUDGET_S = 1.5
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def prewarm_enabled():
+    return os.environ.get(PREWARM_ENV_VAR, "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def prewarm(modules=HEAVY_MODULES):
+    """
+    Imports ``modules`` one by one, recording a trace span per module.
+
+    Import errors are logged and skipped; the GUI reports them properly when
+    the module is actually needed.
+    """
+    for name in modules:
+        if name in sys.modules:
+            continue
+        try:
+            with tracing.span("prewarm_import", sample_memory=False, module=name):
+                importlib.import_module(name)
+        except Exception as e:
+            logging.warning(f"Prewarm import of {name} failed: {e}")
+
+
+def start_prewarm(modules=HEAVY_MODULES):
+    """
+    Starts ``prewarm`` on a daemon thread.
+
+    Returns:
+        threading.Thread or None: The thread, or None if disabled via ``JAR_PREWARM=0``.
+    """
+    if not prewarm_enabled():
+        logging.info("Module prewarming disabled.")
+        return None
+    thread = threading.Thread(target=prewarm, args=(modules,), name="jar-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def parse_importtime(stderr):
+    """
+    Parses ``python -X importtime`` output.
+
+    Returns:
+        List[dict]: One entry per module with ``module``, ``self_us``,
+        ``cumulative_us`` and nesting ``depth``, in import order.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append({
+                "module": module,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": len(indent) // 2,
+            })
+    return entries
+
+
+def import_time_report(module="main", cwd=None, top=15):
+    """
+    Imports ``module`` in a fresh interpreter with ``-X importtime``.
+
+    Parameters:
+        module (str): Module to import.
+        cwd (str, optional): Working directory (the repository root for ``main``).
+        top (int): Number of slowest top-level imports to return.
+
+    Returns:
+        dict: ``wall_s`` for the whole interpreter run, ``total_import_us`` and
+        the ``top`` slowest top-level imports by cumulative time.
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    wall_s = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {completed.stderr.strip().splitlines()[-1:]}")
+
+    entries = parse_importtime(completed.stderr)
+    top_level = [entry for entry in entries if entry["depth"] == 0]
+    return {
+        "wall_s": wall_s,
+        "total_import_us": sum(entry["cumulative_us"] for entry in top_level),
+        "slowest": sorted(top_level, key=lambda entry: entry["cumulative_us"], reverse=True)[:top],
+    }
+
+
+if __name__ == "__main__":
+    report = import_time_report(cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    print(f"import main: {report['wall_s']:.3f}s wall (budget {STARTUP_BUDGET_S:.1f}s)")
+    for entry in report["slowest"]:
+        print(f"{entry['cumulative_us'] / 1000:9.1f} ms  {entry['module']}")
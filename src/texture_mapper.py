@@ -8,6 +8,8 @@ import pywavefront
 from PIL import Image
 import numpy as np
 from OpenGL.arrays import ArrayDatatype
+import os
+from src.profiling import profile_stage
 
 def load_texture(image_path):
     """
@@ -28,7 +30,47 @@ def load_texture(image_path):
     texture_data = pygame.image.tostring(texture_surface, 'RGB', 1)
     width = texture_surface.get_width()
     height = texture_surface.get_height()
+    return upload_texture(texture_data, width, height)
 
+
+def load_material_texture(material_name, resolution=1024, library=None):
+    """
+    Bind a material's basecolor from the local material library.
+
+    The map is read at a stored resolution from the memory-mapped shards, so
+    nothing is decoded or resized here.
+
+    Args:
+        material_name (str): Name in the ``MaterialLibrary``.
+        resolution (int): Requested resolution (the nearest stored one at least this large is used).
+        library (MaterialLibrary, optional): Defaults to the shared cache directory.
+
+    Returns:
+        int: OpenGL texture ID.
+    """
+    from src.materials import MaterialLibrary
+
+    if not pygame.display.get_init():
+        raise RuntimeError("OpenGL context is not initialized. Ensure this function is called after pygame.display.set_mode().")
+    basecolor = (library or MaterialLibrary()).get(material_name, "basecolor", resolution)
+    # OpenGL expects the bottom row first, as pygame.image.tostring(..., 1) produces
+    texture_data = np.ascontiguousarray(basecolor[::-1]).tobytes()
+    return upload_texture(texture_data, basecolor.shape[1], basecolor.shape[0])
+
+
+def upload_texture(texture_data, width, height):
+    """
+    Upload RGB bytes as a mipmapped, repeating OpenGL texture.
+
+    Args:
+        texture_data (bytes): Tightly packed RGB rows, bottom row first.
+        width (int): Width in pixels.
+        height (int): Height in pixels.
+
+    Returns:
+        int: OpenGL texture ID.
+    """
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
     texture_id = glGenTextures(1)
     glBindTexture(GL_TEXTURE_2D, texture_id)
     
@@ -81,7 +123,43 @@ def calculate_uv_mapping(vertex, normal):
     
     return u, v
 
-def render_textured_mesh(mesh_path, texture_path):
+def compute_frame_vertices(scene):
+    """
+    Compute the normal, texture coordinate and position of every drawn vertex.
+
+    ``render_textured_mesh`` computes this once per loaded mesh and reuses it
+    every frame; it has no OpenGL dependency so it can be benchmarked headless.
+
+    Args:
+        scene (pywavefront.Wavefront): Loaded scene.
+
+    Returns:
+        list: One list per mesh of (normal, (u, v), vertex) tuples.
+    """
+    frame = []
+    for mesh in scene.mesh_list:
+        mesh_vertices = []
+        for face_idx, face in enumerate(mesh.faces):
+            # Get vertices and calculate face properties
+            vertices = [np.array(scene.vertices[i]) for i in face]
+            v1, v2, v3 = vertices[:3]
+            
+            # Calculate face normal
+            normal = np.cross(v2 - v1, v3 - v1)
+            normal = normal / np.linalg.norm(normal)
+            
+            for i, vertex_i in enumerate(face):
+                # Get or generate texture coordinates
+                if hasattr(mesh, 'tex_coords') and mesh.tex_coords and len(mesh.tex_coords) > vertex_i:
+                    u, v = mesh.tex_coords[vertex_i]
+                else:
+                    # Generate UVs using spherical mapping
+                    u, v = calculate_uv_mapping(scene.vertices[vertex_i], normal)
+                mesh_vertices.append((normal, (u, v), scene.vertices[vertex_i]))
+        frame.append(mesh_vertices)
+    return frame
+
+def render_textured_mesh(mesh_path, texture_path=None, material=None, material_resolution=1024):
     # Count total triangles first
     scene = pywavefront.Wavefront(mesh_path, collect_faces=True, create_materials=True, strict=False)
     total_triangles = sum(len(mesh.faces) for mesh in scene.mesh_list)
@@ -122,8 +200,11 @@ def render_textured_mesh(mesh_path, texture_path):
     # Load the mesh
     scene = pywavefront.Wavefront(mesh_path, collect_faces=True, create_materials=True, strict=False)
     
-    # Load and set up texture
-    texture_id = load_texture(texture_path)
+    # Load and set up texture (an image file, or a material from the local library)
+    if material is not None:
+        texture_id = load_material_texture(material, material_resolution)
+    else:
+        texture_id = load_texture(texture_path)
     
     # Set up perspective
     glMatrixMode(GL_PROJECTION)
@@ -144,6 +225,9 @@ def render_textured_mesh(mesh_path, texture_path):
             all_vertices.extend(vertices)
     
     center, scale = normalize_mesh(all_vertices)
+
+    # Vertex data is static; build it once instead of on every frame
+    frame_vertices = compute_frame_vertices(scene)
     
     # Initial position and zoom
     zoom = -3.0
@@ -168,68 +252,54 @@ def render_textured_mesh(mesh_path, texture_path):
         glBindTexture(GL_TEXTURE_2D, texture_id)
         glColor4f(1.0, 1.0, 1.0, 1.0)
         
-        for mesh in scene.mesh_list:
+        for mesh_vertices in frame_vertices:
             glBegin(GL_TRIANGLES)
-            for face_idx, face in enumerate(mesh.faces):
-                # Get vertices and calculate face properties
-                vertices = [np.array(scene.vertices[i]) for i in face]
-                v1, v2, v3 = vertices[:3]
-                
-                # Calculate face normal
-                normal = np.cross(v2 - v1, v3 - v1)
-                normal = normal / np.linalg.norm(normal)
-                
-                for i, vertex_i in enumerate(face):
-                    # Set normal
-                    glNormal3f(*normal)
-                    
-                    # Get or generate texture coordinates
-                    if hasattr(mesh, 'tex_coords') and mesh.tex_coords and len(mesh.tex_coords) > vertex_i:
-                        u, v = mesh.tex_coords[vertex_i]
-                    else:
-                        # Generate UVs using spherical mapping
-                        u, v = calculate_uv_mapping(scene.vertices[vertex_i], normal)
-                    
-                    # Apply texture coordinates with proper wrapping
-                    glTexCoord2f(u, 1.0 - v)
-                    
-                    # Set vertex
-                    glVertex3f(*scene.vertices[vertex_i])
+            for normal, (u, v), vertex in mesh_vertices:
+                # Set normal
+                glNormal3f(*normal)
+
+                # Apply texture coordinates with proper wrapping
+                glTexCoord2f(u, 1.0 - v)
+
+                # Set vertex
+                glVertex3f(*vertex)
             glEnd()
         
         glPopMatrix()
     
     clock = pygame.time.Clock()
     running = True
-    while running:
-        clock.tick(60)
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                running = False
-            elif event.type == KEYDOWN:
-                if event.key == K_LEFT:
-                    rotation_y -= 5
-                elif event.key == K_RIGHT:
-                    rotation_y += 5
-                elif event.key == K_UP:
-                    rotation_x -= 5
-                elif event.key == K_DOWN:
-                    rotation_x += 5
-                elif event.key == K_z:  # Zoom in
-                    zoom = min(zoom + zoom_speed, max_zoom)
-                elif event.key == K_x:  # Zoom out
-                    zoom = max(zoom - zoom_speed, min_zoom)
-            elif event.type == MOUSEBUTTONDOWN:
-                if event.button == 4:  # Mouse wheel up
-                    zoom = min(zoom + zoom_speed, max_zoom)
-                elif event.button == 5:  # Mouse wheel down
-                    zoom = max(zoom - zoom_speed, min_zoom)
+    # One profile for the whole interactive session (opt-in via JAR_PROFILE)
+    with profile_stage("render_loop", os.path.dirname(os.path.abspath(mesh_path))):
+        while running:
+            clock.tick(60)
+            for event in pygame.event.get():
+                if event.type == QUIT:
+                    running = False
+                elif event.type == KEYDOWN:
+                    if event.key == K_LEFT:
+                        rotation_y -= 5
+                    elif event.key == K_RIGHT:
+                        rotation_y += 5
+                    elif event.key == K_UP:
+                        rotation_x -= 5
+                    elif event.key == K_DOWN:
+                        rotation_x += 5
+                    elif event.key == K_z:  # Zoom in
+                        zoom = min(zoom + zoom_speed, max_zoom)
+                    elif event.key == K_x:  # Zoom out
+                        zoom = max(zoom - zoom_speed, min_zoom)
+                elif event.type == MOUSEBUTTONDOWN:
+                    if event.button == 4:  # Mouse wheel up
+                        zoom = min(zoom + zoom_speed, max_zoom)
+                    elif event.button == 5:  # Mouse wheel down
+                        zoom = max(zoom - zoom_speed, min_zoom)
         
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glLoadIdentity()
-        glTranslatef(0.0, 0.0, zoom)
-        Model()
-        pygame.display.flip()
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            glLoadIdentity()
+            glTranslatef(0.0, 0.0, zoom)
+            Model()
+            pygame.display.flip()
     
     pygame.quit()
 
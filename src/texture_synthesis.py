@@ -0,0 +1,217 @@
+"""
+Tiled, seamless texture synthesis with bounded memory.
+
+A tile source produces fixed-size tiles for any (row, col) in an infinite
+grid, deterministically from a seed, so any part of the texture can be
+regenerated independently. ``synthesize`` walks the requested area row by
+row, feather-blends every tile into its top and left neighbours across an
+overlap band, and hands finished blocks to a sink as soon as they are done.
+
+Working memory is one tile plus one overlap band across the texture width,
+whatever the texture height. Sinks stream blocks to a tile directory, a
+disk-backed ``.npy`` memory map or an OpenGL texture.
+
+Tile sources:
+    ExemplarTiles  - patches of an exemplar image (CPU, no model)
+    LatentTiles    - a generator network (e.g. the Infinite Texture GAN) fed a latent per tile
+"""
+import os
+import logging
+
+import numpy as np
+from PIL import Image
+
+TILE_SIZE = 256
+OVERLAP = 32
+
+
+def _tile_seed(seed, row, col):
+    """Stable per-tile seed, independent of generation order."""
+    return np.random.SeedSequence([seed, row & 0xFFFFFFFF, col & 0xFFFFFFFF]).generate_state(1)[0]
+
+
+class ExemplarTiles:
+    """
+    Tiles cut from random positions of an exemplar (wrapping around its edges).
+
+    Parameters:
+        exemplar (np.ndarray or str): (H, W, C) uint8 image or a path.
+        seed (int): Base seed.
+    """
+
+    def __init__(self, exemplar, seed=0):
+        if isinstance(exemplar, str):
+            with Image.open(exemplar) as image:
+                exemplar = np.asarray(image.convert("RGB"))
+        self.exemplar = np.asarray(exemplar, dtype=np.uint8)
+        self.channels = self.exemplar.shape[2]
+        self.seed = seed
+
+    def tile(self, row, col, size):
+        height, width = self.exemplar.shape[:2]
+        rng = np.random.default_rng(_tile_seed(self.seed, row, col))
+        top, left = rng.integers(0, height), rng.integers(0, width)
+        rows = np.arange(top, top + size) % height
+        cols = np.arange(left, left + size) % width
+        return self.exemplar[rows[:, None], cols[None, :]]
+
+
+class LatentTiles:
+    """
+    Tiles from a generator network, one latent per tile.
+
+    Parameters:
+        generator (callable): Maps a (1, *latent_shape) tensor to a (1, C, H, W)
+            tensor in [-1, 1] with H, W at least the requested tile size.
+        latent_shape (tuple): Shape of one latent.
+        channels (int): Output channels.
+        seed (int): Base seed.
+        device (str): Device of the generator.
+    """
+
+    def __init__(self, generator, latent_shape, channels=3, seed=0, device="cpu"):
+        self.generator = generator
+        self.latent_shape = tuple(latent_shape)
+        self.channels = channels
+        self.seed = seed
+        self.device = device
+
+    def tile(self, row, col, size):
+        import torch
+
+        rng = torch.Generator().manual_seed(int(_tile_seed(self.seed, row, col)))
+        latent = torch.randn((1,) + self.latent_shape, generator=rng).to(self.device)
+        with torch.inference_mode():
+            output = self.generator(latent)[0, :, :size, :size]
+        output = ((output.clamp(-1, 1) + 1) * 127.5).round().byte()
+        return output.permute(1, 2, 0).cpu().numpy()
+
+
+def _ramp(length):
+    """Blend weights of the new tile across an overlap band (0 -> 1)."""
+    return (np.arange(length, dtype=np.float32) + 0.5) / length
+
+
+def synthesize(source, width, height, sink, tile_size=TILE_SIZE, overlap=OVERLAP, origin=(0, 0)):
+    """
+    Generates a ``width`` x ``height`` texture tile by tile into ``sink``.
+
+    Parameters:
+        source: Tile source with ``tile(row, col, size)`` and ``channels``.
+        width, height (int): Output size in pixels.
+        sink (callable): Called as ``sink(x, y, block)`` with each finished
+            (h, w, C) uint8 block, in row-major order.
+        tile_size (int): Output pixels per tile and axis.
+        overlap (int): Blend band between neighbouring tiles.
+        origin (tuple): (row, col) of the first tile in the infinite grid, so
+            separate calls draw different tiles. Seams are only blended
+            within one call; areas from separate calls are not blended
+            where they meet.
+    """
+    if overlap >= tile_size:
+        raise ValueError("overlap must be smaller than tile_size")
+    rows = -(-height // tile_size)
+    cols = -(-width // tile_size)
+    size = tile_size + overlap
+    ramp = _ramp(overlap)
+
+    # Extra bottom rows of the previous tile row, per column: the only state kept across rows
+    bottom_strips = [None] * cols
+    for row in range(rows):
+        right_strip = None
+        for col in range(cols):
+            tile = source.tile(origin[0] + row, origin[1] + col, size).astype(np.float32)
+            if bottom_strips[col] is not None:
+                tile[:overlap] = bottom_strips[col] * (1 - ramp[:, None, None]) + tile[:overlap] * ramp[:, None, None]
+            if right_strip is not None:
+                tile[:, :overlap] = right_strip * (1 - ramp[None, :, None]) + tile[:, :overlap] * ramp[None, :, None]
+
+            right_strip = tile[:, tile_size:]
+            bottom_strips[col] = tile[tile_size:]
+
+            block_height = min(tile_size, height - row * tile_size)
+            block_width = min(tile_size, width - col * tile_size)
+            block = np.clip(np.rint(tile[:block_height, :block_width]), 0, 255).astype(np.uint8)
+            sink(col * tile_size, row * tile_size, block)
+
+
+class TileDirectorySink:
+    """Writes each block as ``<directory>/tile_<y>_<x>.png``."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, x, y, block):
+        Image.fromarray(block.squeeze()).save(os.path.join(self.directory, f"tile_{y}_{x}.png"))
+
+
+class MemmapSink:
+    """Writes blocks into a disk-backed (height, width, C) uint8 ``.npy`` memory map."""
+
+    def __init__(self, path, width, height, channels=3):
+        self.array = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(height, width, channels))
+
+    def __call__(self, x, y, block):
+        self.array[y:y + block.shape[0], x:x + block.shape[1]] = block
+
+    def close(self):
+        self.array.flush()
+
+
+class GLTextureSink:
+    """
+    Uploads blocks into an existing OpenGL texture with ``glTexSubImage2D``.
+
+    The texture must be allocated at the full size (e.g. ``glTexImage2D`` with
+    no data) and bound in the current context. Rows are flipped to OpenGL's
+    bottom-up convention.
+    """
+
+    def __init__(self, texture_id, height):
+        self.texture_id = texture_id
+        self.height = height
+
+    def __call__(self, x, y, block):
+        from OpenGL.GL import (glBindTexture, glPixelStorei, glTexSubImage2D, GL_TEXTURE_2D, GL_UNPACK_ALIGNMENT,
+                               GL_RGB, GL_UNSIGNED_BYTE)
+
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        data = np.ascontiguousarray(block[::-1])
+        glTexSubImage2D(GL_TEXTURE_2D, 0, x, self.height - y - block.shape[0], block.shape[1], block.shape[0],
+                        GL_RGB, GL_UNSIGNED_BYTE, data)
+
+
+def synthesize_from_exemplar(exemplar_path, output_path, width, height, tile_size=TILE_SIZE, overlap=OVERLAP,
+                             seed=0):
+    """
+    Synthesizes a texture from an exemplar image to disk.
+
+    ``output_path`` ending in ``.npy`` gets one memory-mapped array; anything
+    else is treated as a directory of tiles.
+    """
+    source = ExemplarTiles(exemplar_path, seed)
+    if output_path.endswith(".npy"):
+        sink = MemmapSink(output_path, width, height, source.channels)
+        synthesize(source, width, height, sink, tile_size, overlap)
+        sink.close()
+    else:
+        synthesize(source, width, height, TileDirectorySink(output_path), tile_size, overlap)
+    logging.info(f"Synthesized {width}x{height} texture from {exemplar_path} into {output_path}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Synthesize a large seamless texture from an exemplar")
+    parser.add_argument("exemplar")
+    parser.add_argument("output", help="A .npy file or a tile directory")
+    parser.add_argument("--width", type=int, default=4096)
+    parser.add_argument("--height", type=int, default=4096)
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE)
+    parser.add_argument("--overlap", type=int, default=OVERLAP)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    synthesize_from_exemplar(args.exemplar, args.output, args.width, args.height, args.tile_size, args.overlap,
+                             args.seed)
@@ -0,0 +1,139 @@
+import logging
+
+from PyQt5.QtWidgets import QListView, QAbstractItemView
+from PyQt5.QtGui import QStandardItemModel, QStandardItem, QPixmap, QIcon
+from PyQt5.QtCore import Qt, QSize, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+from src.thumbnails import make_thumbnail, THUMBNAIL_SIZE
+
+PATH_ROLE = Qt.UserRole + 1
+
+
+class _ThumbnailSignals(QObject):
+    finished = pyqtSignal(int, str, str)  # generation, image path, thumbnail path
+    failed = pyqtSignal(int, str, str)  # generation, image path, message
+
+
+class _ThumbnailTask(QRunnable):
+    """Creates one cached thumbnail on a pool thread."""
+
+    def __init__(self, generation, image_path, size, signals):
+        super().__init__()
+        self.generation = generation
+        self.image_path = image_path
+        self.size = size
+        self.signals = signals
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self.generation, self.image_path, make_thumbnail(self.image_path, self.size))
+        except Exception as e:
+            self.signals.failed.emit(self.generation, self.image_path, str(e))
+
+
+class ThumbnailGrid(QListView):
+    """
+    Virtualized icon grid that only builds thumbnails for items in view.
+
+    Items start with a caption only. Whenever the view scrolls or resizes, the
+    visible rows without an icon are sent to a background thread pool, which
+    writes small PNGs to the on-disk thumbnail cache; the GUI thread then loads
+    just those small files. The GUI never holds full-resolution pixmaps; a
+    pool thread decodes a source image once, when its thumbnail is first
+    cached (at full resolution for PNG segments, reduced for JPEG).
+
+    Results are matched to items by image path and by the generation of
+    ``set_images`` that requested them, so a thumbnail finishing after the
+    grid was refilled is dropped instead of painting another item.
+    """
+
+    image_selected = pyqtSignal(str)
+    selection_changed = pyqtSignal(list)
+
+    def __init__(self, size=THUMBNAIL_SIZE, parent=None):
+        super().__init__(parent)
+        self.thumbnail_size = size
+        self._pending = set()
+        self._generation = 0
+        self._rows = {}  # image path -> rows showing it
+        self._pool = QThreadPool(self)
+        self._signals = _ThumbnailSignals()
+        self._signals.finished.connect(self._on_thumbnail_ready)
+        self._signals.failed.connect(self._on_thumbnail_failed)
+
+        self._model = QStandardItemModel(self)
+        self.setModel(self._model)
+        self.setViewMode(QListView.IconMode)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setIconSize(QSize(size, size))
+        self.setGridSize(QSize(size + 20, size + 40))
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setStyleSheet("color: white; font-size: 12px;")
+
+        # Coalesce bursts of scroll events into one visibility pass
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(30)
+        self._refresh_timer.timeout.connect(self._request_visible)
+        self.verticalScrollBar().valueChanged.connect(self._refresh_timer.start)
+        self.clicked.connect(lambda index: self.image_selected.emit(index.data(PATH_ROLE)))
+        self.selectionModel().selectionChanged.connect(lambda *_: self.selection_changed.emit(self.selected_paths()))
+
+    def set_images(self, images):
+        """
+        Replaces the grid content.
+
+        Parameters:
+            images (List[Tuple[str, str]]): (caption, image_path) pairs.
+        """
+        self._model.clear()
+        self._pending.clear()
+        self._rows = {}
+        self._generation += 1
+        for caption, image_path in images:
+            item = QStandardItem(caption)
+            item.setData(image_path, PATH_ROLE)
+            item.setTextAlignment(Qt.AlignCenter)
+            self._rows.setdefault(image_path, []).append(self._model.rowCount())
+            self._model.appendRow(item)
+        self._refresh_timer.start()
+
+    def selected_paths(self):
+        """Returns the image paths of the selected items."""
+        return [index.data(PATH_ROLE) for index in self.selectionModel().selectedIndexes()]
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._refresh_timer.start()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._refresh_timer.start()
+
+    def _request_visible(self):
+        viewport_rect = self.viewport().rect()
+        for row in range(self._model.rowCount()):
+            item = self._model.item(row)
+            image_path = item.data(PATH_ROLE)
+            if image_path in self._pending or not item.icon().isNull():
+                continue
+            if not self.visualRect(item.index()).intersects(viewport_rect):
+                continue
+            self._pending.add(image_path)
+            self._pool.start(_ThumbnailTask(self._generation, image_path, self.thumbnail_size, self._signals))
+
+    def _on_thumbnail_ready(self, generation, image_path, thumb_path):
+        if generation != self._generation:
+            return  # Requested for content that has since been replaced
+        self._pending.discard(image_path)
+        icon = QIcon(QPixmap(thumb_path))
+        for row in self._rows.get(image_path, ()):
+            self._model.item(row).setIcon(icon)
+
+    def _on_thumbnail_failed(self, generation, image_path, message):
+        if generation == self._generation:
+            self._pending.discard(image_path)
+        logging.error(f"Thumbnail failed for {image_path}: {message}")
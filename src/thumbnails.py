@@ -0,0 +1,55 @@
+import os
+import hashlib
+import logging
+import threading
+
+from PIL import Image
+
+# On-disk cache of small previews, shared across runs
+THUMBNAIL_CACHE_DIR = os.path.join(".cache", "thumbnails")
+THUMBNAIL_SIZE = 200
+
+
+def thumbnail_cache_path(image_path, size=THUMBNAIL_SIZE, cache_dir=THUMBNAIL_CACHE_DIR):
+    """
+    Returns where the thumbnail of ``image_path`` is cached.
+
+    The name hashes the absolute path, modification time and file size, so a
+    regenerated ``segment_N.png`` never reuses a stale thumbnail.
+    """
+    stat = os.stat(image_path)
+    key = f"{os.path.abspath(image_path)}:{stat.st_mtime_ns}:{stat.st_size}:{size}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.png")
+
+
+def make_thumbnail(image_path, size=THUMBNAIL_SIZE, cache_dir=THUMBNAIL_CACHE_DIR):
+    """
+    Creates (or reuses) a cached thumbnail no larger than ``size`` x ``size``.
+
+    JPEG sources are decoded at reduced scale via ``Image.draft``; other formats
+    (e.g. the PNG segments) have no reduced decode and are decoded in full,
+    then released once the thumbnail is written. Safe to call from worker threads.
+
+    Parameters:
+        image_path (str): Path to the source image.
+        size (int): Maximum thumbnail edge in pixels.
+        cache_dir (str): Directory holding cached thumbnails.
+
+    Returns:
+        str: Path to the thumbnail PNG.
+    """
+    thumb_path = thumbnail_cache_path(image_path, size, cache_dir)
+    if os.path.exists(thumb_path):
+        return thumb_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with Image.open(image_path) as image:
+        image.draft(image.mode, (size, size))
+        image.thumbnail((size, size))
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = f"{thumb_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, format="PNG")
+    os.replace(tmp_path, thumb_path)
+    logging.info(f"Thumbnail created for {image_path}: {thumb_path}")
+    return thumb_path
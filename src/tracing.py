@@ -0,0 +1,314 @@
+"""
+Structured per-stage tracing and metrics.
+
+``span`` wraps a pipeline stage and emits one JSON line per finished span to
+``TRACE_FILE`` (duration, status, peak RSS, job id and any attributes the stage
+adds such as input size, model or cache hit). Every span also feeds the
+in-process ``MetricsRegistry``, which can be exported in Prometheus text format.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+TRACE_FILE = "application.trace.jsonl"
+
+# Histogram buckets for stage durations, in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_job = contextvars.ContextVar("jar_job_id", default=None)
+_current_span = contextvars.ContextVar("jar_span_id", default=None)
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PeakRssSampler:
+    """Samples RSS on a background thread while a block runs; ``peak`` holds the maximum seen."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and histograms keyed by name and labels.
+
+    Histograms use the duration buckets unless ``observe`` is given others.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        with self._lock:
+            key = self._key(name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, buckets=None, **labels):
+        with self._lock:
+            key = self._key(name, labels)
+            buckets = buckets or self.buckets
+            histogram = self._histograms.setdefault(
+                key, {"buckets": tuple(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def snapshot(self):
+        """Returns a copy of all metrics as plain dicts."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": {key: {"buckets": h["buckets"], "counts": list(h["counts"]), "sum": h["sum"],
+                                     "count": h["count"]}
+                               for key, h in self._histograms.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def prometheus_text(registry=None):
+    """
+    Renders the registry in the Prometheus text exposition format.
+
+    Parameters:
+        registry (MetricsRegistry, optional): Defaults to the process-wide registry.
+
+    Returns:
+        str: Exposition text.
+    """
+    snapshot = (registry or metrics).snapshot()
+    lines = []
+
+    def by_name(items):
+        grouped = {}
+        for (name, labels), value in items:
+            grouped.setdefault(name, []).append((labels, value))
+        return sorted(grouped.items())
+
+    for name, series in by_name(snapshot["counters"].items()):
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in series)
+    for name, series in by_name(snapshot["gauges"].items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in series)
+    for name, series in by_name(snapshot["histograms"].items()):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in series:
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class JsonLinesWriter:
+    """Appends one JSON object per line to a file; safe to share between threads."""
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+metrics = MetricsRegistry()
+trace_writer = JsonLinesWriter()
+
+
+def new_job_id():
+    return uuid.uuid4().hex[:12]
+
+
+def current_job_id():
+    """Returns the id of the enclosing ``job`` block, or None."""
+    return _current_job.get()
+
+
+@contextmanager
+def job(job_id=None):
+    """
+    Marks every span opened inside the block as part of one job.
+
+    Yields:
+        str: The job id.
+    """
+    job_id = job_id or new_job_id()
+    token = _current_job.set(job_id)
+    try:
+        yield job_id
+    finally:
+        _current_job.reset(token)
+
+
+@contextmanager
+def span(stage, sample_memory=True, **attributes):
+    """
+    Times a pipeline stage and records it as a trace span and as metrics.
+
+    The yielded dict can be filled with extra attributes while the stage runs,
+    e.g. ``attrs["cache_hit"] = True``.
+
+    Parameters:
+        stage (str): Stage name, e.g. "preprocess" or "segment".
+        sample_memory (bool): Track the peak RSS during the stage.
+        **attributes: Initial attributes (input size, model name, ...).
+
+    Yields:
+        dict: Mutable span attributes.
+    """
+    span_id = uuid.uuid4().hex[:8]
+    record = {
+        "stage": stage,
+        "span_id": span_id,
+        "parent_id": _current_span.get(),
+        "job_id": _current_job.get(),
+        "start": time.time(),
+    }
+    attrs = dict(attributes)
+    token = _current_span.set(span_id)
+    sampler = PeakRssSampler() if sample_memory else None
+    if sampler:
+        sampler.__enter__()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    status = "ok"
+    try:
+        yield attrs
+    except Exception as e:
+        status = "error"
+        attrs["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        if sampler:
+            sampler.__exit__(None, None, None)
+        _current_span.reset(token)
+        record.update(attrs)
+        record.update({
+            "duration_s": round(duration, 6),
+            "cpu_s": round(time.process_time() - cpu_start, 6),
+            "status": status,
+            "peak_rss_bytes": sampler.peak if sampler else None,
+        })
+
+        metrics.increment("jar_stage_runs_total", stage=stage, status=status)
+        metrics.observe("jar_stage_duration_seconds", duration, stage=stage)
+        if record["peak_rss_bytes"] is not None:
+            metrics.set_gauge("jar_stage_peak_rss_bytes", record["peak_rss_bytes"], stage=stage)
+        if "cache_hit" in attrs:
+            metrics.increment("jar_cache_lookups_total", stage=stage, hit=bool(attrs["cache_hit"]))
+        try:
+            trace_writer.write(record)
+        except OSError as e:
+            logging.error(f"Could not write trace record: {e}")
+
+
+class TraceTail:
+    """Reads trace records appended since the last call, without re-reading the file."""
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self.offset = 0
+        self._partial = ""
+
+    def read_new(self):
+        """
+        Returns:
+            List[dict]: Records written since the previous call.
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        if size < self.offset:  # File was truncated or rotated
+            self.offset = 0
+            self._partial = ""
+        with open(self.path, "r", encoding="utf-8") as f:
+            f.seek(self.offset)
+            data = f.read()
+            self.offset = f.tell()
+
+        lines = (self._partial + data).split("\n")
+        self._partial = lines.pop()  # Incomplete last line, if any
+        records = []
+        for line in lines:
+            if line.strip():
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping malformed trace line: {line[:80]}")
+        return records
@@ -0,0 +1,80 @@
+import os
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("PIL")
+pytest.importorskip("ultralytics")
+
+from src import job_server, sam2_api
+
+
+class FakeArray:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class FakeResult:
+    def __init__(self, masks):
+        self.masks = type("Masks", (), {"data": FakeArray(masks)})()
+
+    def __bool__(self):
+        return True
+
+
+class FakeSession:
+    """Masks the left half of every image; waits until both jobs are inside the model call."""
+
+    def __init__(self, parties):
+        self.barrier = threading.Barrier(parties)
+
+    def __call__(self, image, points=None, labels=None):
+        self.barrier.wait(timeout=10)
+        height, width = image.shape[:2]
+        mask = np.zeros((1, height, width), dtype=bool)
+        mask[:, :, :width // 2] = True
+        return [FakeResult(mask)]
+
+
+def test_concurrent_segment_jobs_write_their_own_composite(tmp_path, monkeypatch):
+    session = FakeSession(parties=2)
+    monkeypatch.setattr(sam2_api, "load_sam_session", lambda model_path: session)
+    colors = {"red": (0, 0, 255), "blue": (255, 0, 0)}  # BGR
+    jobs = {}
+    for name, color in colors.items():
+        image_path = str(tmp_path / f"{name}.png")
+        cv2.imwrite(image_path, np.full((48, 64, 3), color, dtype=np.uint8))
+        job_dir = tmp_path / f"job_{name}"
+        job_dir.mkdir()
+        jobs[name] = (image_path, str(job_dir))
+
+    results, errors = {}, []
+
+    def run(name):
+        image_path, job_dir = jobs[name]
+        try:
+            results[name] = job_server.run_segment({"image_path": image_path}, job_dir, batching=False)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    for name, color in colors.items():
+        assert results[name]["segments"] == 1
+        composite = cv2.imread(os.path.join(results[name]["segments_dir"], "composite.png"))
+        assert composite.shape == (48, 64, 3)
+        # The unmasked right half is this job's own image, untouched
+        assert (composite[:, 40:] == color).all()
@@ -0,0 +1,40 @@
+import os
+import threading
+
+import pytest
+
+from src import profiling
+
+
+@pytest.fixture
+def cprofile_enabled():
+    previous = profiling.get_profiler()
+    profiling.set_profiler("cprofile")
+    yield
+    profiling.set_profiler(previous)
+
+
+def test_concurrent_stages_share_one_cprofile_session(cprofile_enabled, tmp_path):
+    started = threading.Barrier(4)
+    errors = []
+
+    def stage(index):
+        try:
+            with profiling.profile_stage(f"stage{index}", str(tmp_path)):
+                started.wait(timeout=5)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=stage, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(os.listdir(tmp_path / "profiles")) == 1
+
+    # The session is released, so the next stage is profiled again
+    with profiling.profile_stage("after", str(tmp_path)):
+        pass
+    assert "nojob_after.pstats" in os.listdir(tmp_path / "profiles")
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+F = torch.nn.functional
+
+from src.sam_backend import EmbeddingCache, SamSession, image_key
+
+IMGSZ = 32
+
+
+class FakeSam2Model:
+    """Backbone stand-in with SAM2's (HW, B, C) feature layout at strides 4, 8 and 16."""
+
+    directly_add_no_mem_embed = True
+    no_mem_embed = torch.tensor([0.5, -0.5, 1.0])
+
+    def set_imgsz(self, imgsz):
+        self.imgsz = imgsz
+
+    def forward_image(self, batch):
+        return batch
+
+    def _prepare_backbone_features(self, batch):
+        vision_feats = [F.avg_pool2d(batch, stride).flatten(2).permute(2, 0, 1) for stride in (4, 8, 16)]
+        return None, vision_feats, None, None
+
+
+class FakeSamModel:
+    pass
+
+
+class FakePredictor:
+    """Mimics the ultralytics predictor calls ``SamSession.encode_batch`` makes."""
+
+    def __init__(self, model):
+        self.model = model
+        self.imgsz = None  # Set by setup_source, as in BasePredictor
+
+    def setup_source(self, source):
+        self.imgsz = [IMGSZ, IMGSZ]
+
+    def preprocess(self, images):
+        if self.imgsz is None:
+            raise TypeError("LetterBox needs imgsz")
+        return torch.from_numpy(np.stack(images)).permute(0, 3, 1, 2).float()
+
+    def get_im_features(self, im):
+        if isinstance(self.model, FakeSamModel):
+            return F.avg_pool2d(im, 16)
+        # As in SAM2Predictor: only correct for a batch of one
+        self._bb_feat_sizes = [[x // (4 * i) for x in self.imgsz] for i in [1, 2, 4]]
+        _, vision_feats, _, _ = self.model._prepare_backbone_features(self.model.forward_image(im))
+        vision_feats[-1] = vision_feats[-1] + self.model.no_mem_embed
+        feats = [
+            feat.permute(1, 2, 0).view(1, -1, *feat_size)
+            for feat, feat_size in zip(vision_feats[::-1], self._bb_feat_sizes[::-1])
+        ][::-1]
+        return {"image_embed": feats[-1], "high_res_feats": feats[:-1]}
+
+
+def make_session(model):
+    session = SamSession.__new__(SamSession)
+    session.model_path = "sam2_s.pt"
+    session.quantized = False
+    session.predictor = FakePredictor(model)
+    session.cache = EmbeddingCache()
+    session.current_key = None
+    session._lock = threading.RLock()
+    return session
+
+
+def make_images(count):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (IMGSZ, IMGSZ, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def reference_features(model, image):
+    predictor = FakePredictor(model)
+    predictor.setup_source(image)
+    return predictor.get_im_features(predictor.preprocess([image]))
+
+
+def assert_features_equal(actual, expected):
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for name in expected:
+            assert_features_equal(actual[name], expected[name])
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            assert_features_equal(a, e)
+    else:
+        assert actual.shape == expected.shape
+        assert torch.allclose(actual, expected)
+
+
+@pytest.mark.parametrize("model_class", [FakeSam2Model, FakeSamModel])
+def test_encode_batch_on_fresh_session(model_class):
+    session = make_session(model_class())
+    image = make_images(1)[0]
+
+    assert session.encode_batch([image]) == [image_key(image)]
+    assert image_key(image) in session.cache
+
+
+@pytest.mark.parametrize("model_class", [FakeSam2Model, FakeSamModel])
+def test_encode_batch_matches_single_image_features(model_class):
+    model = model_class()
+    session = make_session(model)
+    images = make_images(3)
+
+    keys = session.encode_batch(images)
+
+    for key, image in zip(keys, images):
+        assert_features_equal(session.cache.get(key), reference_features(model, image))